@@ -0,0 +1,149 @@
+# backend/benchmarks.py
+"""Benchmark endpoint berat terhadap DB sementara (bukan wms.sqlite3).
+
+Pakai:
+    python benchmarks.py batch_create [--sizes 500,5000,20000]
+    python benchmarks.py bulk_update  [--sizes 100,1000,3000]
+    python benchmarks.py add_items    [--sizes 10,100,5000]
+"""
+import argparse, os, shutil, sys, tempfile, time
+
+import db
+
+def _make_client(seed_db=None):
+    tmp = tempfile.mkdtemp(prefix="wms-bench-")
+    db.DB_PATH = os.path.join(tmp, "bench.sqlite3")
+    if seed_db:
+        shutil.copy(seed_db, db.DB_PATH)
+    from app import create_app
+    app = create_app()
+    client = app.test_client()
+    r = client.post("/auth/login", json={"email": "admin@wms.ci", "password": "adminci"})
+    headers = {"Authorization": "Token " + r.get_json()["token"]}
+    return client, headers, tmp
+
+def _report(label, n, seconds):
+    rate = n / seconds if seconds > 0 else float("inf")
+    print(f"{label:<32} n={n:>6}  {seconds * 1000:>9.1f} ms  {rate:>10.0f} rows/s")
+
+def bench_batch_create(sizes):
+    client, headers, tmp = _make_client()
+    try:
+        for i, qty in enumerate(sizes):
+            body = {
+                "prefix": "BEN", "name": "Bench", "category": "Bench",
+                "model": f"M{i}", "rack": "R1", "qty": qty, "compact": True,
+            }
+            t0 = time.perf_counter()
+            r = client.post("/items/batch_create", json=body, headers=headers)
+            dt = time.perf_counter() - t0
+            if r.status_code != 201:
+                print("gagal:", r.status_code, r.get_json())
+                return 1
+            _report("batch_create", qty, dt)
+    finally:
+        db.close_pool()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+def _create_items(client, headers, model, qty):
+    body = {"prefix": "BEN", "name": "Bench", "category": "Bench", "model": model, "rack": "R1", "qty": qty, "compact": True}
+    r = client.post("/items/batch_create", json=body, headers=headers)
+    first_n = int(r.get_json()["first"].rsplit("-", 1)[-1])
+    return [f"BEN-{model}-{n:03d}" for n in range(first_n, first_n + qty)]
+
+def _legacy_bulk_update(ids, status, defect):
+    """Pola lama (SELECT + UPDATE per id) sebagai pembanding."""
+    with db.connection() as conn:
+        for id_code in ids:
+            row = conn.execute("SELECT id_code, status FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
+            if row and row["status"] != "Keluar":
+                conn.execute("UPDATE item_unit SET status=?, defect_level=? WHERE id_code=?", (status, defect, id_code))
+        conn.commit()
+
+def bench_bulk_update(sizes):
+    client, headers, tmp = _make_client()
+    try:
+        for i, n in enumerate(sizes):
+            ids = _create_items(client, headers, f"U{i}", n)
+            t0 = time.perf_counter()
+            _legacy_bulk_update(ids, "Rusak", "ringan")
+            _report("legacy per-row update", n, time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            r = client.post("/items/bulk_update_condition", json={"ids": ids, "condition": "good"}, headers=headers)
+            _report("bulk_update_condition", n, time.perf_counter() - t0)
+            assert r.get_json()["counts"]["updated"] == n
+
+            with db.connection() as conn:
+                conn.execute(f"UPDATE item_unit SET status='Keluar' WHERE id_code LIKE 'BEN-U{i}-%'")
+                conn.commit()
+            t0 = time.perf_counter()
+            r = client.post("/items/mark_lost", json={"ids": ids}, headers=headers)
+            _report("mark_lost", n, time.perf_counter() - t0)
+            assert r.get_json()["counts"]["updated"] == n
+    finally:
+        db.close_pool()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+def _legacy_add_items(cid, ids):
+    """Pola lama add_items (2 SELECT + INSERT + UPDATE per id) sebagai pembanding."""
+    with db.connection() as conn:
+        for id_code in ids:
+            if conn.execute("SELECT 1 FROM container_item WHERE container_id=? AND id_code=? AND voided_at IS NULL", (cid, id_code)).fetchone():
+                continue
+            row = conn.execute("SELECT status, defect_level, is_universal FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
+            if not row or row["status"] != "Good":
+                continue
+            conn.execute("""
+              INSERT INTO container_item (container_id, id_code, added_at, batch_label, condition_at_checkout, override_reason, amend_reason)
+              VALUES (?, ?, ?, 'MAIN', 'good', NULL, NULL)
+            """, (cid, id_code, db.now_iso()))
+            conn.execute("UPDATE item_unit SET status='Keluar' WHERE id_code=?", (id_code,))
+        conn.commit()
+
+def bench_add_items(sizes):
+    client, headers, tmp = _make_client()
+    try:
+        for i, n in enumerate(sizes):
+            legacy_ids = _create_items(client, headers, f"L{i}", n)
+            ids = _create_items(client, headers, f"A{i}", n)
+            legacy_cid = client.post("/containers", json={"event_name": "Bench", "pic": "bench"}, headers=headers).get_json()["id"]
+            cid = client.post("/containers", json={"event_name": "Bench", "pic": "bench"}, headers=headers).get_json()["id"]
+
+            t0 = time.perf_counter()
+            _legacy_add_items(legacy_cid, legacy_ids)
+            _report("legacy per-row add_items", n, time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            r = client.post(f"/containers/{cid}/add_items", json={"ids": ids}, headers=headers)
+            _report("add_items", n, time.perf_counter() - t0)
+            assert r.get_json()["added_counts"]["good"] == n
+    finally:
+        db.close_pool()
+        shutil.rmtree(tmp, ignore_errors=True)
+    return 0
+
+BENCHES = {
+    "batch_create": bench_batch_create,
+    "bulk_update": bench_bulk_update,
+    "add_items": bench_add_items,
+}
+
+DEFAULT_SIZES = {
+    "batch_create": "500,5000,20000",
+    "bulk_update": "100,1000,3000",
+    "add_items": "10,100,5000",
+}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("bench", choices=sorted(BENCHES))
+    ap.add_argument("--sizes", default=None, help="daftar ukuran, pisah koma (default per benchmark)")
+    args = ap.parse_args(argv)
+    sizes = [int(x) for x in (args.sizes or DEFAULT_SIZES[args.bench]).split(",") if x.strip()]
+    return BENCHES[args.bench](sizes)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+# backend/consistency.py
+"""Rebuild & verifikasi data turunan (tabel yang dijaga trigger/handler).
+
+CLI:
+    python consistency.py check   [nama ...]
+    python consistency.py rebuild [nama ...]
+Tanpa nama = semua. Endpoint admin memakai fungsi yang sama.
+"""
+import sys
+
+import dn_store
+from db import connection
+from migrations import (
+    LAST_DAMAGE_NOTE_SQL, LAST_RETURNED_AT_SQL, CURRENT_LINE_SQL,
+    CONTAINER_TOTALS, CONTAINER_TOTALS_REBUILD_SQL, container_total_exprs,
+)
+
+# ---------- item_summary ----------
+_SUMMARY_KEYS = ("category", "name", "model", "status", "defect_level")
+
+def _summary_from_base(conn):
+    rows = conn.execute("""
+        SELECT category, name, model, status, IFNULL(defect_level, '') AS defect_level, COUNT(*) AS qty
+        FROM item_unit GROUP BY 1, 2, 3, 4, 5
+    """).fetchall()
+    return {tuple(r[k] for k in _SUMMARY_KEYS): int(r["qty"]) for r in rows}
+
+def check_item_summary(conn):
+    expected = _summary_from_base(conn)
+    actual = {
+        tuple(r[k] for k in _SUMMARY_KEYS): int(r["qty"])
+        for r in conn.execute("SELECT * FROM item_summary WHERE qty <> 0")
+    }
+    diffs = []
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key, 0) != actual.get(key, 0):
+            diffs.append({**dict(zip(_SUMMARY_KEYS, key)), "expected": expected.get(key, 0), "actual": actual.get(key, 0)})
+    return diffs
+
+def rebuild_item_summary(conn):
+    conn.execute("DELETE FROM item_summary")
+    conn.execute("""
+        INSERT INTO item_summary (category, name, model, status, defect_level, qty)
+        SELECT category, name, model, status, IFNULL(defect_level, ''), COUNT(*)
+        FROM item_unit GROUP BY 1, 2, 3, 4, 5
+    """)
+    conn.commit()
+
+# ---------- item_unit.last_damage_note / last_returned_at ----------
+def check_item_last_return(conn):
+    rows = conn.execute(f"""
+        SELECT id_code, last_damage_note, last_returned_at,
+               {LAST_DAMAGE_NOTE_SQL.format(code="iu.id_code")} AS exp_note,
+               {LAST_RETURNED_AT_SQL.format(code="iu.id_code")} AS exp_returned
+        FROM item_unit iu
+    """).fetchall()
+    return [
+        {"id_code": r["id_code"],
+         "expected": {"last_damage_note": r["exp_note"], "last_returned_at": r["exp_returned"]},
+         "actual": {"last_damage_note": r["last_damage_note"], "last_returned_at": r["last_returned_at"]}}
+        for r in rows
+        if r["last_damage_note"] != r["exp_note"] or r["last_returned_at"] != r["exp_returned"]
+    ]
+
+def rebuild_item_last_return(conn):
+    conn.execute(f"""
+        UPDATE item_unit SET
+            last_damage_note = {LAST_DAMAGE_NOTE_SQL.format(code="item_unit.id_code")},
+            last_returned_at = {LAST_RETURNED_AT_SQL.format(code="item_unit.id_code")}
+    """)
+    conn.commit()
+
+# ---------- item_unit.current_line_id / current_container_id ----------
+def check_item_current_line(conn):
+    rows = conn.execute(f"""
+        SELECT id_code, current_line_id, current_container_id,
+               (SELECT id FROM {CURRENT_LINE_SQL.format(code="iu.id_code")}) AS exp_line,
+               (SELECT container_id FROM {CURRENT_LINE_SQL.format(code="iu.id_code")}) AS exp_container
+        FROM item_unit iu
+    """).fetchall()
+    return [
+        {"id_code": r["id_code"],
+         "expected": {"current_line_id": r["exp_line"], "current_container_id": r["exp_container"]},
+         "actual": {"current_line_id": r["current_line_id"], "current_container_id": r["current_container_id"]}}
+        for r in rows
+        if r["current_line_id"] != r["exp_line"] or r["current_container_id"] != r["exp_container"]
+    ]
+
+def rebuild_item_current_line(conn):
+    conn.execute(f"""
+        UPDATE item_unit SET (current_line_id, current_container_id) = {CURRENT_LINE_SQL.format(code="item_unit.id_code")}
+    """)
+    conn.commit()
+
+# ---------- containers.tot_* ----------
+def check_container_totals(conn):
+    exprs = container_total_exprs("ci")
+    cols = ", ".join(f"c.tot_{k}" for k in CONTAINER_TOTALS)
+    sums = ", ".join(f"SUM({exprs[k]}) AS exp_{k}" for k in CONTAINER_TOTALS)
+    exp = ", ".join(f"IFNULL(agg.exp_{k}, 0) AS exp_{k}" for k in CONTAINER_TOTALS)
+    rows = conn.execute(f"""
+        WITH agg AS (SELECT ci.container_id, {sums} FROM container_item ci GROUP BY ci.container_id)
+        SELECT c.id, {cols}, {exp}
+        FROM containers c LEFT JOIN agg ON agg.container_id = c.id
+    """).fetchall()
+    diffs = []
+    for r in rows:
+        expected = {k: r[f"exp_{k}"] for k in CONTAINER_TOTALS}
+        actual = {k: r[f"tot_{k}"] for k in CONTAINER_TOTALS}
+        if expected != actual:
+            diffs.append({"container_id": r["id"], "expected": expected, "actual": actual})
+    return diffs
+
+def rebuild_container_totals(conn):
+    conn.execute(CONTAINER_TOTALS_REBUILD_SQL)
+    conn.commit()
+
+# ---------- dn_line.refs (snapshot DN ringkas) ----------
+def _dn_refs_from_snapshots(conn):
+    refs = {}
+    for (lines,) in conn.execute("SELECT lines FROM dn_snapshots WHERE format=? AND lines IS NOT NULL", (dn_store.FORMAT_COMPACT,)):
+        for i in dn_store.referenced_lines(lines):
+            refs[i] = refs.get(i, 0) + 1
+    return refs
+
+def check_dn_line_refs(conn):
+    expected = _dn_refs_from_snapshots(conn)
+    actual = {r["id"]: r["refs"] for r in conn.execute("SELECT id, refs FROM dn_line")}
+    return [
+        {"dn_line_id": i, "expected": expected.get(i, 0), "actual": actual.get(i)}
+        for i in sorted(set(expected) | set(actual))
+        if expected.get(i, 0) != actual.get(i)
+    ]
+
+def rebuild_dn_line_refs(conn):
+    """Perbaiki refs; baris yang tidak dipakai snapshot mana pun dihapus.
+    Referensi ke baris yang sudah hilang tidak bisa dipulihkan (akan tetap muncul di cek)."""
+    expected = _dn_refs_from_snapshots(conn)
+    conn.execute("UPDATE dn_line SET refs = 0")
+    conn.executemany("UPDATE dn_line SET refs=? WHERE id=?", ((n, i) for i, n in expected.items()))
+    conn.execute("DELETE FROM dn_line WHERE refs <= 0")
+    conn.commit()
+
+# name -> (check, rebuild)
+CHECKS = {
+    "item_summary": (check_item_summary, rebuild_item_summary),
+    "item_last_return": (check_item_last_return, rebuild_item_last_return),
+    "item_current_line": (check_item_current_line, rebuild_item_current_line),
+    "container_totals": (check_container_totals, rebuild_container_totals),
+    "dn_line_refs": (check_dn_line_refs, rebuild_dn_line_refs),
+}
+
+def run(action, names=None):
+    """action: 'check' | 'rebuild'. Return {name: [diffs]} (setelah rebuild = hasil cek ulang)."""
+    names = names or list(CHECKS)
+    unknown = [n for n in names if n not in CHECKS]
+    if unknown:
+        raise ValueError("tidak dikenal: " + ", ".join(unknown))
+    out = {}
+    with connection() as conn:
+        for name in names:
+            check, rebuild = CHECKS[name]
+            if action == "rebuild":
+                rebuild(conn)
+            out[name] = check(conn)
+    return out
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or argv[0] not in ("check", "rebuild"):
+        print(__doc__)
+        return 2
+    result = run(argv[0], argv[1:])
+    bad = 0
+    for name, diffs in result.items():
+        print(f"{name}: {'OK' if not diffs else f'{len(diffs)} selisih'}")
+        for d in diffs[:20]:
+            print("   ", d)
+        bad += len(diffs)
+    return 1 if bad else 0
+
+if __name__ == "__main__":
+    from db import init_db
+    init_db()
+    sys.exit(main())
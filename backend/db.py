@@ -1,13 +1,278 @@
 # backend/db.py
-import sqlite3, os, datetime, json
+import sqlite3, os, datetime, json, threading, queue, time, base64, uuid
+from contextlib import contextmanager
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "wms.sqlite3")
 
+# ==== Connection pool ====
+POOL_SIZE = 8                 # koneksi maksimum yang dibuka bersamaan
+POOL_TIMEOUT = 10.0           # detik menunggu koneksi bebas sebelum error
+BUSY_TIMEOUT_MS = 5000        # tunggu lock writer lain sebelum "database is locked"
+CACHE_SIZE_KIB = 20000        # page cache per koneksi (~20 MB)
+MMAP_SIZE = 256 * 1024 * 1024 # baca via mmap (256 MB)
+
 def get_conn():
-    conn = sqlite3.connect(DB_PATH)
+    """Buka koneksi baru (tanpa pool) dengan pragma WAL & tuning.
+    Handler sebaiknya memakai `connection()`; ini untuk init/skrip."""
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT_MS)};")
+    conn.execute(f"PRAGMA cache_size=-{int(CACHE_SIZE_KIB)};")
+    conn.execute(f"PRAGMA mmap_size={int(MMAP_SIZE)};")
+    conn.execute("PRAGMA temp_store=MEMORY;")
     return conn
 
+class ConnectionPool:
+    """Pool koneksi SQLite berbatas (LIFO) yang dipakai bersama antar thread request."""
+
+    def __init__(self, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._generation = 0
+        self._conn_gen = {}
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_ms": 0.0,
+            "hold_time_ms": 0.0,
+            "max_hold_ms": 0.0,
+            "discarded": 0,
+        }
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = get_conn()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+                with self._lock:
+                    self._conn_gen[id(conn)] = self._generation
+            else:
+                t0 = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise RuntimeError("Pool koneksi database penuh, coba lagi")
+                finally:
+                    with self._lock:
+                        self._stats["waits"] += 1
+                        self._stats["wait_time_ms"] += (time.perf_counter() - t0) * 1000
+        with self._lock:
+            self._stats["checkouts"] += 1
+        return conn
+
+    def release(self, conn, held_ms=0.0):
+        with self._lock:
+            self._stats["hold_time_ms"] += held_ms
+            if held_ms > self._stats["max_hold_ms"]:
+                self._stats["max_hold_ms"] = held_ms
+        try:
+            # Transaksi yang tidak di-commit (mis. return error lebih awal) dibuang,
+            # sama seperti perilaku conn.close() sebelumnya.
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self._conn_gen.get(id(conn)) != self._generation:
+            # koneksi dibuka sebelum close_all(); jangan dipakai ulang
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._created -= 1
+            self._conn_gen.pop(id(conn), None)
+            self._stats["discarded"] += 1
+
+    def close_all(self):
+        """Tutup semua koneksi idle (mis. sebelum restore file DB).
+        Koneksi yang sedang dipinjam ditutup saat dikembalikan."""
+        with self._lock:
+            self._generation += 1
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            created = self._created
+        checkouts = s["checkouts"] or 1
+        s.update({
+            "size": self.size,
+            "open": created,
+            "idle": self._idle.qsize(),
+            "in_use": max(0, created - self._idle.qsize()),
+            "avg_hold_ms": round(s["hold_time_ms"] / checkouts, 3),
+            "avg_wait_ms": round(s["wait_time_ms"] / max(1, s["waits"]), 3),
+        })
+        for k in ("wait_time_ms", "hold_time_ms", "max_hold_ms"):
+            s[k] = round(s[k], 3)
+        return s
+
+_pool = ConnectionPool()
+
+@contextmanager
+def connection():
+    """Pinjam koneksi dari pool:
+
+        with connection() as conn:
+            ...
+            conn.commit()
+
+    Perubahan yang belum di-commit di-rollback saat keluar blok."""
+    conn = _pool.acquire()
+    t0 = time.perf_counter()
+    try:
+        yield conn
+    except BaseException:
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pass
+        raise
+    finally:
+        _pool.release(conn, (time.perf_counter() - t0) * 1000)
+
+def pool_stats():
+    return _pool.stats()
+
+def close_pool():
+    global _fts_enabled, _data_epoch
+    _pool.close_all()
+    _fts_enabled = None
+    # file DB bisa diganti (restore snapshot): counter table_version bisa mundur
+    _data_epoch = uuid.uuid4().hex[:8]
+
+def checkpoint(conn=None):
+    """Tulis isi WAL ke file DB utama (dipakai sebelum copy/snapshot file).
+
+    Pemanggil yang sedang memegang koneksi pool memberikan `conn`-nya sendiri (jangan
+    pinjam koneksi kedua); koneksi itu tidak boleh sedang di dalam transaksi."""
+    if conn is None:
+        with connection() as conn:
+            return checkpoint(conn)
+    if conn.in_transaction:
+        raise RuntimeError("checkpoint tidak bisa dijalankan di dalam transaksi terbuka")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+
+# ==== Full-text search (FTS5) ====
+_fts_enabled = None
+
+def fts_enabled(conn):
+    """True jika tabel item_search (FTS5 trigram) ada di DB ini. Hasil di-cache per proses."""
+    global _fts_enabled
+    if _fts_enabled is None:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='item_search'"
+        ).fetchone()
+        _fts_enabled = bool(row)
+    return _fts_enabled
+
+_data_epoch = uuid.uuid4().hex[:8]
+
+def table_versions(conn, tables):
+    """String versi data untuk `tables` (counter table_version + epoch proses),
+    berubah setiap ada insert/update/delete pada salah satu tabel."""
+    rows = dict(conn.execute(
+        f"SELECT tbl, v FROM table_version WHERE tbl IN ({marks(len(tables))})", list(tables)
+    ).fetchall())
+    return _data_epoch + "-" + ".".join(str(rows.get(t, 0)) for t in tables)
+
+def rebuild_item_search(conn):
+    """Bangun ulang index item_search dari item_unit (mis. setelah VACUUM yang
+    bisa mengubah rowid, atau setelah restore DB)."""
+    global _fts_enabled
+    _fts_enabled = None
+    if not fts_enabled(conn):
+        return False
+    conn.execute("INSERT INTO item_search(item_search) VALUES ('rebuild')")
+    conn.commit()
+    return True
+
+def ensure_item_search(conn):
+    """Cek index item_search cocok dengan isi item_unit; bangun ulang kalau tidak.
+    item_unit ber-PK TEXT, jadi rowid (kunci index) bisa bergeser setelah VACUUM atau
+    restore file lama. Return True kalau index dibangun ulang."""
+    if not fts_enabled(conn):
+        return False
+    try:
+        conn.execute("INSERT INTO item_search(item_search, rank) VALUES ('integrity-check', 1)")
+        in_sync = True
+    except sqlite3.DatabaseError:
+        in_sync = False
+    conn.rollback()
+    if in_sync:
+        return False
+    print("[DB] index item_search tidak sinkron dengan item_unit, dibangun ulang")
+    return rebuild_item_search(conn)
+
+# ==== Set-based helpers ====
+IN_CHUNK = 500  # jumlah parameter per klausa IN (aman untuk batas variabel SQLite lama)
+
+def chunked(seq, size=IN_CHUNK):
+    """Potong list jadi beberapa list berukuran <= size (untuk query WHERE x IN (...))."""
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+def marks(n):
+    return ",".join("?" * n)
+
+def unique_ids(raw_ids):
+    """Strip & buang id kosong/duplikat, urutan pertama dipertahankan."""
+    seen, out = set(), []
+    for raw in raw_ids:
+        id_code = (raw or "").strip() if isinstance(raw, str) else str(raw or "").strip()
+        if id_code and id_code not in seen:
+            seen.add(id_code)
+            out.append(id_code)
+    return out
+
+# ==== Keyset (cursor) pagination ====
+def encode_cursor(*values):
+    """Token opaque untuk posisi terakhir (mis. created_at, id) pada list."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(token, n=2):
+    """Kebalikan encode_cursor; return list berisi `n` nilai atau None jika token rusak."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        vals = json.loads(raw.decode("utf-8"))
+    except Exception:
+        return None
+    if not isinstance(vals, list) or len(vals) != n:
+        return None
+    return vals
+
 def now_iso():
     return datetime.datetime.now().isoformat(timespec="seconds")
 
@@ -24,174 +289,15 @@ def new_emoney_id():
     short = uuid.uuid4().hex[:4].upper()
     return f"EM-{today}-{short}"
 
-def _column_exists(cur, table, name):
-    cols = cur.execute(f"PRAGMA table_info({table})").fetchall()
-    return any(c[1] == name for c in cols)
-
 def init_db():
+    """Terapkan migrasi skema yang pending (no-op kalau sudah terbaru) dan pastikan
+    index item_search sinkron. Dipanggil saat start-up dan setelah restore snapshot."""
+    from migrations import migrate
     conn = get_conn()
-    cur = conn.cursor()
-
-    # ==== Items (existing) ====
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS item_unit (
-        id_code TEXT PRIMARY KEY,
-        name TEXT NOT NULL,
-        category TEXT NOT NULL,
-        model TEXT NOT NULL,
-        rack TEXT NOT NULL,
-        status TEXT NOT NULL DEFAULT 'Good',     -- Good | Keluar | Rusak | Hilang | Afkir
-        defect_level TEXT DEFAULT 'none',        -- none | ringan | berat
-        serial TEXT,
-        created_at TEXT NOT NULL,
-        is_universal INTEGER NOT NULL DEFAULT 0  -- 1 jika universal (tidak mengunci saat checkout)
-    );
-    """)
-
-    # ==== Containers (new) ====
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS containers (
-        id TEXT PRIMARY KEY,                     -- CTR-YYYYMMDD-XXXX
-        event_name TEXT NOT NULL,
-        pic TEXT NOT NULL,
-        crew TEXT,
-        location TEXT,
-        start_date TEXT,
-        end_date TEXT,
-        order_title TEXT,                        -- optional: Order label/title for DN
-        status TEXT NOT NULL DEFAULT 'Open',     -- Open | Closed
-        created_at TEXT NOT NULL
-    );
-    """)
-
-    # Backfill missing columns for older DBs
-    if not _column_exists(cur, "containers", "order_title"):
-        cur.execute("ALTER TABLE containers ADD COLUMN order_title TEXT;")
-
-    # ==== Container items (new) ====
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS container_item (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        container_id TEXT NOT NULL,
-        id_code TEXT NOT NULL,
-        added_at TEXT NOT NULL,
-        batch_label TEXT NOT NULL,               -- MAIN | AMEND-YYYYMMDD-HHMM
-        condition_at_checkout TEXT,              -- good | rusak_ringan | rusak_berat
-        override_reason TEXT,                    -- alasan jika rusak_berat
-        amend_reason TEXT,                       -- alasan jika batch AMEND
-        override_by TEXT,                        -- (opsional) siapa yang setujui
-        voided_at TEXT,                          -- jika dibatalkan (mis-scan)
-        void_reason TEXT,                        -- alasan void
-        returned_at TEXT,                        -- waktu kembali
-        return_condition TEXT,                   -- good | rusak_ringan | rusak_berat
-        damage_note TEXT,                        -- catatan kerusakan saat kembali
-        FOREIGN KEY(container_id) REFERENCES containers(id),
-        FOREIGN KEY(id_code) REFERENCES item_unit(id_code)
-    );
-    """)
-
-    # Tambahkan kolom jika DB lama
-    need_cols = {
-        "container_item": [
-            ("condition_at_checkout", "TEXT"),
-            ("override_reason", "TEXT"),
-            ("amend_reason", "TEXT"),
-            ("override_by", "TEXT"),
-            ("voided_at", "TEXT"),
-            ("void_reason", "TEXT"),
-            ("returned_at", "TEXT"),
-            ("return_condition", "TEXT"),
-            ("damage_note", "TEXT"),
-        ]
-    }
-    for table, cols in need_cols.items():
-        for name, ddl in cols:
-            if not _column_exists(cur, table, name):
-                cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl};")
-
-    # Unique index: 1 item aktif hanya sekali per kontainer (abaikan yang sudah void)
-    cur.execute("""
-    CREATE UNIQUE INDEX IF NOT EXISTS uq_container_item_active
-    ON container_item(container_id, id_code)
-    WHERE voided_at IS NULL;
-    """)
-
-    # ==== DN Snapshots ====
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS dn_snapshots (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        container_id TEXT NOT NULL,
-        version INTEGER NOT NULL,
-        payload TEXT NOT NULL,                   -- JSON (header, items per batch, counters)
-        created_at TEXT NOT NULL,
-        created_by TEXT
-    );
-    """)
-    cur.execute("""
-    CREATE INDEX IF NOT EXISTS ix_dn_snapshots_container
-    ON dn_snapshots(container_id, version);
-    """)
-    
-    # Tambahkan kolom untuk DB lama (backward compatible)
-    if not _column_exists(cur, "item_unit", "is_universal"):
-        cur.execute("ALTER TABLE item_unit ADD COLUMN is_universal INTEGER NOT NULL DEFAULT 0;")
-
-    # ==== Index untuk performa list & summary ====
-    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_created_at ON item_unit(created_at);")
-    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_category   ON item_unit(category);")
-    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_status     ON item_unit(status);")
-    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_model      ON item_unit(model);")
-    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_rack       ON item_unit(rack);")
-    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_name       ON item_unit(name);")
-    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_universal  ON item_unit(is_universal);")
-
-    # ==== Maintenance / Repair logs ====
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS item_repair_log (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        id_code TEXT NOT NULL,
-        defect_before TEXT,            -- none | ringan | berat
-        status_before TEXT,            -- Good | Rusak | Keluar | ...
-        last_damage_note TEXT,         -- catatan kerusakan terakhir (dari container_item)
-        repair_note TEXT NOT NULL,     -- catatan penanganan (wajib dari PIC)
-        result_status TEXT,            -- Good | Rusak | Afkir (Broken)
-        result_defect TEXT,            -- none | ringan | berat
-        repaired_at TEXT NOT NULL,     -- timestamp perbaikan
-        FOREIGN KEY(id_code) REFERENCES item_unit(id_code)
-    );
-    """)
-    cur.execute("CREATE INDEX IF NOT EXISTS ix_repair_code ON item_repair_log(id_code, repaired_at);")
-
-    # add columns for existing DBs
-    for name, ddl in (("result_status", "TEXT"), ("result_defect", "TEXT")):
-        if not _column_exists(cur, "item_repair_log", name):
-            cur.execute(f"ALTER TABLE item_repair_log ADD COLUMN {name} {ddl};")
-
-    # ==== E-Money tracking ====
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS emoney (
-        id TEXT PRIMARY KEY,                -- EM-YYYYMMDD-XXXX
-        label TEXT NOT NULL UNIQUE,         -- e.g., Emoney 001 CI
-        status TEXT NOT NULL DEFAULT 'Open',-- Open | Closed
-        created_at TEXT NOT NULL
-    );
-    """)
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS emoney_tx (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        emoney_id TEXT NOT NULL,
-        type TEXT NOT NULL,                 -- topup | expense
-        amount_cents INTEGER NOT NULL,      -- positive integer (in cents)
-        note TEXT,
-        ref_container_id TEXT,              -- optional link to containers.id
-        created_at TEXT NOT NULL,
-        FOREIGN KEY(emoney_id) REFERENCES emoney(id),
-        FOREIGN KEY(ref_container_id) REFERENCES containers(id)
-    );
-    """)
-    cur.execute("CREATE INDEX IF NOT EXISTS ix_emoney_label ON emoney(label);")
-    cur.execute("CREATE INDEX IF NOT EXISTS ix_emoney_tx_eid ON emoney_tx(emoney_id, created_at);")
-    cur.execute("CREATE INDEX IF NOT EXISTS ix_emoney_tx_container ON emoney_tx(ref_container_id);")
-
-    conn.commit()
-    conn.close()
+    try:
+        applied = migrate(conn)
+        if applied:
+            print("[DB] migrasi diterapkan:", ", ".join(str(v) for v in applied))
+        ensure_item_search(conn)
+    finally:
+        conn.close()
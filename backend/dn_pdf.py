@@ -0,0 +1,316 @@
+# backend/dn_pdf.py
+"""Render Surat Jalan (DN) ke PDF di server, dengan cache disk per versi.
+
+Snapshot DN immutable per (container_id, version), jadi PDF cukup dirender
+sekali: halaman dirender paralel lewat process pool qr_render (gambar 1-bit),
+ditulis PdfStream, lalu disimpan di DN_PDF_CACHE_DIR. Permintaan berikutnya
+dilayani langsung dari file.
+"""
+import hashlib, os, shutil, threading, zlib
+from datetime import datetime
+from functools import lru_cache
+
+from PIL import Image, ImageDraw
+
+import qr_render
+
+DN_PDF_CACHE_DIR = os.path.join(os.path.dirname(__file__), "dn_pdf_cache")
+DN_RENDER_VERSION = "1"  # naikkan jika layout berubah agar PDF lama tidak dipakai
+
+# A4, satuan mm; tinggi baris tabel tetap supaya paginasi bisa dihitung di awal
+LAYOUT = {
+    "page_w_mm": 210.0,
+    "page_h_mm": 297.0,
+    "margin_mm": 10.0,
+    "dpi": 300,
+    "header_mm": 20.0,
+    "footer_mm": 7.0,
+    "meta_mm": 44.0,
+    "thead_mm": 8.0,
+    "row_mm": 6.0,
+    "closing_mm": 70.0,
+}
+# (judul, lebar mm, perataan)
+COLUMNS = (
+    ("No", 10, "c"), ("Description", 54, "l"), ("Status", 22, "l"), ("Rak", 14, "l"),
+    ("Item Code", 34, "l"), ("Alasan", 34, "l"), ("OUT", 11, "c"), ("IN", 11, "c"),
+)
+SIGNATURES = (("Arranged by", "Gudang"), ("Received by", ""), ("Returned by", "Gudang"), ("Received by", ""))
+
+_CONDITION_LABEL = {"good": "Good", "rusak_ringan": "Rusak Ringan", "rusak_berat": "Rusak Berat"}
+_MONTHS = ("Januari", "Februari", "Maret", "April", "Mei", "Juni", "Juli",
+           "Agustus", "September", "Oktober", "November", "Desember")
+
+def _fmt_dt(value):
+    """Sama dengan formatDateTime(..., {monthText: true}) di frontend: 20-September-25 08:00 WIB."""
+    if not value:
+        return "-"
+    try:
+        d = datetime.fromisoformat(str(value))
+    except ValueError:
+        return str(value)
+    return f"{d.day:02d}-{_MONTHS[d.month - 1]}-{d.year % 100:02d} {d.hour:02d}:{d.minute:02d} WIB"
+
+def _rows(payload):
+    """Baris tabel dari payload snapshot; urutan & isi mengikuti SuratJalanPage.jsx."""
+    batches = payload.get("batches") or {}
+    out = []
+    for label in sorted(batches):
+        for it in batches[label] or []:
+            if it.get("damage_note"):
+                reason = f"Kerusakan: {it['damage_note']}"
+            elif it.get("amend_reason"):
+                reason = f"Amend: {it['amend_reason']}"
+            elif it.get("reason"):
+                reason = f"Override: {it['reason']}"
+            else:
+                reason = "-"
+            parts = [p for p in (it.get("category"), it.get("name"), it.get("model")) if p]
+            cond = str(it.get("condition") or "good").lower()
+            out.append((
+                str(len(out) + 1),
+                " ".join(parts) if parts else (it.get("id_code") or ""),
+                _CONDITION_LABEL.get(cond, cond or "-"),
+                it.get("rack") or "",
+                it.get("id_code") or "",
+                reason,
+                "OUT",
+                "IN" if it.get("return_condition") else "",
+            ))
+    return out
+
+def paginate(n_rows, layout=LAYOUT):
+    """Return list (start, end, closing) per halaman. Halaman 1 memuat blok detail
+    event; blok penutup (ringkasan + tanda tangan) selalu di halaman terakhir."""
+    body = layout["page_h_mm"] - 2 * layout["margin_mm"] - layout["header_mm"] - layout["footer_mm"]
+    pages, start, first = [], 0, True
+    while True:
+        avail = body - (layout["meta_mm"] if first else 0)
+        cap = max(1, int((avail - layout["thead_mm"]) // layout["row_mm"]))
+        end = min(n_rows, start + cap)
+        pages.append([start, end, False])
+        start, first = end, False
+        if start >= n_rows:
+            break
+    s, e, _ = pages[-1]
+    used = layout["thead_mm"] + (max(1, e - s)) * layout["row_mm"] + (layout["meta_mm"] if len(pages) == 1 else 0)
+    if body - used >= layout["closing_mm"]:
+        pages[-1][2] = True
+    else:
+        pages.append([n_rows, n_rows, True])
+    return [tuple(p) for p in pages]
+
+# ---------- render satu halaman (jalan di worker process) ----------
+@lru_cache(maxsize=4096)
+def _fit(text, size, width):
+    """Potong teks dengan "…" agar muat `width` px; deskripsi berulang antar baris jadi di-cache."""
+    f = qr_render.font(size)
+    if f.getlength(text) <= width:
+        return text
+    lo, hi = 0, len(text)  # prefix terpanjang yang muat (binary search)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if f.getlength(text[:mid] + "…") <= width:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + "…"
+
+def render_page(spec, layout=LAYOUT):
+    """spec: {doc, page, pages, rows, meta, table, closing}. Return (w_px, h_px, bytes 1-bit zlib)."""
+    mm = layout["dpi"] / 25.4
+    W, H = int(layout["page_w_mm"] * mm), int(layout["page_h_mm"] * mm)
+    pt = layout["dpi"] / 72
+    s_body = int(9 * pt)
+    f_body, f_small = qr_render.font(s_body), qr_render.font(int(8 * pt))
+    f_title, f_h3 = qr_render.font(int(14 * pt)), qr_render.font(int(10 * pt))
+    line = max(2, int(0.3 * mm))
+    page = Image.new("L", (W, H), 255)
+    draw = ImageDraw.Draw(page)
+    doc = spec["doc"]
+    left, right = int(layout["margin_mm"] * mm), W - int(layout["margin_mm"] * mm)
+    y = int(layout["margin_mm"] * mm)
+
+    # header (tiap halaman)
+    draw.text((left, y), "SURAT JALAN EVENT", fill=0, font=f_title)
+    draw.text((left, y + int(7 * mm)), f"Nomor: {doc['number']}", fill=0, font=f_body)
+    ver = f"Snapshot DN Versi {doc['version']}"
+    draw.text((right - draw.textlength(ver, font=f_h3), y), ver, fill=0, font=f_h3)
+    created = f"Dibuat: {doc['created_at']}"
+    draw.text((right - draw.textlength(created, font=f_small), y + int(7 * mm)), created, fill=0, font=f_small)
+    y += int(layout["header_mm"] * mm)
+    draw.line((left, y - int(3 * mm), right, y - int(3 * mm)), fill=0, width=line)
+
+    if spec["meta"]:
+        draw.text((left, y), "DETAIL EVENT", fill=0, font=f_h3)
+        yy = y + int(6 * mm)
+        for k, v in doc["meta"]:
+            draw.text((left, yy), f"{k} :", fill=0, font=f_body)
+            draw.text((left + int(45 * mm), yy), _fit(str(v or ""), s_body, right - left - int(45 * mm)), fill=0, font=f_body)
+            yy += int(5 * mm)
+        y += int(layout["meta_mm"] * mm)
+
+    if spec["table"]:
+        row_h, th_h = int(layout["row_mm"] * mm), int(layout["thead_mm"] * mm)
+        xs = [left]
+        for _t, w, _a in COLUMNS:
+            xs.append(xs[-1] + int(w * mm))
+        rows = spec["rows"] or [("", "Tidak ada item", "", "", "", "", "", "")]
+        bottom = y + th_h + row_h * len(rows)
+        draw.rectangle((left, y, xs[-1], bottom), outline=0, width=line)
+        draw.line((left, y + th_h, xs[-1], y + th_h), fill=0, width=line)
+        for x in xs[1:-1]:
+            draw.line((x, y, x, bottom), fill=0, width=line)
+        pad = int(1.2 * mm)
+        for (title, _w, align), x0, x1 in zip(COLUMNS, xs, xs[1:]):
+            tx = x0 + pad if align == "l" else x0 + (x1 - x0 - draw.textlength(title, font=f_h3)) / 2
+            draw.text((tx, y + (th_h - int(10 * pt)) // 2), title, fill=0, font=f_h3)
+        ty = y + th_h
+        for r in rows:
+            for (_t, _w, align), x0, x1, val in zip(COLUMNS, xs, xs[1:], r):
+                txt = _fit(str(val or ""), s_body, x1 - x0 - 2 * pad)
+                tx = x0 + pad if align == "l" else x0 + (x1 - x0 - draw.textlength(txt, font=f_body)) / 2
+                draw.text((tx, ty + (row_h - s_body) // 2), txt, fill=0, font=f_body)
+            draw.line((left, ty + row_h, xs[-1], ty + row_h), fill=0, width=max(1, line // 2))
+            ty += row_h
+        y = bottom + int(4 * mm)
+
+    if spec["closing"]:
+        t = doc["totals"]
+        summary = (f"Total: {t.get('all', 0)}   Kembali: {t.get('returned', 0)}   Good: {t.get('good', 0)}   "
+                   f"Ringan: {t.get('rusak_ringan', 0)}   Berat: {t.get('rusak_berat', 0)}   Hilang: {t.get('lost', 0)}")
+        draw.text((left, y), summary, fill=0, font=f_body)
+        y += int(6 * mm)
+        for title in ("REPORT EVENT", "NOTE UNTUK GUDANG"):
+            draw.rectangle((left, y, right, y + int(14 * mm)), outline=0, width=line)
+            draw.text((left + int(2 * mm), y + int(1.5 * mm)), title, fill=0, font=f_h3)
+            y += int(16 * mm)
+        draw.text((left, y), "TANDA TANGAN", fill=0, font=f_h3)
+        y += int(6 * mm)
+        slot_w = (right - left) / len(SIGNATURES)
+        for i, (label, role) in enumerate(SIGNATURES):
+            cx = left + slot_w * i + slot_w / 2
+            for j, (txt, f) in enumerate(((label, f_h3), (role, f_body))):
+                draw.text((cx - draw.textlength(txt, font=f) / 2, y + j * int(5 * mm)), txt, fill=0, font=f)
+            ly = y + int(22 * mm)
+            draw.line((cx - slot_w * 0.4, ly, cx + slot_w * 0.4, ly), fill=0, width=line)
+
+    foot = f"{doc['number']}  ·  Halaman {spec['page']} / {spec['pages']}"
+    fy = H - int(layout["margin_mm"] * mm) - int(4 * mm)
+    draw.text((right - draw.textlength(foot, font=f_small), fy), foot, fill=0, font=f_small)
+
+    mono = page.convert("1", dither=Image.NONE)
+    return W, H, zlib.compress(mono.tobytes(), 6)
+
+# ---------- dokumen ----------
+def _doc(cid, version, created_at, payload):
+    c = payload.get("container") or {}
+    crew = c.get("crew")
+    meta = (
+        ("Nama Event", c.get("event_name") or ""),
+        ("Tanggal & Jam Event", f"{_fmt_dt(c.get('start_date'))} - {_fmt_dt(c.get('end_date'))}"),
+        ("Lokasi Event", c.get("location") or ""),
+        ("PIC Crew", c.get("pic") or ""),
+        ("Crew", ", ".join(crew) if isinstance(crew, list) else (crew or "")),
+        ("Order", c.get("order_title") or ""),
+        ("Catatan", payload.get("note") or ""),
+    )
+    return {
+        "number": f"{c.get('id') or cid}/V{version}",
+        "version": version,
+        "created_at": _fmt_dt(created_at),
+        "meta": meta,
+        "totals": payload.get("totals") or {},
+    }
+
+def render_pdf(cid, version, created_at, payload, layout=LAYOUT):
+    """PDF lengkap (bytes) untuk satu snapshot DN."""
+    rows = _rows(payload)
+    doc = _doc(cid, version, created_at, payload)
+    plan = paginate(len(rows), layout)
+    specs = [
+        {"doc": doc, "page": i + 1, "pages": len(plan), "rows": rows[s:e],
+         "meta": i == 0, "table": i == 0 or e > s, "closing": closing}
+        for i, (s, e, closing) in enumerate(plan)
+    ]
+    pdf = qr_render.PdfStream(layout["page_w_mm"], layout["page_h_mm"])
+    parts = [pdf.header()]
+    for w, h, data in qr_render.map_ordered(render_page, specs, layout):
+        parts.append(pdf.page(w, h, data))
+    parts.append(pdf.trailer())
+    return b"".join(parts)
+
+# ---------- cache disk per versi ----------
+class DnPdfCache:
+    """File PDF per snapshot di `directory/<cid>/`. Key memuat id & created_at
+    snapshot, jadi versi yang dihapus lalu dibuat ulang tidak memakai file lama."""
+
+    def __init__(self, directory=DN_PDF_CACHE_DIR):
+        self.directory = directory
+        self._locks = {}      # key -> [Lock, jumlah peminta yang sedang render/menunggu]
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "renders": 0}
+
+    @staticmethod
+    def key(cid, version, snapshot_id, created_at):
+        raw = f"v{DN_RENDER_VERSION}|{cid}|{version}|{snapshot_id}|{created_at}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def _dir(self, cid):
+        return os.path.join(self.directory, hashlib.sha1(str(cid).encode("utf-8")).hexdigest()[:16])
+
+    def _path(self, cid, version, key):
+        return os.path.join(self._dir(cid), f"v{int(version)}-{key[:16]}.pdf")
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            self._stats["hits"] += 1
+        return data
+
+    def get(self, cid, version, key, load_payload, created_at):
+        """Return bytes PDF; render (sekali per key, walau diminta bersamaan) jika belum ada."""
+        path = self._path(cid, version, key)
+        data = self._read(path)
+        if data is not None:
+            return data
+        # lock per key hanya selama ada yang menunggu render; dilepas di semua jalur
+        with self._lock:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                data = self._read(path)   # sudah dirender peminta lain selagi menunggu
+                if data is not None:
+                    return data
+                data = render_pdf(cid, version, created_at, load_payload())
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                    with open(tmp, "wb") as f:
+                        f.write(data)
+                    os.replace(tmp, path)
+                except OSError:
+                    pass  # disk penuh/read-only: tetap kirim hasil render
+                with self._lock:
+                    self._stats["renders"] += 1
+                return data
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    self._locks.pop(key, None)
+
+    def forget(self, cid):
+        """Hapus semua PDF kontainer (dipanggil saat kontainer/snapshot dihapus)."""
+        shutil.rmtree(self._dir(cid), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+dn_pdf_cache = DnPdfCache()
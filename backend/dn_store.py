@@ -0,0 +1,153 @@
+# backend/dn_store.py
+"""Penyimpanan snapshot DN yang ringkas.
+
+Tiap baris DN disimpan sekali di `dn_line` (content-addressed: sha1 dari JSON
+baris), tiap versi di `dn_snapshots` hanya menyimpan header terkompresi dan
+daftar id dn_line per batch (juga terkompresi). Revisi DN yang nyaris sama
+berbagi hampir semua baris. `dn_line.refs` = jumlah snapshot yang memakai baris;
+hapus snapshot lewat `delete_snapshots` supaya baris yatim ikut terhapus.
+
+Snapshot lama (format 0, JSON utuh di kolom payload) tetap bisa dibaca.
+"""
+import hashlib, json, zlib
+
+from db import chunked, marks
+
+FORMAT_JSON = 0
+FORMAT_COMPACT = 1
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+def _pack(obj) -> bytes:
+    return zlib.compress(_dumps(obj), 6)
+
+def _unpack(blob):
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+def _line_ids(conn, lines):
+    """Simpan baris yang belum ada; return list id dn_line sejajar dengan `lines`."""
+    digests = []
+    bodies = {}
+    for line in lines:
+        raw = _dumps(line)
+        d = hashlib.sha1(raw).digest()
+        digests.append(d)
+        bodies.setdefault(d, raw)
+    conn.executemany(
+        "INSERT OR IGNORE INTO dn_line (hash, body, refs) VALUES (?, ?, 0)",
+        ((d, zlib.compress(raw, 6)) for d, raw in bodies.items()),
+    )
+    ids = {}
+    for chunk in chunked(list(bodies)):
+        for r in conn.execute(f"SELECT id, hash FROM dn_line WHERE hash IN ({marks(len(chunk))})", chunk):
+            ids[bytes(r[1])] = r[0]
+    conn.executemany("UPDATE dn_line SET refs = refs + 1 WHERE id=?", ((ids[d],) for d in bodies))
+    return [ids[d] for d in digests]
+
+def _encode(conn, payload):
+    """payload -> (header, lines, line_count, totals) untuk kolom dn_snapshots."""
+    header = {k: v for k, v in payload.items() if k != "batches"}
+    labels, flat = [], []
+    for label, lines in (payload.get("batches") or {}).items():
+        labels.append((label, len(lines)))
+        flat.extend(lines)
+    ids = _line_ids(conn, flat)
+    refs, pos = [], 0
+    for label, n in labels:
+        refs.append([label, ids[pos:pos + n]])
+        pos += n
+    return _pack(header), _pack(refs), len(flat), json.dumps(payload.get("totals") or {})
+
+def save(conn, cid, version, payload, created_at, created_by=None):
+    """Simpan payload DN ({container, batches, totals, ...}) sebagai snapshot ringkas (tanpa commit)."""
+    conn.execute("""
+      INSERT INTO dn_snapshots (container_id, version, payload, created_at, created_by,
+                                format, header, lines, line_count, totals)
+      VALUES (?, ?, '', ?, ?, ?, ?, ?, ?, ?)
+    """, (cid, version, created_at, created_by, FORMAT_COMPACT, *_encode(conn, payload)))
+
+def load(conn, row):
+    """Bangun ulang payload satu snapshot. `row` minimal punya format, payload, header, lines."""
+    if int(row["format"] or 0) == FORMAT_JSON:
+        return json.loads(row["payload"]) if row["payload"] else {}
+    data = _unpack(row["header"])
+    refs = _unpack(row["lines"])
+    bodies = {}
+    for chunk in chunked(list({i for _, ids in refs for i in ids})):
+        for r in conn.execute(f"SELECT id, body FROM dn_line WHERE id IN ({marks(len(chunk))})", chunk):
+            bodies[r[0]] = json.loads(zlib.decompress(r[1]).decode("utf-8"))
+    data["batches"] = {label: [bodies[i] for i in ids] for label, ids in refs}
+    return data
+
+def referenced_lines(lines_blob):
+    """Set id dn_line yang dipakai satu snapshot (kolom `lines`)."""
+    return {i for _, ids in _unpack(lines_blob) for i in ids} if lines_blob else set()
+
+def _line_keys(row):
+    """Snapshot -> {key baris: body atau None}. Format ringkas: key = id dn_line (body dibaca
+    bila perlu); format lama: key = sha1 JSON baris, body langsung dari payload."""
+    if int(row["format"] or 0) == FORMAT_COMPACT:
+        return dict.fromkeys(referenced_lines(row["lines"]))
+    payload = json.loads(row["payload"]) if row["payload"] else {}
+    return {hashlib.sha1(_dumps(line)).digest(): line
+            for lines in (payload.get("batches") or {}).values() for line in lines}
+
+def version_diffs(conn, rows):
+    """Ringkasan perubahan tiap versi terhadap versi sebelumnya (rows urut versi, kolom
+    format, payload, lines): [{added, removed, changed}] berisi jumlah id_code. Baris identik
+    punya key sama, jadi hanya baris yang berbeda yang dibaca; 'changed' = condition atau
+    return_condition berubah."""
+    bodies = {}
+    def state(keys):
+        need = [k for k, body in keys.items() if body is None and k not in bodies]
+        for chunk in chunked(need):
+            for r in conn.execute(f"SELECT id, body FROM dn_line WHERE id IN ({marks(len(chunk))})", chunk):
+                bodies[r[0]] = json.loads(zlib.decompress(r[1]).decode("utf-8"))
+        out = {}
+        for k, body in keys.items():
+            line = body if body is not None else bodies.get(k) or {}
+            out[line.get("id_code")] = (line.get("condition") or "", line.get("return_condition") or "")
+        return out
+
+    out, prev = [], None
+    for row in rows:
+        curr = _line_keys(row)
+        if prev is None:
+            out.append({"added": 0, "removed": 0, "changed": 0})
+        else:
+            a = state({k: v for k, v in prev.items() if k not in curr})
+            b = state({k: v for k, v in curr.items() if k not in prev})
+            out.append({
+                "added": len(b.keys() - a.keys()),
+                "removed": len(a.keys() - b.keys()),
+                "changed": sum(1 for code in a.keys() & b.keys() if a[code] != b[code]),
+            })
+        prev = curr
+    return out
+
+def delete_snapshots(conn, where, params=()):
+    """Hapus dn_snapshots yang cocok `where` (SQL tanpa 'WHERE') dan lepas referensi
+    dn_line-nya; baris yang tidak dipakai lagi ikut dihapus. Return jumlah snapshot."""
+    released = {}
+    rows = conn.execute(f"SELECT id, format, lines FROM dn_snapshots WHERE {where}", params).fetchall()
+    for _id, fmt, lines in rows:
+        if int(fmt or 0) == FORMAT_COMPACT:
+            for i in referenced_lines(lines):
+                released[i] = released.get(i, 0) + 1
+    conn.executemany("UPDATE dn_line SET refs = refs - ? WHERE id=?", ((n, i) for i, n in released.items()))
+    for chunk in chunked(list(released)):
+        conn.execute(f"DELETE FROM dn_line WHERE refs <= 0 AND id IN ({marks(len(chunk))})", chunk)
+    conn.execute(f"DELETE FROM dn_snapshots WHERE {where}", params)
+    return len(rows)
+
+def compact_legacy(conn):
+    """Ubah snapshot format 0 (JSON utuh) ke format ringkas. Return jumlah yang diubah."""
+    rows = conn.execute("SELECT id, payload FROM dn_snapshots WHERE format=?", (FORMAT_JSON,)).fetchall()
+    for snap_id, payload in rows:
+        encoded = _encode(conn, json.loads(payload) if payload else {})
+        conn.execute(
+            "UPDATE dn_snapshots SET payload='', format=?, header=?, lines=?, line_count=?, totals=? WHERE id=?",
+            (FORMAT_COMPACT, *encoded, snap_id),
+        )
+    return len(rows)
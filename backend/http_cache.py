@@ -0,0 +1,35 @@
+# backend/http_cache.py
+"""ETag/304 untuk endpoint baca berbasis versi data (tabel table_version).
+
+Versi dibaca sebelum query utama: kalau ada tulis di antaranya, ETag yang
+dikirim "lebih tua" dari isi response sehingga request berikutnya tetap
+mengambil ulang (tidak pernah 304 untuk data yang sudah berubah).
+"""
+import hashlib
+from functools import wraps
+
+from flask import request, make_response
+
+from db import connection, table_versions
+
+def versioned(*tables):
+    """Decorator view GET: balas 304 jika If-None-Match cocok dengan versi `tables`
+    saat ini (tanpa menjalankan view); selain itu pasang ETag pada response 200."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with connection() as conn:
+                version = table_versions(conn, tables)
+            tag = hashlib.sha1(f"{request.full_path}|{version}".encode()).hexdigest()[:20]
+            if request.if_none_match.contains_weak(tag):
+                resp = make_response("", 304)
+            else:
+                resp = make_response(fn(*args, **kwargs))
+                if resp.status_code != 200:
+                    return resp
+            resp.set_etag(tag, weak=True)
+            # browser wajib revalidasi (If-None-Match otomatis dari HTTP cache)
+            resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
+        return wrapper
+    return deco
@@ -0,0 +1,730 @@
+# backend/migrations.py
+"""Migrasi skema bernomor. Versi yang sudah diterapkan disimpan di
+`PRAGMA user_version`, jadi start-up cukup satu PRAGMA kalau skema sudah terbaru.
+
+Menambah perubahan skema: tulis fungsi `_mNNN_xxx(cur)` baru dan daftarkan di
+MIGRATIONS dengan nomor berikutnya. Jangan ubah migrasi yang sudah rilis.
+"""
+import hashlib, json, zlib
+
+def _column_exists(cur, table, name):
+    cols = cur.execute(f"PRAGMA table_info({table})").fetchall()
+    return any(c[1] == name for c in cols)
+
+def _m001_baseline(cur):
+    """Skema awal (dulu init_db). Idempotent agar DB lama (user_version=0) ikut aman."""
+    # ==== Items (existing) ====
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS item_unit (
+        id_code TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        category TEXT NOT NULL,
+        model TEXT NOT NULL,
+        rack TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'Good',     -- Good | Keluar | Rusak | Hilang | Afkir
+        defect_level TEXT DEFAULT 'none',        -- none | ringan | berat
+        serial TEXT,
+        created_at TEXT NOT NULL,
+        is_universal INTEGER NOT NULL DEFAULT 0  -- 1 jika universal (tidak mengunci saat checkout)
+    );
+    """)
+
+    # ==== Containers (new) ====
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS containers (
+        id TEXT PRIMARY KEY,                     -- CTR-YYYYMMDD-XXXX
+        event_name TEXT NOT NULL,
+        pic TEXT NOT NULL,
+        crew TEXT,
+        location TEXT,
+        start_date TEXT,
+        end_date TEXT,
+        order_title TEXT,                        -- optional: Order label/title for DN
+        status TEXT NOT NULL DEFAULT 'Open',     -- Open | Closed
+        created_at TEXT NOT NULL
+    );
+    """)
+
+    # Backfill missing columns for older DBs
+    if not _column_exists(cur, "containers", "order_title"):
+        cur.execute("ALTER TABLE containers ADD COLUMN order_title TEXT;")
+
+    # ==== Container items (new) ====
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS container_item (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        container_id TEXT NOT NULL,
+        id_code TEXT NOT NULL,
+        added_at TEXT NOT NULL,
+        batch_label TEXT NOT NULL,               -- MAIN | AMEND-YYYYMMDD-HHMM
+        condition_at_checkout TEXT,              -- good | rusak_ringan | rusak_berat
+        override_reason TEXT,                    -- alasan jika rusak_berat
+        amend_reason TEXT,                       -- alasan jika batch AMEND
+        override_by TEXT,                        -- (opsional) siapa yang setujui
+        voided_at TEXT,                          -- jika dibatalkan (mis-scan)
+        void_reason TEXT,                        -- alasan void
+        returned_at TEXT,                        -- waktu kembali
+        return_condition TEXT,                   -- good | rusak_ringan | rusak_berat
+        damage_note TEXT,                        -- catatan kerusakan saat kembali
+        FOREIGN KEY(container_id) REFERENCES containers(id),
+        FOREIGN KEY(id_code) REFERENCES item_unit(id_code)
+    );
+    """)
+
+    # Tambahkan kolom jika DB lama
+    need_cols = {
+        "container_item": [
+            ("condition_at_checkout", "TEXT"),
+            ("override_reason", "TEXT"),
+            ("amend_reason", "TEXT"),
+            ("override_by", "TEXT"),
+            ("voided_at", "TEXT"),
+            ("void_reason", "TEXT"),
+            ("returned_at", "TEXT"),
+            ("return_condition", "TEXT"),
+            ("damage_note", "TEXT"),
+        ]
+    }
+    for table, cols in need_cols.items():
+        for name, ddl in cols:
+            if not _column_exists(cur, table, name):
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {ddl};")
+
+    # Unique index: 1 item aktif hanya sekali per kontainer (abaikan yang sudah void)
+    cur.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS uq_container_item_active
+    ON container_item(container_id, id_code)
+    WHERE voided_at IS NULL;
+    """)
+
+    # ==== DN Snapshots ====
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS dn_snapshots (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        container_id TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        payload TEXT NOT NULL,                   -- JSON (header, items per batch, counters)
+        created_at TEXT NOT NULL,
+        created_by TEXT
+    );
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS ix_dn_snapshots_container
+    ON dn_snapshots(container_id, version);
+    """)
+    
+    # Tambahkan kolom untuk DB lama (backward compatible)
+    if not _column_exists(cur, "item_unit", "is_universal"):
+        cur.execute("ALTER TABLE item_unit ADD COLUMN is_universal INTEGER NOT NULL DEFAULT 0;")
+
+    # ==== Index untuk performa list & summary ====
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_created_at ON item_unit(created_at);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_category   ON item_unit(category);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_status     ON item_unit(status);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_model      ON item_unit(model);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_rack       ON item_unit(rack);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_name       ON item_unit(name);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_universal  ON item_unit(is_universal);")
+
+    # ==== Maintenance / Repair logs ====
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS item_repair_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_code TEXT NOT NULL,
+        defect_before TEXT,            -- none | ringan | berat
+        status_before TEXT,            -- Good | Rusak | Keluar | ...
+        last_damage_note TEXT,         -- catatan kerusakan terakhir (dari container_item)
+        repair_note TEXT NOT NULL,     -- catatan penanganan (wajib dari PIC)
+        result_status TEXT,            -- Good | Rusak | Afkir (Broken)
+        result_defect TEXT,            -- none | ringan | berat
+        repaired_at TEXT NOT NULL,     -- timestamp perbaikan
+        FOREIGN KEY(id_code) REFERENCES item_unit(id_code)
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_repair_code ON item_repair_log(id_code, repaired_at);")
+
+    # add columns for existing DBs
+    for name, ddl in (("result_status", "TEXT"), ("result_defect", "TEXT")):
+        if not _column_exists(cur, "item_repair_log", name):
+            cur.execute(f"ALTER TABLE item_repair_log ADD COLUMN {name} {ddl};")
+
+    # ==== E-Money tracking ====
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS emoney (
+        id TEXT PRIMARY KEY,                -- EM-YYYYMMDD-XXXX
+        label TEXT NOT NULL UNIQUE,         -- e.g., Emoney 001 CI
+        status TEXT NOT NULL DEFAULT 'Open',-- Open | Closed
+        created_at TEXT NOT NULL
+    );
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS emoney_tx (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        emoney_id TEXT NOT NULL,
+        type TEXT NOT NULL,                 -- topup | expense
+        amount_cents INTEGER NOT NULL,      -- positive integer (in cents)
+        note TEXT,
+        ref_container_id TEXT,              -- optional link to containers.id
+        created_at TEXT NOT NULL,
+        FOREIGN KEY(emoney_id) REFERENCES emoney(id),
+        FOREIGN KEY(ref_container_id) REFERENCES containers(id)
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_emoney_label ON emoney(label);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_emoney_tx_eid ON emoney_tx(emoney_id, created_at);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_emoney_tx_container ON emoney_tx(ref_container_id);")
+
+def _m002_item_code_seq(cur):
+    """Counter nomor urut id_code per (prefix, model), di-seed dari kode yang sudah ada."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS item_code_seq (
+        base TEXT PRIMARY KEY,                   -- PREFIX-MODEL- (sudah disanitasi)
+        last_n INTEGER NOT NULL DEFAULT 0        -- nomor terakhir yang dialokasikan
+    );
+    """)
+    last = {}
+    for (code,) in cur.execute("SELECT id_code FROM item_unit").fetchall():
+        if "-" not in code:
+            continue
+        head, tail = code.rsplit("-", 1)
+        if tail.isdigit():
+            base = head + "-"
+            last[base] = max(last.get(base, 0), int(tail))
+    cur.executemany(
+        "INSERT OR REPLACE INTO item_code_seq (base, last_n) VALUES (?, ?)",
+        list(last.items()),
+    )
+
+ITEM_SEARCH_COLS = ("id_code", "name", "category", "model", "rack", "status", "defect_level")
+
+def _m003_item_search(cur):
+    """Index FTS5 trigram (external content) atas item_unit, disinkron oleh trigger.
+    Dilewati jika SQLite tidak punya FTS5/trigram; pencarian lalu fallback ke LIKE."""
+    cols = ", ".join(ITEM_SEARCH_COLS)
+    new_vals = ", ".join(f"new.{c}" for c in ITEM_SEARCH_COLS)
+    old_vals = ", ".join(f"old.{c}" for c in ITEM_SEARCH_COLS)
+    try:
+        cur.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS item_search USING fts5(
+            {cols},
+            content='item_unit', content_rowid='rowid', tokenize='trigram'
+        );
+        """)
+    except Exception as e:
+        print("[DB] FTS5 trigram tidak tersedia, pencarian memakai LIKE:", e)
+        return
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_item_search_ai AFTER INSERT ON item_unit BEGIN
+        INSERT INTO item_search(rowid, {cols}) VALUES (new.rowid, {new_vals});
+    END;
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_item_search_ad AFTER DELETE ON item_unit BEGIN
+        INSERT INTO item_search(item_search, rowid, {cols}) VALUES ('delete', old.rowid, {old_vals});
+    END;
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_item_search_au AFTER UPDATE OF {cols} ON item_unit BEGIN
+        INSERT INTO item_search(item_search, rowid, {cols}) VALUES ('delete', old.rowid, {old_vals});
+        INSERT INTO item_search(rowid, {cols}) VALUES (new.rowid, {new_vals});
+    END;
+    """)
+    cur.execute("INSERT INTO item_search(item_search) VALUES ('rebuild');")
+
+def _m004_keyset_indexes(cur):
+    """Index komposit (created_at, id) untuk keyset pagination list items/containers/emoney."""
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_created_id ON item_unit(created_at, id_code);")
+    cur.execute("DROP INDEX IF EXISTS ix_item_created_at;")  # sudah tercakup ix_item_created_id
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_containers_created_id ON containers(created_at, id);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_emoney_created_id ON emoney(created_at, id);")
+
+def _m005_item_summary(cur):
+    """Ringkasan stok ter-materialisasi per (category, name, model, status, defect_level),
+    dijaga tepat oleh trigger di item_unit. defect_level NULL disimpan sebagai ''."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS item_summary (
+        category TEXT NOT NULL,
+        name TEXT NOT NULL,
+        model TEXT NOT NULL,
+        status TEXT NOT NULL,
+        defect_level TEXT NOT NULL,
+        qty INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (category, name, model, status, defect_level)
+    );
+    """)
+    incr = """
+        INSERT INTO item_summary (category, name, model, status, defect_level, qty)
+        VALUES (new.category, new.name, new.model, new.status, IFNULL(new.defect_level, ''), 1)
+        ON CONFLICT (category, name, model, status, defect_level) DO UPDATE SET qty = qty + 1;
+    """
+    decr = """
+        UPDATE item_summary SET qty = qty - 1
+        WHERE category=old.category AND name=old.name AND model=old.model
+          AND status=old.status AND defect_level=IFNULL(old.defect_level, '');
+        DELETE FROM item_summary
+        WHERE category=old.category AND name=old.name AND model=old.model
+          AND status=old.status AND defect_level=IFNULL(old.defect_level, '') AND qty <= 0;
+    """
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_item_summary_ai AFTER INSERT ON item_unit BEGIN {incr} END;")
+    cur.execute(f"CREATE TRIGGER IF NOT EXISTS trg_item_summary_ad AFTER DELETE ON item_unit BEGIN {decr} END;")
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_item_summary_au
+    AFTER UPDATE OF category, name, model, status, defect_level ON item_unit BEGIN {decr} {incr} END;
+    """)
+    cur.execute("DELETE FROM item_summary;")
+    cur.execute("""
+    INSERT INTO item_summary (category, name, model, status, defect_level, qty)
+    SELECT category, name, model, status, IFNULL(defect_level, ''), COUNT(*)
+    FROM item_unit GROUP BY 1, 2, 3, 4, 5;
+    """)
+
+# Fakta "kembali terakhir" per item, sama persis dengan subquery lama di maintenance_list
+LAST_DAMAGE_NOTE_SQL = """(
+    SELECT ci.damage_note FROM container_item ci
+    WHERE ci.id_code = {code} AND ci.damage_note IS NOT NULL
+    ORDER BY ci.returned_at DESC, ci.id DESC
+    LIMIT 1
+)"""
+LAST_RETURNED_AT_SQL = """(
+    SELECT ci.returned_at FROM container_item ci
+    WHERE ci.id_code = {code} AND ci.returned_at IS NOT NULL
+    ORDER BY ci.returned_at DESC, ci.id DESC
+    LIMIT 1
+)"""
+
+def _m006_item_last_return(cur):
+    """Kolom item_unit.last_damage_note/last_returned_at, dihitung ulang per id_code
+    oleh trigger container_item (insert/update/delete) memakai index (id_code, returned_at)."""
+    for name in ("last_damage_note", "last_returned_at"):
+        if not _column_exists(cur, "item_unit", name):
+            cur.execute(f"ALTER TABLE item_unit ADD COLUMN {name} TEXT;")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_ci_code_returned ON container_item(id_code, returned_at);")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_status_sort ON item_unit(status, category, name, model);")
+
+    def refresh(code):
+        return f"""
+        UPDATE item_unit SET
+            last_damage_note = {LAST_DAMAGE_NOTE_SQL.format(code=code)},
+            last_returned_at = {LAST_RETURNED_AT_SQL.format(code=code)}
+        WHERE id_code = {code};
+        """
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_last_return_ai AFTER INSERT ON container_item
+    WHEN new.returned_at IS NOT NULL OR new.damage_note IS NOT NULL
+    BEGIN {refresh("new.id_code")} END;
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_last_return_au AFTER UPDATE OF id_code, returned_at, damage_note ON container_item
+    BEGIN {refresh("old.id_code")} {refresh("new.id_code")} END;
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_last_return_ad AFTER DELETE ON container_item
+    BEGIN {refresh("old.id_code")} END;
+    """)
+    # item dibuat ulang dengan kode yang punya riwayat lama
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_item_last_return_ai AFTER INSERT ON item_unit
+    WHEN EXISTS (SELECT 1 FROM container_item WHERE id_code = new.id_code)
+    BEGIN {refresh("new.id_code")} END;
+    """)
+    cur.execute(f"""
+    UPDATE item_unit SET
+        last_damage_note = {LAST_DAMAGE_NOTE_SQL.format(code="item_unit.id_code")},
+        last_returned_at = {LAST_RETURNED_AT_SQL.format(code="item_unit.id_code")};
+    """)
+
+# Baris aktif "sekarang" untuk id_code: belum void & belum kembali; yang ditandai
+# hilang didahulukan (sama dengan prioritas lost_context), lalu baris terbaru.
+CURRENT_LINE_SQL = """(
+    SELECT ci.id, ci.container_id FROM container_item ci
+    WHERE ci.id_code = {code} AND ci.returned_at IS NULL AND ci.voided_at IS NULL
+    ORDER BY (LOWER(IFNULL(ci.return_condition, '')) = 'hilang') DESC, ci.id DESC
+    LIMIT 1
+)"""
+
+def _m007_item_current_line(cur):
+    """Pointer item_unit.current_line_id/current_container_id ke baris container_item
+    yang sedang aktif. Di-set/di-clear oleh trigger dalam transaksi yang sama dengan
+    add_items, checkin, void_item (dan hapus kontainer)."""
+    for name, typ in (("current_container_id", "TEXT"), ("current_line_id", "INTEGER")):
+        if not _column_exists(cur, "item_unit", name):
+            cur.execute(f"ALTER TABLE item_unit ADD COLUMN {name} {typ};")
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_current_container ON item_unit(current_container_id);")
+
+    def refresh(code):
+        return f"""
+        UPDATE item_unit SET (current_line_id, current_container_id) = {CURRENT_LINE_SQL.format(code=code)}
+        WHERE id_code = {code};
+        """
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_current_ai AFTER INSERT ON container_item
+    WHEN new.returned_at IS NULL AND new.voided_at IS NULL
+    BEGIN {refresh("new.id_code")} END;
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_current_au
+    AFTER UPDATE OF id_code, container_id, returned_at, voided_at, return_condition ON container_item
+    BEGIN {refresh("old.id_code")} {refresh("new.id_code")} END;
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_current_ad AFTER DELETE ON container_item
+    WHEN old.returned_at IS NULL AND old.voided_at IS NULL
+    BEGIN {refresh("old.id_code")} END;
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_item_current_ai AFTER INSERT ON item_unit
+    WHEN EXISTS (SELECT 1 FROM container_item WHERE id_code = new.id_code)
+    BEGIN {refresh("new.id_code")} END;
+    """)
+    cur.execute(f"""
+    UPDATE item_unit SET (current_line_id, current_container_id) = {CURRENT_LINE_SQL.format(code="item_unit.id_code")};
+    """)
+
+def _m008_item_event(cur):
+    """Timeline per item (append-only). Event container_item & repair diisi trigger;
+    perubahan status manual (bulk_update_condition/mark_lost) ditulis handler."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS item_event (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id_code TEXT NOT NULL,         -- tanpa FK: riwayat tetap ada walau item dihapus
+        ts TEXT NOT NULL,
+        kind TEXT NOT NULL,            -- checkout | return | lost | void | repair | status
+        container_id TEXT,
+        ref_id INTEGER,                -- container_item.id / item_repair_log.id
+        condition TEXT,                -- kondisi checkout/return
+        prev_status TEXT,
+        status TEXT,                   -- status item setelah event (repair/status)
+        defect_level TEXT,
+        note TEXT,
+        actor TEXT
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_item_event_code_ts ON item_event(id_code, ts, id);")
+
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_event_ai AFTER INSERT ON container_item
+    BEGIN
+        INSERT INTO item_event (id_code, ts, kind, container_id, ref_id, condition, note)
+        VALUES (new.id_code, new.added_at, 'checkout', new.container_id, new.id,
+                new.condition_at_checkout, COALESCE(new.amend_reason, new.override_reason));
+    END;
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_event_return AFTER UPDATE OF returned_at ON container_item
+    WHEN new.returned_at IS NOT NULL
+    BEGIN
+        INSERT INTO item_event (id_code, ts, kind, container_id, ref_id, condition, note)
+        VALUES (new.id_code, new.returned_at, 'return', new.container_id, new.id,
+                new.return_condition, new.damage_note);
+    END;
+    """)
+    # lost: checkin 'hilang' mengisi return_condition tanpa returned_at
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_event_lost AFTER UPDATE OF return_condition ON container_item
+    WHEN new.returned_at IS NULL AND LOWER(IFNULL(new.return_condition, '')) = 'hilang'
+    BEGIN
+        INSERT INTO item_event (id_code, ts, kind, container_id, ref_id, condition, note)
+        VALUES (new.id_code, strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'), 'lost',
+                new.container_id, new.id, 'hilang', new.damage_note);
+    END;
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_event_void AFTER UPDATE OF voided_at ON container_item
+    WHEN old.voided_at IS NULL AND new.voided_at IS NOT NULL
+    BEGIN
+        INSERT INTO item_event (id_code, ts, kind, container_id, ref_id, condition, note)
+        VALUES (new.id_code, new.voided_at, 'void', new.container_id, new.id,
+                new.condition_at_checkout, new.void_reason);
+    END;
+    """)
+    cur.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_repair_event_ai AFTER INSERT ON item_repair_log
+    BEGIN
+        INSERT INTO item_event (id_code, ts, kind, ref_id, prev_status, status, defect_level, note)
+        VALUES (new.id_code, new.repaired_at, 'repair', new.id, new.status_before,
+                new.result_status, new.result_defect, new.repair_note);
+    END;
+    """)
+
+    # backfill dari riwayat yang ada (checkin berulang sebelum ini tidak tercatat)
+    cur.execute("""
+    INSERT INTO item_event (id_code, ts, kind, container_id, ref_id, condition, prev_status, status, defect_level, note)
+    SELECT id_code, ts, kind, container_id, ref_id, condition, prev_status, status, defect_level, note FROM (
+        SELECT id_code, added_at AS ts, 0 AS seq, 'checkout' AS kind, container_id, id AS ref_id,
+               condition_at_checkout AS condition, NULL AS prev_status, NULL AS status, NULL AS defect_level,
+               COALESCE(amend_reason, override_reason) AS note
+        FROM container_item
+        UNION ALL
+        SELECT id_code, returned_at, 1, 'return', container_id, id, return_condition, NULL, NULL, NULL, damage_note
+        FROM container_item WHERE returned_at IS NOT NULL
+        UNION ALL
+        SELECT id_code, added_at, 1, 'lost', container_id, id, 'hilang', NULL, NULL, NULL, damage_note
+        FROM container_item WHERE returned_at IS NULL AND LOWER(IFNULL(return_condition, '')) = 'hilang'
+        UNION ALL
+        SELECT id_code, voided_at, 2, 'void', container_id, id, condition_at_checkout, NULL, NULL, NULL, void_reason
+        FROM container_item WHERE voided_at IS NOT NULL
+        UNION ALL
+        SELECT id_code, repaired_at, 1, 'repair', NULL, id, NULL, status_before, result_status, result_defect, repair_note
+        FROM item_repair_log
+    ) ORDER BY ts, seq, ref_id;
+    """)
+
+# tabel yang versinya dipakai ETag endpoint baca (lihat http_cache.versioned)
+VERSIONED_TABLES = ("item_unit", "containers", "container_item", "emoney", "emoney_tx", "dn_snapshots")
+
+def _m009_table_version(cur):
+    """Counter perubahan per tabel (dinaikkan trigger) untuk ETag/304 tanpa menjalankan query."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS table_version (
+        tbl TEXT PRIMARY KEY,
+        v INTEGER NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    """)
+    for tbl in VERSIONED_TABLES:
+        cur.execute("INSERT OR IGNORE INTO table_version (tbl, v) VALUES (?, 0)", (tbl,))
+        for ev in ("insert", "update", "delete"):
+            cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{tbl}_version_{ev[0]} AFTER {ev.upper()} ON {tbl}
+            BEGIN UPDATE table_version SET v = v + 1 WHERE tbl = '{tbl}'; END;
+            """)
+
+# Total per kontainer (containers.tot_<nama>), aturan sama dengan hitungan lama di _build_detail
+# dan cek "masih ada item belum kembali" di set_status. Ekspresi = kontribusi satu baris {l}.
+CONTAINER_TOTALS = ("all", "returned", "good", "rusak_ringan", "rusak_berat", "lost", "outstanding")
+_OUTSTANDING_LINE = """{l}.voided_at IS NULL AND {l}.returned_at IS NULL
+    AND LOWER(IFNULL({l}.return_condition, '')) <> 'hilang'"""
+_RETURN_CONDITION = "IFNULL(NULLIF({l}.return_condition, ''), 'good')"
+
+def container_total_exprs(l):
+    active = f"{l}.voided_at IS NULL"
+    returned = f"({active} AND {l}.returned_at IS NOT NULL)"
+    rc = _RETURN_CONDITION.format(l=l)
+    return {
+        "all": f"({active})",
+        "returned": returned,
+        "good": f"({returned} AND {rc} = 'good')",
+        "rusak_ringan": f"({returned} AND {rc} = 'rusak_ringan')",
+        "rusak_berat": f"({returned} AND {rc} = 'rusak_berat')",
+        "lost": f"""({active} AND CASE WHEN {l}.returned_at IS NOT NULL THEN {rc} = 'lost'
+                     ELSE LOWER(IFNULL({l}.return_condition, '')) = 'hilang' END)""",
+        "outstanding": f"""({_OUTSTANDING_LINE.format(l=l)} AND EXISTS (
+            SELECT 1 FROM item_unit iu WHERE iu.id_code = {l}.id_code AND IFNULL(iu.is_universal, 0) = 0))""",
+    }
+
+def _m010_container_totals(cur):
+    """Counter containers.tot_* dijaga trigger container_item (plus item_unit untuk
+    'outstanding', yang bergantung pada is_universal). Detail & cek close jadi O(1)."""
+    for k in CONTAINER_TOTALS:
+        if not _column_exists(cur, "containers", f"tot_{k}"):
+            cur.execute(f"ALTER TABLE containers ADD COLUMN tot_{k} INTEGER NOT NULL DEFAULT 0;")
+    # detail/rebuild membaca semua baris per kontainer (uq_container_item_active hanya baris aktif)
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_ci_container ON container_item(container_id);")
+
+    def apply(l, sign):
+        sets = ", ".join(f"tot_{k} = tot_{k} {sign} {e}" for k, e in container_total_exprs(l).items())
+        return f"UPDATE containers SET {sets} WHERE id = {l}.container_id;"
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_totals_ai AFTER INSERT ON container_item
+    WHEN new.voided_at IS NULL
+    BEGIN {apply("new", "+")} END;
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_totals_au
+    AFTER UPDATE OF id_code, container_id, voided_at, returned_at, return_condition ON container_item
+    BEGIN {apply("old", "-")} {apply("new", "+")} END;
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_ci_totals_ad AFTER DELETE ON container_item
+    WHEN old.voided_at IS NULL
+    BEGIN {apply("old", "-")} END;
+    """)
+
+    def outstanding(item, sign):
+        line = _OUTSTANDING_LINE.format(l="ci")
+        return f"""
+        UPDATE containers SET tot_outstanding = tot_outstanding {sign} (
+            SELECT COUNT(*) FROM container_item ci
+            WHERE ci.container_id = containers.id AND ci.id_code = {item}.id_code AND {line})
+        WHERE IFNULL({item}.is_universal, 0) = 0 AND id IN (
+            SELECT ci.container_id FROM container_item ci WHERE ci.id_code = {item}.id_code AND {line});
+        """
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_item_totals_ai AFTER INSERT ON item_unit
+    WHEN EXISTS (SELECT 1 FROM container_item WHERE id_code = new.id_code)
+    BEGIN {outstanding("new", "+")} END;
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_item_totals_au AFTER UPDATE OF id_code, is_universal ON item_unit
+    WHEN old.id_code IS NOT new.id_code OR IFNULL(old.is_universal, 0) <> IFNULL(new.is_universal, 0)
+    BEGIN {outstanding("old", "-")} {outstanding("new", "+")} END;
+    """)
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_item_totals_ad AFTER DELETE ON item_unit
+    WHEN EXISTS (SELECT 1 FROM container_item WHERE id_code = old.id_code)
+    BEGIN {outstanding("old", "-")} END;
+    """)
+    cur.execute(CONTAINER_TOTALS_REBUILD_SQL)
+
+CONTAINER_TOTALS_REBUILD_SQL = f"""
+    UPDATE containers SET ({", ".join(f"tot_{k}" for k in CONTAINER_TOTALS)}) = (
+        SELECT {", ".join(f"IFNULL(SUM({e}), 0)" for e in container_total_exprs("ci").values())}
+        FROM container_item ci WHERE ci.container_id = containers.id
+    );
+"""
+
+def _m011_container_lines_index(cur):
+    """Paging detail kontainer urut (added_at, id) tanpa sort; menggantikan ix_ci_container."""
+    cur.execute("CREATE INDEX IF NOT EXISTS ix_ci_container_added ON container_item(container_id, added_at, id);")
+    cur.execute("DROP INDEX IF EXISTS ix_ci_container;")
+
+# Format ringkas versi 1 dibekukan di sini (bukan import dn_store): migrasi yang sudah
+# rilis harus menghasilkan data yang sama walau dn_store berubah kemudian.
+def _m012_dumps(obj):
+    return json.dumps(obj, separators=(",", ":"), sort_keys=True).encode("utf-8")
+
+def _m012_line_ids(cur, lines):
+    """Simpan baris ke dn_line (content-addressed, refs dihitung); return id sejajar `lines`."""
+    digests, bodies = [], {}
+    for line in lines:
+        raw = _m012_dumps(line)
+        d = hashlib.sha1(raw).digest()
+        digests.append(d)
+        bodies.setdefault(d, raw)
+    ids = {}
+    for d, raw in bodies.items():
+        cur.execute("INSERT OR IGNORE INTO dn_line (hash, body, refs) VALUES (?, ?, 0)", (d, zlib.compress(raw, 6)))
+        ids[d] = cur.execute("SELECT id FROM dn_line WHERE hash=?", (d,)).fetchone()[0]
+        cur.execute("UPDATE dn_line SET refs = refs + 1 WHERE id=?", (ids[d],))
+    return [ids[d] for d in digests]
+
+def _m012_dn_compact(cur):
+    """Snapshot DN ringkas: baris content-addressed di dn_line, header & daftar baris
+    per versi terkompresi (lihat dn_store). Snapshot lama dikonversi di sini."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS dn_line (
+        id INTEGER PRIMARY KEY,
+        hash BLOB NOT NULL UNIQUE,     -- sha1 JSON baris
+        body BLOB NOT NULL,            -- JSON baris, zlib
+        refs INTEGER NOT NULL DEFAULT 0
+    );
+    """)
+    for name, ddl in (("format", "INTEGER NOT NULL DEFAULT 0"), ("header", "BLOB"), ("lines", "BLOB"),
+                      ("line_count", "INTEGER"), ("totals", "TEXT")):
+        if not _column_exists(cur, "dn_snapshots", name):
+            cur.execute(f"ALTER TABLE dn_snapshots ADD COLUMN {name} {ddl};")
+    # format 0 (JSON utuh di payload) -> format 1
+    for snap_id, payload in cur.execute("SELECT id, payload FROM dn_snapshots WHERE format=0").fetchall():
+        payload = json.loads(payload) if payload else {}
+        header = {k: v for k, v in payload.items() if k != "batches"}
+        labels, flat = [], []
+        for label, lines in (payload.get("batches") or {}).items():
+            labels.append((label, len(lines)))
+            flat.extend(lines)
+        ids = _m012_line_ids(cur, flat)
+        refs, pos = [], 0
+        for label, n in labels:
+            refs.append([label, ids[pos:pos + n]])
+            pos += n
+        cur.execute(
+            "UPDATE dn_snapshots SET payload='', format=1, header=?, lines=?, line_count=?, totals=? WHERE id=?",
+            (zlib.compress(_m012_dumps(header), 6), zlib.compress(_m012_dumps(refs), 6), len(flat),
+             json.dumps(payload.get("totals") or {}), snap_id),
+        )
+
+# Baris "belum kembali" (outstanding_items): aktif, belum kembali, tidak ditandai hilang.
+# Ditulis persis sama di query agar planner memakai partial index ix_ci_outstanding.
+OUTSTANDING_LINE_WHERE = "voided_at IS NULL AND returned_at IS NULL AND return_condition IS NOT 'hilang'"
+RETURN_CONDITIONS = ("good", "rusak_ringan", "rusak_berat", "lost", "hilang")
+
+def _m013_outstanding_index(cur):
+    """return_condition dinormalisasi (huruf kecil, '' -> NULL) dan dijaga trigger, jadi
+    filter 'hilang' tidak perlu LOWER(); partial index (added_at, id, container_id) hanya
+    memuat baris outstanding untuk paging & agregasi per kontainer."""
+    allowed = ", ".join(f"'{c}'" for c in RETURN_CONDITIONS)
+    # trg_ci_event_lost mencatat event 'lost' tiap UPDATE OF return_condition ke hilang;
+    # normalisasi 'Hilang' -> 'hilang' bukan kejadian baru, jadi trigger dilepas sementara
+    row = cur.execute("SELECT sql FROM sqlite_master WHERE type='trigger' AND name='trg_ci_event_lost'").fetchone()
+    cur.execute("DROP TRIGGER IF EXISTS trg_ci_event_lost;")
+    cur.execute("""
+    UPDATE container_item SET return_condition = NULLIF(LOWER(TRIM(return_condition)), '')
+    WHERE return_condition IS NOT NULL AND return_condition IS NOT NULLIF(LOWER(TRIM(return_condition)), '');
+    """)
+    if row:
+        cur.execute(row[0])
+    for ev, what in (("ai", "INSERT"), ("au", "UPDATE OF return_condition")):
+        cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_ci_return_condition_{ev} BEFORE {what} ON container_item
+        WHEN new.return_condition IS NOT NULL AND new.return_condition NOT IN ({allowed})
+        BEGIN SELECT RAISE(ABORT, 'return_condition tidak valid'); END;
+        """)
+    cur.execute(f"""
+    CREATE INDEX IF NOT EXISTS ix_ci_outstanding ON container_item(added_at, id, container_id)
+    WHERE {OUTSTANDING_LINE_WHERE};
+    """)
+
+def _m014_scan_session(cur):
+    """Sesi scan & tiket SSE sekali pakai di DB (bukan memori proses) supaya berlaku di
+    semua worker. Waktu dalam epoch detik (time.time())."""
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS scan_session (
+        sid TEXT PRIMARY KEY,
+        container_id TEXT NOT NULL,
+        user_id TEXT,
+        touched_at REAL NOT NULL
+    );
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS scan_ticket (
+        ticket TEXT PRIMARY KEY,
+        sid TEXT NOT NULL,
+        user_id TEXT,
+        expires_at REAL NOT NULL
+    );
+    """)
+
+MIGRATIONS = [
+    (1, "baseline schema", _m001_baseline),
+    (2, "item_code_seq", _m002_item_code_seq),
+    (3, "item_search fts5", _m003_item_search),
+    (4, "keyset indexes", _m004_keyset_indexes),
+    (5, "item_summary", _m005_item_summary),
+    (6, "item last return columns", _m006_item_last_return),
+    (7, "item current line pointer", _m007_item_current_line),
+    (8, "item_event timeline", _m008_item_event),
+    (9, "table_version counters", _m009_table_version),
+    (10, "container totals", _m010_container_totals),
+    (11, "container lines index", _m011_container_lines_index),
+    (12, "dn snapshot compact storage", _m012_dn_compact),
+    (13, "outstanding lines partial index", _m013_outstanding_index),
+    (14, "scan session & sse ticket", _m014_scan_session),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(conn):
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+def migrate(conn):
+    """Jalankan migrasi yang belum diterapkan. Return list versi yang dijalankan.
+
+    Semua migrasi pending berjalan dalam satu transaksi BEGIN IMMEDIATE, jadi
+    kalau beberapa worker start bersamaan hanya satu yang migrasi; sisanya
+    menunggu lock lalu melihat user_version sudah terbaru."""
+    if current_version(conn) >= LATEST_VERSION:
+        return []
+    cur = conn.cursor()
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        version = current_version(conn)  # cek ulang setelah pegang lock
+        applied = []
+        for num, _name, fn in MIGRATIONS:
+            if num <= version:
+                continue
+            fn(cur)
+            cur.execute(f"PRAGMA user_version={int(num)}")
+            applied.append(num)
+        conn.commit()
+        return applied
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,296 @@
+# backend/qr_render.py
+"""Render lembar label QR (multi-halaman PDF) untuk cetak massal.
+
+Tiap halaman dirender (QR + teks id_code) di process pool, lalu ditulis
+berurutan oleh PdfStream sebagai gambar 1-bit FlateDecode, sehingga response
+bisa di-stream halaman demi halaman tanpa library PDF tambahan.
+"""
+import os, threading, zlib, io, hashlib, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque, OrderedDict
+from functools import lru_cache
+
+import qrcode
+from qrcode.constants import ERROR_CORRECT_M
+from PIL import Image, ImageDraw, ImageFont
+
+# Label stock default: A4, label 2cm x 1cm (QR 1cm + teks), sama dengan print.css
+SHEET_LAYOUT = {
+    "page_w_mm": 210.0,
+    "page_h_mm": 297.0,
+    "margin_mm": 8.0,
+    "label_w_mm": 20.0,
+    "label_h_mm": 10.0,
+    "gap_mm": 1.0,
+    "dpi": 300,
+}
+
+QR_WORKERS = max(1, min(4, os.cpu_count() or 1))
+
+def labels_per_page(layout=SHEET_LAYOUT):
+    cols, rows = _grid(layout)
+    return cols * rows
+
+def _grid(layout):
+    usable_w = layout["page_w_mm"] - 2 * layout["margin_mm"] + layout["gap_mm"]
+    usable_h = layout["page_h_mm"] - 2 * layout["margin_mm"] + layout["gap_mm"]
+    cols = int(usable_w // (layout["label_w_mm"] + layout["gap_mm"]))
+    rows = int(usable_h // (layout["label_h_mm"] + layout["gap_mm"]))
+    return max(1, cols), max(1, rows)
+
+@lru_cache(maxsize=64)
+def font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow lama tanpa FreeType default font
+        return ImageFont.load_default()
+
+def qr_image(payload, px, border=1):
+    """QR hitam-putih (mode 'L') berukuran maksimal `px` x `px`.
+    Matriks modul di-scale langsung (NEAREST), lebih cepat dari make_image()."""
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_M, border=border, box_size=1)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    n = qr.modules_count
+    box = max(1, px // (n + 2 * border))
+    raw = bytes(0 if m else 255 for row in qr.modules for m in row)
+    img = Image.new("L", (n + 2 * border, n + 2 * border), 255)
+    img.paste(Image.frombytes("L", (n, n), raw), (border, border))
+    return img.resize((img.width * box, img.height * box), Image.NEAREST)
+
+_REF_SIZE = 20
+
+def _fit_size(draw, lines, box_w, max_size):
+    # lebar teks ~ linear terhadap ukuran font: ukur sekali di _REF_SIZE lalu skala
+    widest = max(draw.textlength(ln, font=font(_REF_SIZE)) for ln in lines) or 1
+    return max(6, min(max_size, int(_REF_SIZE * box_w / widest)))
+
+def _draw_fitted(draw, text, box_w, box_h, x, y):
+    lines = [text]
+    size = _fit_size(draw, lines, box_w, box_h // 3)
+    if size < box_h // 6:
+        # terlalu panjang untuk satu baris: pecah di '-' terdekat dengan tengah
+        dashes = [i for i, ch in enumerate(text) if ch == "-"]
+        cut = min(dashes, key=lambda i: abs(len(text) / 2 - (i + 1)), default=-1)
+        if cut > 0:
+            lines = [text[:cut + 1], text[cut + 1:]]
+            size = _fit_size(draw, lines, box_w, box_h // 4)
+    f = font(size)
+    line_h = size + 1
+    top = y + (box_h - line_h * len(lines)) // 2
+    for i, ln in enumerate(lines):
+        draw.text((x, top + i * line_h), ln, fill=0, font=f)
+
+def render_sheet(codes, layout=SHEET_LAYOUT):
+    """Render satu halaman label. Return (width_px, height_px, bytes 1-bit terkompres zlib)."""
+    dpi = layout["dpi"]
+    mm = dpi / 25.4
+    page_w, page_h = int(layout["page_w_mm"] * mm), int(layout["page_h_mm"] * mm)
+    label_w, label_h = int(layout["label_w_mm"] * mm), int(layout["label_h_mm"] * mm)
+    step_x = int((layout["label_w_mm"] + layout["gap_mm"]) * mm)
+    step_y = int((layout["label_h_mm"] + layout["gap_mm"]) * mm)
+    margin = int(layout["margin_mm"] * mm)
+    cols, _rows = _grid(layout)
+
+    page = Image.new("L", (page_w, page_h), 255)
+    draw = ImageDraw.Draw(page)
+    for i, code in enumerate(codes):
+        x = margin + (i % cols) * step_x
+        y = margin + (i // cols) * step_y
+        qr = qr_image(code, label_h)
+        page.paste(qr, (x + (label_h - qr.width) // 2, y + (label_h - qr.height) // 2))
+        _draw_fitted(draw, code, label_w - label_h - 2, label_h, x + label_h + 1, y)
+    mono = page.convert("1", dither=Image.NONE)
+    return page_w, page_h, zlib.compress(mono.tobytes(), 6)
+
+# ---------- process pool ----------
+# forkserver, bukan fork (default Linux): fork dari server Flask yang multi-thread ikut
+# menyalin lock yang sedang dipegang thread lain dan bisa deadlock di proses anak.
+# Dipakai bersama oleh lembar QR dan PDF surat jalan (dn_pdf).
+QR_MP_START = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=QR_WORKERS,
+                                            mp_context=multiprocessing.get_context(QR_MP_START))
+        return _executor
+
+def map_ordered(fn, items, *args):
+    """fn(item, *args) untuk tiap item di process pool; hasil di-yield berurutan.
+    Paling banyak 2x QR_WORKERS hasil ditahan di memori sekaligus. Tanpa pool
+    (mis. platform tanpa multiprocessing) dijalankan serial di proses ini."""
+    try:
+        ex = _get_executor()
+    except (OSError, NotImplementedError):
+        ex = None
+    if ex is None:
+        for item in items:
+            yield fn(item, *args)
+        return
+    window = deque()
+    for item in items:
+        window.append(ex.submit(fn, item, *args))
+        if len(window) >= 2 * QR_WORKERS:
+            yield window.popleft().result()
+    while window:
+        yield window.popleft().result()
+
+def render_pages(pages, layout=SHEET_LAYOUT):
+    """Render tiap halaman label di process pool; hasil di-yield berurutan."""
+    return map_ordered(render_sheet, pages, layout)
+
+# ---------- cache PNG QR tunggal (memori + disk) ----------
+QR_CACHE_DIR = os.path.join(os.path.dirname(__file__), "qr_cache")
+QR_CACHE_MEM_BYTES = 32 * 1024 * 1024
+QR_RENDER_VERSION = "1"  # naikkan jika cara render berubah agar key lama tidak dipakai
+
+class QrCache:
+    """Cache dua tingkat untuk PNG QR: LRU di memori (dibatasi byte) lalu file di
+    disk yang dialamatkan oleh hash payload + parameter render. Payload QR
+    (id_code) immutable, jadi entry tidak pernah perlu di-invalidate."""
+
+    def __init__(self, directory=QR_CACHE_DIR, mem_budget=QR_CACHE_MEM_BYTES):
+        self.directory = directory
+        self.mem_budget = mem_budget
+        self._mem = OrderedDict()
+        self._mem_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"mem_hits": 0, "disk_hits": 0, "misses": 0, "not_modified": 0}
+
+    @staticmethod
+    def key(payload, box_size=10, border=4):
+        raw = f"v{QR_RENDER_VERSION}|png|{box_size}|{border}|{payload}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".png")
+
+    def _remember(self, key, data):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                return
+            self._mem[key] = data
+            self._mem_bytes += len(data)
+            while self._mem_bytes > self.mem_budget and self._mem:
+                _k, old = self._mem.popitem(last=False)
+                self._mem_bytes -= len(old)
+
+    def note_not_modified(self):
+        with self._lock:
+            self._stats["not_modified"] += 1
+
+    def get_png(self, payload, box_size=10, border=4):
+        """Return (png_bytes, key). Render hanya jika belum ada di memori maupun disk."""
+        key = self.key(payload, box_size, border)
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                self._stats["mem_hits"] += 1
+                return data, key
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            with self._lock:
+                self._stats["disk_hits"] += 1
+            self._remember(key, data)
+            return data, key
+        except OSError:
+            pass
+        img = qrcode.make(payload, box_size=box_size, border=border)
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        data = buf.getvalue()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            pass  # disk penuh/read-only: tetap layani dari memori
+        with self._lock:
+            self._stats["misses"] += 1
+        self._remember(key, data)
+        return data, key
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+            s["mem_entries"] = len(self._mem)
+            s["mem_bytes"] = self._mem_bytes
+        s["mem_budget"] = self.mem_budget
+        return s
+
+qr_cache = QrCache()
+
+# ---------- minimal streaming PDF writer ----------
+class PdfStream:
+    """Tulis PDF berisi satu gambar 1-bit per halaman secara inkremental.
+    Objek 1 = Catalog, 2 = Pages (ditulis terakhir karena butuh daftar Kids)."""
+
+    def __init__(self, page_w_mm, page_h_mm):
+        self.page_w_pt = page_w_mm * 72 / 25.4
+        self.page_h_pt = page_h_mm * 72 / 25.4
+        self.offsets = {}
+        self.pos = 0
+        self.kids = []
+        self.next_id = 3
+
+    def _emit(self, data):
+        self.pos += len(data)
+        return data
+
+    def _obj(self, num, body):
+        self.offsets[num] = self.pos
+        return self._emit(b"%d 0 obj\n" % num + body + b"\nendobj\n")
+
+    def header(self):
+        return self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n") + self._obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    def page(self, width_px, height_px, data):
+        img_id, content_id, page_id = self.next_id, self.next_id + 1, self.next_id + 2
+        self.next_id += 3
+        self.kids.append(page_id)
+        w, h = self.page_w_pt, self.page_h_pt
+        img = (
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray"
+            b" /BitsPerComponent 1 /Filter /FlateDecode /Length %d >>\nstream\n" % (width_px, height_px, len(data))
+            + data + b"\nendstream"
+        )
+        content = b"q %.2f 0 0 %.2f 0 0 cm /Im0 Do Q" % (w, h)
+        out = self._obj(img_id, img)
+        out += self._obj(content_id, b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        out += self._obj(page_id, (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f]"
+            b" /Resources << /XObject << /Im0 %d 0 R >> >> /Contents %d 0 R >>" % (w, h, img_id, content_id)
+        ))
+        return out
+
+    def trailer(self):
+        kids = b" ".join(b"%d 0 R" % k for k in self.kids)
+        out = self._obj(2, b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(self.kids))
+        xref_pos = self.pos
+        size = self.next_id
+        xref = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        for num in range(1, size):
+            xref.append(b"%010d 00000 n \n" % self.offsets[num])
+        out += self._emit(b"".join(xref))
+        out += self._emit(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_pos))
+        return out
+
+def stream_pdf(codes, layout=SHEET_LAYOUT):
+    """Generator bytes PDF untuk daftar id_code (sudah termasuk duplikat per copy)."""
+    per_page = labels_per_page(layout)
+    pages = (codes[i:i + per_page] for i in range(0, len(codes), per_page))
+    pdf = PdfStream(layout["page_w_mm"], layout["page_h_mm"])
+    yield pdf.header()
+    for w, h, data in render_pages(pages, layout):
+        yield pdf.page(w, h, data)
+    yield pdf.trailer()
@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify
 from routes_auth import auth_required, require_roles
-from db import get_conn, DB_PATH, now_iso
-import os, shutil, datetime
+from db import connection, DB_PATH, now_iso, checkpoint, close_pool, pool_stats, rebuild_item_search, get_conn, init_db
+import os, shutil, datetime, sqlite3
 import json
+import consistency
+import dn_store
+import dn_pdf
 
 bp = Blueprint("admin_cleanup", __name__, url_prefix="/admin")
 
@@ -53,12 +56,14 @@ def _fmt_id_time(dt: datetime.datetime) -> str:
     except Exception:
         return dt.isoformat(timespec="minutes")
 
-def _make_snapshot(note: str | None = None):
+def _make_snapshot(note: str | None = None, conn=None):
     snap_dir = _ensure_snapshots_dir()
     ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
     base = f"snapshot_{ts}.sqlite3"
     dst = os.path.join(snap_dir, base)
-    # Ensure all writes flushed by copying while DB is not locked (best effort in dev)
+    # WAL mode: flush isi -wal ke file utama dulu agar hasil copy lengkap;
+    # pakai koneksi pemanggil (kalau ada) supaya tidak meminjam koneksi kedua dari pool
+    checkpoint(conn)
     shutil.copy2(DB_PATH, dst)
     # Write simple manifest
     man_path = os.path.join(snap_dir, f"snapshot_{ts}.json")
@@ -128,225 +133,221 @@ def cleanup_run():
     S = _iso_start(start)
     E = _iso_end(end)
 
-    conn = get_conn()
     try:
-        # Collect candidate containers (Closed, no outstanding, has emoney tx)
-        cur = conn.execute(
-            """
-            SELECT c.id,
-                   (SELECT MAX(returned_at) FROM container_item ci WHERE ci.container_id=c.id AND ci.voided_at IS NULL) AS last_returned_at,
-                   (SELECT MAX(created_at) FROM emoney_tx t WHERE t.ref_container_id=c.id) AS last_tx_at,
-                   (SELECT COUNT(*) FROM container_item ci2 WHERE ci2.container_id=c.id AND ci2.voided_at IS NULL AND ci2.returned_at IS NULL) AS left_count,
-                   (SELECT COUNT(*) FROM emoney_tx t2 WHERE t2.ref_container_id=c.id) AS tx_count
-            FROM containers c
-            WHERE c.status='Closed'
-            """
-        )
-        rows = cur.fetchall()
-        from_date = datetime.datetime.fromisoformat(S)
-        to_date = datetime.datetime.fromisoformat(E)
-        selected = []
-        for r in rows:
-            left_cnt = int(r["left_count"] or 0)
-            tx_cnt = int(r["tx_count"] or 0)
-            if left_cnt != 0 or tx_cnt == 0:
-                continue
-            last_ret = r["last_returned_at"]
-            last_tx = r["last_tx_at"]
-            fc_ts = None
-            for t in (last_ret, last_tx):
-                if t:
-                    try:
-                        dt = datetime.datetime.fromisoformat(t)
-                    except Exception:
-                        dt = None
-                    if dt and (fc_ts is None or dt > fc_ts):
-                        fc_ts = dt
-            if not fc_ts:
-                continue
-            if from_date <= fc_ts < to_date:
-                selected.append(r["id"])
-
-        # Always create snapshot before any destructive ops
-        snap = _make_snapshot(b.get("note"))
-
-        res = {
-            "batch_id": b.get("note") or f"batch-{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}",
-            "snapshot": snap,
-            "selected_containers": selected,
-            "deleted": {"containers": 0, "container_items": 0, "dn_snapshots": 0, "emoney_tx_removed": 0, "repair_logs": 0, "lost_entries": 0},
-            "cf_inserted": 0,
-        }
-
-        # Build emoney tx removal set
-        tx_ids = set()
-        tx_rows = []
-        if include_emoney and (selected or ("all" in scope)):
-            if "linked" in scope:
-                # linked to selected containers and within window
-                marks = ",".join(["?"] * len(selected))
-                q = (
-                    f"SELECT id, emoney_id, type, amount_cents FROM emoney_tx "
-                    f"WHERE ref_container_id IN ({marks}) AND created_at>=? AND created_at<? "
-                    f"AND (type='topup' OR type='expense') "
-                    f"AND (note IS NULL OR note NOT LIKE 'archive_carry_forward%')"
-                )
-                for r in conn.execute(q, (*selected, S, E)).fetchall():
-                    if r["id"] not in tx_ids:
-                        tx_ids.add(r["id"])
-                        tx_rows.append(dict(r))
-            if "all" in scope:
-                q = (
-                    "SELECT id, emoney_id, type, amount_cents FROM emoney_tx "
-                    "WHERE created_at>=? AND created_at<? AND (type='topup' OR type='expense') "
-                    "AND (note IS NULL OR note NOT LIKE 'archive_carry_forward%')"
-                )
-                for r in conn.execute(q, (S, E)).fetchall():
-                    if r["id"] not in tx_ids:
-                        tx_ids.add(r["id"])
-                        tx_rows.append(dict(r))
-
-            # Compute net per emoney account for this window
-            net = {}
-            for r in tx_rows:
-                eid = r["emoney_id"]
-                amt = int(r["amount_cents"] or 0)
-                if r["type"] == "topup":
-                    net[eid] = net.get(eid, 0) + amt
-                elif r["type"] == "expense":
-                    net[eid] = net.get(eid, 0) - amt
-
-            impacted = set(net.keys())
-            # Fold previous carry-forwards: delete old CF entries and insert single consolidated CF per account
-            combined = {}
-            eids_with_old_cf = []
-            for eid in impacted:
-                row = conn.execute(
-                    "SELECT SUM(CASE WHEN type='topup' THEN amount_cents ELSE -amount_cents END) s FROM emoney_tx WHERE emoney_id=? AND note LIKE 'archive_carry_forward%'",
-                    (eid,),
-                ).fetchone()
-                old_net = int(row["s"] or 0)
-                new_net = int(net.get(eid, 0) or 0)
-                combined[eid] = old_net + new_net
-                if old_net != 0:
-                    eids_with_old_cf.append(eid)
-
-            if eids_with_old_cf:
-                marks = ",".join(["?"] * len(eids_with_old_cf))
-                conn.execute(
-                    f"DELETE FROM emoney_tx WHERE note LIKE 'archive_carry_forward%' AND emoney_id IN ({marks})",
-                    tuple(eids_with_old_cf),
-                )
-
-            cf_count = 0
-            for eid, total in combined.items():
-                if total == 0:
-                    continue
-                ttype = "topup" if total > 0 else "expense"
-                amount = total if total > 0 else (-total)
-                conn.execute(
-                    "INSERT INTO emoney_tx (emoney_id, type, amount_cents, note, ref_container_id, created_at) VALUES (?, ?, ?, ?, NULL, ?)",
-                    (eid, ttype, amount, f"archive_carry_forward {res['batch_id']}", _iso_end(end)),
-                )
-                cf_count += 1
-            res["cf_inserted"] = cf_count
-
-            # Delete removed tx (window)
-            if tx_ids:
-                marks = ",".join(["?"] * len(tx_ids))
-                conn.execute(f"DELETE FROM emoney_tx WHERE id IN ({marks})", tuple(tx_ids))
-                res["deleted"]["emoney_tx_removed"] = len(tx_ids)
-
-        # If containers included, delete their history and the containers
-        if include_containers and selected:
-            marks = ",".join(["?"] * len(selected))
-            # Delete children first
-            cur = conn.execute(f"SELECT COUNT(*) c FROM container_item WHERE container_id IN ({marks})", tuple(selected)).fetchone()
-            res["deleted"]["container_items"] = int(cur["c"] or 0)
-            conn.execute(f"DELETE FROM container_item WHERE container_id IN ({marks})", tuple(selected))
-            cur = conn.execute(f"SELECT COUNT(*) c FROM dn_snapshots WHERE container_id IN ({marks})", tuple(selected)).fetchone()
-            res["deleted"]["dn_snapshots"] = int(cur["c"] or 0)
-            conn.execute(f"DELETE FROM dn_snapshots WHERE container_id IN ({marks})", tuple(selected))
-
-            # Optional: unlink any remaining emoney tx referencing these containers (if not already removed)
-            if not include_emoney:
-                conn.execute(f"UPDATE emoney_tx SET ref_container_id=NULL WHERE ref_container_id IN ({marks})", tuple(selected))
-
-            # Delete containers
-            cur = conn.execute(f"SELECT COUNT(*) c FROM containers WHERE id IN ({marks})", tuple(selected)).fetchone()
-            res["deleted"]["containers"] = int(cur["c"] or 0)
-            conn.execute(f"DELETE FROM containers WHERE id IN ({marks})", tuple(selected))
-
-        # Maintenance repair logs cleanup in window
-        if include_maintenance:
-            cur = conn.execute(
-                "SELECT COUNT(*) c FROM item_repair_log WHERE repaired_at>=? AND repaired_at<?",
-                (S, E),
-            ).fetchone()
-            res["deleted"]["repair_logs"] = int(cur["c"] or 0)
-            conn.execute(
-                "DELETE FROM item_repair_log WHERE repaired_at>=? AND repaired_at<?",
-                (S, E),
-            )
-
-        # Lost item history cleanup (container_item rows marked 'hilang')
-        if include_lost:
+        with connection() as conn:
+            # Collect candidate containers (Closed, no outstanding, has emoney tx)
             cur = conn.execute(
                 """
-                SELECT COUNT(*) c FROM container_item
-                WHERE voided_at IS NULL AND LOWER(COALESCE(return_condition,''))='hilang'
-                  AND added_at>=? AND added_at<?
-                """,
-                (S, E),
-            ).fetchone()
-            res["deleted"]["lost_entries"] = int(cur["c"] or 0)
-            conn.execute(
+                SELECT c.id,
+                       (SELECT MAX(returned_at) FROM container_item ci WHERE ci.container_id=c.id AND ci.voided_at IS NULL) AS last_returned_at,
+                       (SELECT MAX(created_at) FROM emoney_tx t WHERE t.ref_container_id=c.id) AS last_tx_at,
+                       (SELECT COUNT(*) FROM container_item ci2 WHERE ci2.container_id=c.id AND ci2.voided_at IS NULL AND ci2.returned_at IS NULL) AS left_count,
+                       (SELECT COUNT(*) FROM emoney_tx t2 WHERE t2.ref_container_id=c.id) AS tx_count
+                FROM containers c
+                WHERE c.status='Closed'
                 """
-                DELETE FROM container_item
-                WHERE voided_at IS NULL AND LOWER(COALESCE(return_condition,''))='hilang'
-                  AND added_at>=? AND added_at<?
-                """,
-                (S, E),
             )
+            rows = cur.fetchall()
+            from_date = datetime.datetime.fromisoformat(S)
+            to_date = datetime.datetime.fromisoformat(E)
+            selected = []
+            for r in rows:
+                left_cnt = int(r["left_count"] or 0)
+                tx_cnt = int(r["tx_count"] or 0)
+                if left_cnt != 0 or tx_cnt == 0:
+                    continue
+                last_ret = r["last_returned_at"]
+                last_tx = r["last_tx_at"]
+                fc_ts = None
+                for t in (last_ret, last_tx):
+                    if t:
+                        try:
+                            dt = datetime.datetime.fromisoformat(t)
+                        except Exception:
+                            dt = None
+                        if dt and (fc_ts is None or dt > fc_ts):
+                            fc_ts = dt
+                if not fc_ts:
+                    continue
+                if from_date <= fc_ts < to_date:
+                    selected.append(r["id"])
 
-        # Persist batch manifest for Archive Browser
-        try:
-            snap_dir = _ensure_snapshots_dir()
-            ts2 = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            nowdt = datetime.datetime.now()
-            man = {
-                "id": res["batch_id"],
-                "start": S, "end": E,
-                "scopes": {
-                    "include_containers": include_containers,
-                    "include_emoney": include_emoney,
-                    "include_maintenance": include_maintenance,
-                    "include_lost": include_lost,
-                    "emoney_scope": sorted(list(scope)),
-                },
+            # Always create snapshot before any destructive ops (belum ada tulis/transaksi di conn)
+            snap = _make_snapshot(b.get("note"), conn)
+
+            res = {
+                "batch_id": b.get("note") or f"batch-{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                "snapshot": snap,
                 "selected_containers": selected,
-                "deleted": res["deleted"],
-                "cf_inserted": res["cf_inserted"],
-                "snapshot": res["snapshot"],
-                "created_at": now_iso(),
-                "created_at_fmt": _fmt_id_time(nowdt),
-                "id_display": f"Batch { _fmt_id_time(nowdt) }",
+                "deleted": {"containers": 0, "container_items": 0, "dn_snapshots": 0, "emoney_tx_removed": 0, "repair_logs": 0, "lost_entries": 0},
+                "cf_inserted": 0,
             }
-            with open(os.path.join(snap_dir, f"cleanup_batch_{ts2}.json"), "w", encoding="utf-8") as f:
-                json.dump(man, f)
-        except Exception:
-            pass
 
-        conn.commit()
-        return ok(res)
+            # Build emoney tx removal set
+            tx_ids = set()
+            tx_rows = []
+            if include_emoney and (selected or ("all" in scope)):
+                if "linked" in scope:
+                    # linked to selected containers and within window
+                    marks = ",".join(["?"] * len(selected))
+                    q = (
+                        f"SELECT id, emoney_id, type, amount_cents FROM emoney_tx "
+                        f"WHERE ref_container_id IN ({marks}) AND created_at>=? AND created_at<? "
+                        f"AND (type='topup' OR type='expense') "
+                        f"AND (note IS NULL OR note NOT LIKE 'archive_carry_forward%')"
+                    )
+                    for r in conn.execute(q, (*selected, S, E)).fetchall():
+                        if r["id"] not in tx_ids:
+                            tx_ids.add(r["id"])
+                            tx_rows.append(dict(r))
+                if "all" in scope:
+                    q = (
+                        "SELECT id, emoney_id, type, amount_cents FROM emoney_tx "
+                        "WHERE created_at>=? AND created_at<? AND (type='topup' OR type='expense') "
+                        "AND (note IS NULL OR note NOT LIKE 'archive_carry_forward%')"
+                    )
+                    for r in conn.execute(q, (S, E)).fetchall():
+                        if r["id"] not in tx_ids:
+                            tx_ids.add(r["id"])
+                            tx_rows.append(dict(r))
+
+                # Compute net per emoney account for this window
+                net = {}
+                for r in tx_rows:
+                    eid = r["emoney_id"]
+                    amt = int(r["amount_cents"] or 0)
+                    if r["type"] == "topup":
+                        net[eid] = net.get(eid, 0) + amt
+                    elif r["type"] == "expense":
+                        net[eid] = net.get(eid, 0) - amt
+
+                impacted = set(net.keys())
+                # Fold previous carry-forwards: delete old CF entries and insert single consolidated CF per account
+                combined = {}
+                eids_with_old_cf = []
+                for eid in impacted:
+                    row = conn.execute(
+                        "SELECT SUM(CASE WHEN type='topup' THEN amount_cents ELSE -amount_cents END) s FROM emoney_tx WHERE emoney_id=? AND note LIKE 'archive_carry_forward%'",
+                        (eid,),
+                    ).fetchone()
+                    old_net = int(row["s"] or 0)
+                    new_net = int(net.get(eid, 0) or 0)
+                    combined[eid] = old_net + new_net
+                    if old_net != 0:
+                        eids_with_old_cf.append(eid)
+
+                if eids_with_old_cf:
+                    marks = ",".join(["?"] * len(eids_with_old_cf))
+                    conn.execute(
+                        f"DELETE FROM emoney_tx WHERE note LIKE 'archive_carry_forward%' AND emoney_id IN ({marks})",
+                        tuple(eids_with_old_cf),
+                    )
+
+                cf_count = 0
+                for eid, total in combined.items():
+                    if total == 0:
+                        continue
+                    ttype = "topup" if total > 0 else "expense"
+                    amount = total if total > 0 else (-total)
+                    conn.execute(
+                        "INSERT INTO emoney_tx (emoney_id, type, amount_cents, note, ref_container_id, created_at) VALUES (?, ?, ?, ?, NULL, ?)",
+                        (eid, ttype, amount, f"archive_carry_forward {res['batch_id']}", _iso_end(end)),
+                    )
+                    cf_count += 1
+                res["cf_inserted"] = cf_count
+
+                # Delete removed tx (window)
+                if tx_ids:
+                    marks = ",".join(["?"] * len(tx_ids))
+                    conn.execute(f"DELETE FROM emoney_tx WHERE id IN ({marks})", tuple(tx_ids))
+                    res["deleted"]["emoney_tx_removed"] = len(tx_ids)
+
+            # If containers included, delete their history and the containers
+            if include_containers and selected:
+                marks = ",".join(["?"] * len(selected))
+                # Delete children first
+                cur = conn.execute(f"SELECT COUNT(*) c FROM container_item WHERE container_id IN ({marks})", tuple(selected)).fetchone()
+                res["deleted"]["container_items"] = int(cur["c"] or 0)
+                conn.execute(f"DELETE FROM container_item WHERE container_id IN ({marks})", tuple(selected))
+                # lewat dn_store agar baris DN yang tidak dipakai lagi ikut terhapus
+                res["deleted"]["dn_snapshots"] = dn_store.delete_snapshots(conn, f"container_id IN ({marks})", tuple(selected))
+
+                # Optional: unlink any remaining emoney tx referencing these containers (if not already removed)
+                if not include_emoney:
+                    conn.execute(f"UPDATE emoney_tx SET ref_container_id=NULL WHERE ref_container_id IN ({marks})", tuple(selected))
+
+                # Delete containers
+                cur = conn.execute(f"SELECT COUNT(*) c FROM containers WHERE id IN ({marks})", tuple(selected)).fetchone()
+                res["deleted"]["containers"] = int(cur["c"] or 0)
+                conn.execute(f"DELETE FROM containers WHERE id IN ({marks})", tuple(selected))
+
+            # Maintenance repair logs cleanup in window
+            if include_maintenance:
+                cur = conn.execute(
+                    "SELECT COUNT(*) c FROM item_repair_log WHERE repaired_at>=? AND repaired_at<?",
+                    (S, E),
+                ).fetchone()
+                res["deleted"]["repair_logs"] = int(cur["c"] or 0)
+                conn.execute(
+                    "DELETE FROM item_repair_log WHERE repaired_at>=? AND repaired_at<?",
+                    (S, E),
+                )
+
+            # Lost item history cleanup (container_item rows marked 'hilang')
+            if include_lost:
+                cur = conn.execute(
+                    """
+                    SELECT COUNT(*) c FROM container_item
+                    WHERE voided_at IS NULL AND return_condition='hilang'
+                      AND added_at>=? AND added_at<?
+                    """,
+                    (S, E),
+                ).fetchone()
+                res["deleted"]["lost_entries"] = int(cur["c"] or 0)
+                conn.execute(
+                    """
+                    DELETE FROM container_item
+                    WHERE voided_at IS NULL AND return_condition='hilang'
+                      AND added_at>=? AND added_at<?
+                    """,
+                    (S, E),
+                )
+
+            # Persist batch manifest for Archive Browser
+            try:
+                snap_dir = _ensure_snapshots_dir()
+                ts2 = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                nowdt = datetime.datetime.now()
+                man = {
+                    "id": res["batch_id"],
+                    "start": S, "end": E,
+                    "scopes": {
+                        "include_containers": include_containers,
+                        "include_emoney": include_emoney,
+                        "include_maintenance": include_maintenance,
+                        "include_lost": include_lost,
+                        "emoney_scope": sorted(list(scope)),
+                    },
+                    "selected_containers": selected,
+                    "deleted": res["deleted"],
+                    "cf_inserted": res["cf_inserted"],
+                    "snapshot": res["snapshot"],
+                    "created_at": now_iso(),
+                    "created_at_fmt": _fmt_id_time(nowdt),
+                    "id_display": f"Batch { _fmt_id_time(nowdt) }",
+                }
+                with open(os.path.join(snap_dir, f"cleanup_batch_{ts2}.json"), "w", encoding="utf-8") as f:
+                    json.dump(man, f)
+            except Exception:
+                pass
+
+            conn.commit()
+            if include_containers:
+                for cid in selected:
+                    dn_pdf.dn_pdf_cache.forget(cid)
+            return ok(res)
     except Exception as e:
-        try:
-            conn.rollback()
-        except Exception:
-            pass
         return jsonify({"error": True, "message": str(e)}), 500
-    finally:
-        conn.close()
 
 
 @bp.get("/cleanup/batches")
@@ -474,13 +475,24 @@ def snapshot_restore(sid):
     backup_name = f"pre_restore_{ts}.sqlite3"
     backup_path = os.path.join(snap_dir, backup_name)
     try:
+        checkpoint()
         shutil.copy2(DB_PATH, backup_path)
     except Exception as e:
         return jsonify({"error": True, "message": f"Gagal backup current DB: {e}"}), 500
 
-    # Overwrite current DB with snapshot
+    # Salin isi snapshot lewat backup API SQLite ke DB yang sedang hidup (bukan menimpa file
+    # & menghapus -wal): koneksi pool yang masih dipinjam request lain tetap aman, penulis
+    # lain menunggu lock. Snapshot lama bisa tertinggal migrasi -> jalankan init_db.
     try:
-        shutil.copy2(src, DB_PATH)
+        src_conn = sqlite3.connect(f"file:{src}?mode=ro", uri=True)
+        dst_conn = get_conn()
+        try:
+            src_conn.backup(dst_conn)
+        finally:
+            src_conn.close()
+            dst_conn.close()
+        close_pool()  # epoch data baru: ETag & cache per proses dari DB lama tidak terpakai
+        init_db()
     except Exception as e:
         return jsonify({"error": True, "message": f"Gagal restore: {e}"}), 500
 
@@ -488,10 +500,54 @@ def snapshot_restore(sid):
         "restored": sid,
         "using_file": db_file,
         "backup": backup_name,
-        "note": "DB telah di-restore. Disarankan restart backend agar koneksi SQLite segar."
+        "note": "DB telah di-restore."
     })
 
 
+# --------- DB POOL STATS ---------
+@bp.get("/db/pool_stats")
+@auth_required
+@require_roles('admin')
+def db_pool_stats():
+    return ok({"pool": pool_stats()})
+
+
+@bp.post("/db/rebuild_search")
+@auth_required
+@require_roles('admin')
+def db_rebuild_search():
+    # Perlu setelah VACUUM (rowid item_unit bisa berubah) atau jika hasil cari terasa tidak sinkron
+    with connection() as conn:
+        rebuilt = rebuild_item_search(conn)
+    return ok({"ok": True, "fts": rebuilt})
+
+
+# --------- DERIVED DATA CONSISTENCY ---------
+@bp.get("/consistency/check")
+@auth_required
+@require_roles('admin')
+def consistency_check():
+    names = [n for n in (request.args.get("only") or "").split(",") if n.strip()]
+    try:
+        result = consistency.run("check", names)
+    except ValueError as e:
+        return jsonify({"error": True, "message": str(e)}), 400
+    return ok({"ok": all(not d for d in result.values()), "diffs": result})
+
+
+@bp.post("/consistency/rebuild")
+@auth_required
+@require_roles('admin')
+def consistency_rebuild():
+    b = request.get_json(silent=True) or {}
+    names = b.get("only") or []
+    try:
+        result = consistency.run("rebuild", names)
+    except ValueError as e:
+        return jsonify({"error": True, "message": str(e)}), 400
+    return ok({"ok": all(not d for d in result.values()), "diffs": result})
+
+
 # --------- ARCHIVE BROWSER (READ-ONLY) ---------
 @bp.get("/archive/batches")
 @auth_required
@@ -1,9 +1,13 @@
 # backend/routes_containers.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from routes_auth import auth_required, require_roles
-from db import get_conn, now_iso, new_container_id
+from db import connection, now_iso, new_container_id, encode_cursor, decode_cursor, chunked, marks, table_versions
+from http_cache import versioned
+from migrations import CONTAINER_TOTALS, container_total_exprs
+import dn_store, dn_pdf
 from datetime import datetime
-import json
+from itertools import groupby
+import json, queue, threading, time, uuid
 
 bp = Blueprint("containers", __name__, url_prefix="/containers")
 
@@ -16,8 +20,7 @@ def create_container():
         return jsonify({"error": True, "message": "event_name & pic wajib"}), 400
 
     cid = new_container_id()
-    conn = get_conn()
-    try:
+    with connection() as conn:
         conn.execute("""
           INSERT INTO containers (id, event_name, pic, crew, location, start_date, end_date, order_title, status, created_at)
           VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'Open', ?)
@@ -34,20 +37,18 @@ def create_container():
         ))
         conn.commit()
         return jsonify({"ok": True, "id": cid})
-    finally:
-        conn.close()
 
 # ---------- Simple metrics for dashboard ----------
 @bp.get("/metrics")
 @auth_required
+@versioned('containers', 'emoney_tx')
 def containers_metrics():
     """Lightweight counts for dashboard KPIs.
     - open: containers with status 'Open'
     - running: containers with status 'Sedang Berjalan'
     - closed_without_expense: containers 'Closed' that have no emoney expense recorded
     """
-    conn = get_conn()
-    try:
+    with connection() as conn:
         open_count = conn.execute("SELECT COUNT(*) c FROM containers WHERE status='Open'").fetchone()["c"]
         running_count = conn.execute("SELECT COUNT(*) c FROM containers WHERE status='Sedang Berjalan'").fetchone()["c"]
         closed_wo_exp = conn.execute(
@@ -67,51 +68,94 @@ def containers_metrics():
             "running": int(running_count or 0),
             "closed_without_expense": int(closed_wo_exp or 0),
         })
-    finally:
-        conn.close()
 
 # ---------- Outstanding items (still out) ----------
+OUTSTANDING_PAGE_MAX = 500
+# filter persis OUTSTANDING_LINE_WHERE (alias ci) -> planner memakai partial index ix_ci_outstanding.
+# Agregasi per kontainer memakai INDEXED BY: tanpa statistik ANALYZE planner memilih
+# uq_container_item_active (semua baris aktif, termasuk yang sudah kembali).
+_OUTSTANDING_WHERE = """ci.voided_at IS NULL AND ci.returned_at IS NULL AND ci.return_condition IS NOT 'hilang'
+      AND c.status='Sedang Berjalan'"""
+
+def _outstanding_row(r):
+    return {
+        "id_code": r["id_code"],
+        "name": (r["name"] or r["id_code"]),
+        "category": r["category"],
+        "model": r["model"],
+        "container_id": r["container_id"],
+        "event_name": r["event_name"],
+        "pic": r["pic"],
+        "batch_label": r["batch_label"],
+        "condition_at_checkout": r["condition_at_checkout"],
+        "added_at": r["added_at"],
+    }
+
 @bp.get("/outstanding_items")
 @auth_required
+@versioned('containers', 'container_item', 'item_unit')
 def outstanding_items():
-    conn = get_conn()
-    try:
-        rows = conn.execute(
-            """
-            SELECT ci.id_code, ci.container_id, ci.added_at, ci.batch_label,
-                   ci.condition_at_checkout, ci.return_condition,
+    """Tanpa parameter: semua baris (bentuk lama). ?group=container: jumlah per kontainer
+    (widget dashboard). ?limit=&cursor=: satu halaman urut added_at DESC + next_cursor.
+    ?container_id= membatasi ke satu kontainer."""
+    args = request.args
+    where, params = _OUTSTANDING_WHERE, []
+    container_id = (args.get("container_id") or "").strip()
+    if container_id:
+        where += " AND ci.container_id=?"
+        params.append(container_id)
+
+    with connection() as conn:
+        if (args.get("group") or "").strip().lower() == "container":
+            rows = conn.execute(f"""
+                SELECT ci.container_id, c.event_name, c.pic, COUNT(*) AS count,
+                       MIN(ci.added_at) AS oldest_added_at, MAX(ci.added_at) AS latest_added_at
+                FROM container_item ci INDEXED BY ix_ci_outstanding
+                JOIN containers c ON c.id = ci.container_id
+                WHERE {where}
+                GROUP BY ci.container_id
+                ORDER BY count DESC, ci.container_id
+            """, params).fetchall()
+            groups = [dict(r) for r in rows]
+            return jsonify({"containers": groups, "total": sum(g["count"] for g in groups)})
+
+        paged = "limit" in args or "cursor" in args
+        if paged:
+            try:
+                limit = max(1, min(OUTSTANDING_PAGE_MAX, int(args.get("limit") or 100)))
+            except ValueError:
+                return jsonify({"error": True, "message": "limit tidak valid"}), 400
+            after = decode_cursor(args.get("cursor"))
+            if args.get("cursor") and after is None:
+                return jsonify({"error": True, "message": "cursor tidak valid"}), 400
+            if after:
+                where += " AND (ci.added_at, ci.id) < (?, ?)"
+                params += after
+        rows = conn.execute(f"""
+            SELECT ci.id, ci.id_code, ci.container_id, ci.added_at, ci.batch_label,
+                   ci.condition_at_checkout,
                    c.event_name, c.pic,
                    iu.name, iu.category, iu.model
             FROM container_item ci
             JOIN containers c ON c.id = ci.container_id
             LEFT JOIN item_unit iu ON iu.id_code = ci.id_code
-            WHERE ci.voided_at IS NULL
-              AND ci.returned_at IS NULL
-              AND (ci.return_condition IS NULL OR LOWER(ci.return_condition) <> 'hilang')
-              AND c.status='Sedang Berjalan'
-            ORDER BY ci.added_at DESC
-            """
-        ).fetchall()
-        data = []
-        for r in rows:
-            data.append({
-                "id_code": r["id_code"],
-                "name": (r["name"] or r["id_code"]),
-                "category": r["category"],
-                "model": r["model"],
-                "container_id": r["container_id"],
-                "event_name": r["event_name"],
-                "pic": r["pic"],
-                "batch_label": r["batch_label"],
-                "condition_at_checkout": r["condition_at_checkout"],
-                "added_at": r["added_at"],
-            })
-        return jsonify({"data": data, "total": len(data)})
-    finally:
-        conn.close()
+            WHERE {where}
+            ORDER BY ci.added_at DESC, ci.id DESC {"LIMIT ?" if paged else ""}
+        """, params + ([limit + 1] if paged else [])).fetchall()
+        if not paged:
+            data = [_outstanding_row(r) for r in rows]
+            return jsonify({"data": data, "total": len(data)})
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return jsonify({
+            "data": [_outstanding_row(r) for r in rows],
+            "next_cursor": encode_cursor(rows[-1]["added_at"], rows[-1]["id"]) if has_more else None,
+        })
+
 # ---------- List containers ----------
 @bp.get("")
 @auth_required
+@versioned('containers', 'emoney_tx')
 def list_containers():
     q = (request.args.get("q") or "").strip().upper()
     status = (request.args.get("status") or "").strip().title()
@@ -124,6 +168,12 @@ def list_containers():
         per_page = 1
     if per_page > 100:
         per_page = 100
+    # keyset paging: ?cursor= (kosong = halaman pertama); total hanya jika with_total=1
+    cursor_mode = "cursor" in request.args
+    after = decode_cursor(request.args.get("cursor"))
+    if request.args.get("cursor") and after is None:
+        return jsonify({"error": True, "message": "cursor tidak valid"}), 400
+    with_total = (not cursor_mode) or (request.args.get("with_total") or "").strip().lower() in ("1", "true", "yes", "y")
 
     base = "FROM containers"
     args, filters = [], []
@@ -140,101 +190,270 @@ def list_containers():
         filters.append("status='Closed'")
         filters.append("EXISTS (SELECT 1 FROM emoney_tx t WHERE t.ref_container_id=containers.id AND t.type='expense')")
     where_sql = " WHERE " + " AND ".join(filters) if filters else ""
+    page_filters, page_args = list(filters), list(args)
+    if after:
+        page_filters.append("(created_at, id) < (?, ?)")
+        page_args += after
+    page_where = " WHERE " + " AND ".join(page_filters) if page_filters else ""
 
     sql = (
         "SELECT id, event_name, pic, crew, location, start_date, end_date, order_title, status, created_at, "
         "(SELECT COUNT(*) FROM emoney_tx t WHERE t.ref_container_id=containers.id AND t.type='expense') AS emoney_expenses "
         + base
-        + where_sql
-        + " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        + page_where
+        + " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
     )
 
-    conn = get_conn()
-    try:
-        total = conn.execute(f"SELECT COUNT(*) c {base}{where_sql}", args).fetchone()["c"]
-        offset = (page - 1) * per_page
-        rows = conn.execute(sql, args + [per_page, offset]).fetchall()
-        return jsonify({
+    with connection() as conn:
+        total = None
+        if with_total:
+            total = conn.execute(f"SELECT COUNT(*) c {base}{where_sql}", args).fetchone()["c"]
+        offset = 0 if cursor_mode else (page - 1) * per_page
+        rows = conn.execute(sql, page_args + [per_page + 1, offset]).fetchall()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        out = {
             "data": [dict(r) for r in rows],
-            "total": int(total),
-            "page": page,
             "per_page": per_page,
-        })
-    finally:
-        conn.close()
+            "next_cursor": encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if has_more else None,
+        }
+        if total is not None:
+            out["total"] = int(total)
+        if not cursor_mode:
+            out["page"] = page
+        return jsonify(out)
 
 # ---------- Build live detail ----------
+_DETAIL_LINES_SQL = """
+    SELECT ci.id, ci.id_code, ci.added_at, ci.batch_label, ci.condition_at_checkout,
+           ci.override_reason, ci.amend_reason, ci.voided_at,
+           ci.returned_at, ci.return_condition, ci.damage_note,
+           iu.name, iu.model, iu.rack, iu.category, iu.is_universal
+    FROM container_item ci
+    LEFT JOIN item_unit iu ON iu.id_code = ci.id_code
+    WHERE ci.container_id=?
+"""
+
+_TOTAL_COLS = tuple(f"tot_{k}" for k in CONTAINER_TOTALS)
+
+def _split_container(row):
+    """Row containers -> (header tanpa kolom tot_*, totals). Totals dijaga trigger (migrasi 10)."""
+    d = dict(row)
+    totals = {k: int(d.pop(f"tot_{k}") or 0) for k in CONTAINER_TOTALS}
+    return d, totals
+
+def _read_totals(conn, cid):
+    row = conn.execute(f"SELECT status, {', '.join(_TOTAL_COLS)} FROM containers WHERE id=?", (cid,)).fetchone()
+    if not row:
+        return None, None
+    status, totals = _split_container(row)
+    return status["status"], totals
+
+def _line_view(d):
+    """Satu baris container_item (aktif) dalam bentuk yang dipakai detail/DN."""
+    return {
+        "id_code": d["id_code"],
+        "name": d.get("name"),
+        "model": d.get("model"),
+        "rack": d.get("rack"),
+        "category": d.get("category"),
+        "added_at": d["added_at"],
+        "condition": d.get("condition_at_checkout") or "good",
+        # simpan kedua jenis alasan agar UI bisa menampilkan sesuai konteks
+        "reason": d.get("override_reason") or "",  # kompatibilitas lama
+        "amend_reason": d.get("amend_reason") or "",
+        "returned_at": d.get("returned_at"),
+        "return_condition": d.get("return_condition"),
+        "damage_note": d.get("damage_note"),
+        "is_universal": int(d.get("is_universal") or 0),
+    }
+
 def _build_detail(conn, cid):
     c = conn.execute("SELECT * FROM containers WHERE id=?", (cid,)).fetchone()
     if not c: return None, None, None
 
-    rows = conn.execute("""
-        SELECT ci.id, ci.id_code, ci.added_at, ci.batch_label, ci.condition_at_checkout,
-               ci.override_reason, ci.amend_reason, ci.voided_at,
-               ci.returned_at, ci.return_condition, ci.damage_note,
-               iu.name, iu.model, iu.rack, iu.category, iu.is_universal
-        FROM container_item ci
-        LEFT JOIN item_unit iu ON iu.id_code = ci.id_code
-        WHERE ci.container_id=?
-        ORDER BY ci.added_at ASC, ci.id ASC
-    """, (cid,)).fetchall()
-
-    batches, totals = {}, {"returned":0, "good":0, "rusak_ringan":0, "rusak_berat":0, "lost":0, "all":0}
+    c, totals = _split_container(c)
+
+    rows = conn.execute(
+        _DETAIL_LINES_SQL + " AND ci.voided_at IS NULL ORDER BY ci.added_at ASC, ci.id ASC", (cid,)
+    ).fetchall()
+    batches = {}
     for r in rows:
         d = dict(r)
-        if d["voided_at"]:
-            continue
-        bl = d["batch_label"]
-        batches.setdefault(bl, [])
-        batches[bl].append({
-            "id_code": d["id_code"],
-            "name": d.get("name"),
-            "model": d.get("model"),
-            "rack": d.get("rack"),
-            "category": d.get("category"),
-            "added_at": d["added_at"],
-            "condition": d.get("condition_at_checkout") or "good",
-            # simpan kedua jenis alasan agar UI bisa menampilkan sesuai konteks
-            "reason": d.get("override_reason") or "",  # kompatibilitas lama
-            "amend_reason": d.get("amend_reason") or "",
-            "returned_at": d.get("returned_at"),
-            "return_condition": d.get("return_condition"),
-            "damage_note": d.get("damage_note"),
-            "is_universal": int(d.get("is_universal") or 0),
-        })
-
-        totals["all"] += 1
-        if d.get("returned_at"):
-            totals["returned"] += 1
-            rc = d.get("return_condition") or "good"
-            if rc in totals:
-                totals[rc] += 1
-        else:
-            # not returned; if marked lost, count it
-            rc = (d.get("return_condition") or '').lower()
-            if rc == 'hilang':
-                totals["lost"] += 1
+        batches.setdefault(d["batch_label"], []).append(_line_view(d))
 
-    return dict(c), batches, totals
+    return c, batches, totals
 
 # ---------- Get container detail (live, not snapshot) ----------
+DETAIL_PAGE_MAX = 1000
+_TRUTHY = ("1", "true", "yes", "y")
+
+def _detail_filters(args):
+    """Filter baris detail dari query string -> (sql, params) atau (None, pesan error).
+    condition memakai aturan yang sama dengan totals (good/rusak_*/lost/outstanding/...)."""
+    sql, params = [], []
+    batch = (args.get("batch") or "").strip()
+    if batch:
+        sql.append("ci.batch_label=?")
+        params.append(batch)
+    condition = (args.get("condition") or "").strip().lower()
+    if condition == "hilang":
+        condition = "lost"
+    if condition:
+        if condition not in CONTAINER_TOTALS:
+            return None, "condition tidak valid"
+        sql.append(container_total_exprs("ci")[condition])
+    returned = (args.get("returned") or "").strip().lower()
+    if returned:
+        sql.append("ci.returned_at IS NOT NULL" if returned in _TRUTHY else "ci.returned_at IS NULL")
+    return "".join(" AND " + f for f in sql), params
+
 @bp.get("/<cid>")
 @auth_required
+@versioned('containers', 'container_item', 'item_unit', 'dn_snapshots')
 def get_container(cid):
-    conn = get_conn()
+    """
+    Detail kontainer live.
+      - default          : { container, batches, totals, latest_dn, dn_count } (semua baris aktif)
+      - ?lines=0         : header + totals + batch_counts saja (tanpa baris)
+      - ?limit=&cursor=  : satu halaman baris urut waktu keluar -> { ..., lines, next_cursor }
+    Filter (default & halaman): batch, condition (good|rusak_ringan|rusak_berat|lost|outstanding), returned=1|0.
+    """
+    where, params = _detail_filters(request.args)
+    if where is None:
+        return jsonify({"error": True, "message": params}), 400
+    header_only = (request.args.get("lines") or "").strip().lower() in ("0", "false", "no", "none")
+    paged = not header_only and ("limit" in request.args or "cursor" in request.args)
+    cursor_raw = (request.args.get("cursor") or "").strip()
+    cursor = decode_cursor(cursor_raw) if cursor_raw else None
+    if cursor_raw and cursor is None:
+        return jsonify({"error": True, "message": "cursor tidak valid"}), 400
     try:
-        c, batches, totals = _build_detail(conn, cid)
-        if not c:
+        limit = int(request.args.get("limit") or 200)
+    except Exception:
+        limit = 200
+    limit = max(1, min(limit, DETAIL_PAGE_MAX))
+
+    with connection() as conn:
+        row = conn.execute("SELECT * FROM containers WHERE id=?", (cid,)).fetchone()
+        if not row:
             return jsonify({"error": True, "message": "Kontainer tidak ditemukan"}), 404
+        c, totals = _split_container(row)
         # latest snapshot (if any) and count
         snap = conn.execute("SELECT version, created_at FROM dn_snapshots WHERE container_id=? ORDER BY version DESC LIMIT 1", (cid,)).fetchone()
         latest = dict(snap) if snap else None
         dn_count = conn.execute("SELECT COUNT(*) c FROM dn_snapshots WHERE container_id=?", (cid,)).fetchone()["c"]
-        return jsonify({"container": c, "batches": batches, "totals": totals, "latest_dn": latest, "dn_count": int(dn_count)})
-    finally:
-        conn.close()
+        out = {"container": c, "totals": totals, "latest_dn": latest, "dn_count": int(dn_count)}
+
+        if header_only or paged:
+            out["batch_counts"] = {
+                r["batch_label"]: int(r["n"])
+                for r in conn.execute(
+                    "SELECT batch_label, COUNT(*) n FROM container_item WHERE container_id=? AND voided_at IS NULL "
+                    "GROUP BY batch_label ORDER BY batch_label", (cid,))
+            }
+        if header_only:
+            return jsonify(out)
+
+        sql = _DETAIL_LINES_SQL + " AND ci.voided_at IS NULL" + where
+        args = [cid] + params
+        if paged:
+            if cursor:
+                sql += " AND (ci.added_at, ci.id) > (?, ?)"
+                args += list(cursor)
+            rows = conn.execute(sql + " ORDER BY ci.added_at ASC, ci.id ASC LIMIT ?", args + [limit + 1]).fetchall()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            out["lines"] = [dict(_line_view(dict(r)), batch=r["batch_label"]) for r in rows]
+            out["next_cursor"] = encode_cursor(rows[-1]["added_at"], rows[-1]["id"]) if has_more else None
+            return jsonify(out)
+
+        batches = {}
+        for r in conn.execute(sql + " ORDER BY ci.added_at ASC, ci.id ASC", args):
+            batches.setdefault(r["batch_label"], []).append(_line_view(dict(r)))
+        out["batches"] = batches
+        return jsonify(out)
 
 # ---------- Add items (checkout / amend) ----------
+def _add_many(conn, cid, codes, batch_label, is_amend=False, amend_reason="",
+              override_heavy=False, override_reason=""):
+    """Checkout `codes` ke kontainer (tanpa commit; status kontainer dicek pemanggil).
+    Return (added [{id_code, condition}], skipped [{id_code, reason}])."""
+    # klasifikasi: dua query per chunk (item_unit & baris aktif di kontainer ini)
+    items, present = {}, set()
+    for chunk in chunked(list(dict.fromkeys(codes))):
+        ph = marks(len(chunk))
+        for r in conn.execute(
+            f"SELECT id_code, status, defect_level, is_universal FROM item_unit WHERE id_code IN ({ph})",
+            chunk,
+        ):
+            items[r["id_code"]] = r
+        present.update(r[0] for r in conn.execute(
+            f"SELECT id_code FROM container_item WHERE container_id=? AND voided_at IS NULL AND id_code IN ({ph})",
+            [cid] + chunk,
+        ))
+
+    added, skipped, lines, to_out = [], [], [], []
+    ts = now_iso()
+    for id_code in codes:
+        row = items.get(id_code)
+
+        # unique in container (active only); id yang dobel di payload ikut tertolak di sini
+        if id_code in present:
+            skipped.append({"id_code": id_code, "reason": "Sudah ada di kontainer"})
+            continue
+
+        if not row:
+            skipped.append({"id_code": id_code, "reason": "Item tidak ditemukan"})
+            continue
+
+        status = row["status"]
+        defect = (row["defect_level"] or "none")
+        is_univ = int(row["is_universal"] or 0)
+
+        # status rules
+        if status in ("Hilang", "Afkir"):
+            skipped.append({"id_code": id_code, "reason": f"Status {status} tidak bisa checkout"})
+            continue
+        if status == "Keluar":
+            skipped.append({"id_code": id_code, "reason": "Item sudah Keluar"})
+            continue
+
+        # condition at checkout
+        if status == "Rusak" or defect in ("ringan", "berat"):
+            if defect == "berat":
+                if not override_heavy or not override_reason:
+                    skipped.append({"id_code": id_code, "reason": "Rusak berat butuh konfirmasi & alasan"})
+                    continue
+                condition = "rusak_berat"
+            else:
+                condition = "rusak_ringan"
+        else:
+            condition = "good"
+
+        lines.append((
+            cid,
+            id_code,
+            ts,
+            batch_label,
+            condition,
+            (override_reason if condition == "rusak_berat" else None),
+            (amend_reason if is_amend else None),
+        ))
+        # set status item -> Keluar (non-universal only)
+        if not is_univ:
+            to_out.append(id_code)
+        present.add(id_code)
+        added.append({"id_code": id_code, "condition": condition})
+
+    conn.executemany("""
+      INSERT INTO container_item (container_id, id_code, added_at, batch_label, condition_at_checkout, override_reason, amend_reason)
+      VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, lines)
+    for chunk in chunked(to_out):
+        conn.execute(f"UPDATE item_unit SET status='Keluar' WHERE id_code IN ({marks(len(chunk))})", chunk)
+    return added, skipped
+
 @bp.post("/<cid>/add_items")
 @auth_required
 def add_items(cid):
@@ -248,8 +467,7 @@ def add_items(cid):
     if not ids or not isinstance(ids, list):
         return jsonify({"error": True, "message": "ids (list) wajib"}), 400
 
-    conn = get_conn()
-    try:
+    with connection() as conn:
         c = conn.execute("SELECT status FROM containers WHERE id=?", (cid,)).fetchone()
         if not c:
             return jsonify({"error": True, "message": "Kontainer tidak ditemukan"}), 404
@@ -262,68 +480,9 @@ def add_items(cid):
         else:
             batch_label = "MAIN"
 
-        added, skipped = [], []
-        for raw in ids:
-            id_code = (raw or "").strip()
-            if not id_code: 
-                continue
-
-            # unique in container (active only)
-            already = conn.execute("""
-                SELECT 1 FROM container_item WHERE container_id=? AND id_code=? AND voided_at IS NULL
-            """, (cid, id_code)).fetchone()
-            if already:
-                skipped.append({"id_code": id_code, "reason": "Sudah ada di kontainer"})
-                continue
-
-            row = conn.execute("SELECT status, defect_level, is_universal FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
-            if not row:
-                skipped.append({"id_code": id_code, "reason": "Item tidak ditemukan"})
-                continue
-
-            status = row["status"]
-            defect = (row["defect_level"] or "none")
-            is_univ = int(row["is_universal"] or 0)
-
-            # status rules
-            if status in ("Hilang", "Afkir"):
-                skipped.append({"id_code": id_code, "reason": f"Status {status} tidak bisa checkout"})
-                continue
-            if status == "Keluar":
-                skipped.append({"id_code": id_code, "reason": "Item sudah Keluar"})
-                continue
-
-            # condition at checkout
-            if status == "Rusak" or defect in ("ringan", "berat"):
-                if defect == "berat":
-                    if not override_heavy or not override_reason:
-                        skipped.append({"id_code": id_code, "reason": "Rusak berat butuh konfirmasi & alasan"})
-                        continue
-                    condition = "rusak_berat"
-                else:
-                    condition = "rusak_ringan"
-            else:
-                condition = "good"
-
-            # insert
-            conn.execute("""
-              INSERT INTO container_item (container_id, id_code, added_at, batch_label, condition_at_checkout, override_reason, amend_reason)
-              VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
-                cid,
-                id_code,
-                now_iso(),
-                batch_label,
-                condition,
-                (override_reason if condition == "rusak_berat" else None),
-                (amend_reason if is_amend else None),
-            ))
-
-            # set status item -> Keluar (non-universal only)
-            if not is_univ:
-                conn.execute("UPDATE item_unit SET status='Keluar' WHERE id_code=?", (id_code,))
-            added.append({"id_code": id_code, "condition": condition})
-
+        codes = [c for c in ((raw or "").strip() for raw in ids) if c]
+        added, skipped = _add_many(conn, cid, codes, batch_label, is_amend=is_amend, amend_reason=amend_reason,
+                                   override_heavy=override_heavy, override_reason=override_reason)
         conn.commit()
 
         # added counts
@@ -332,8 +491,6 @@ def add_items(cid):
             counts[a["condition"]] += 1
 
         return jsonify({"ok": True, "added": added, "added_counts": counts, "skipped": skipped, "batch": batch_label})
-    finally:
-        conn.close()
 
 # ---------- Void (batalkan item salah input) ----------
 @bp.post("/<cid>/void_item")
@@ -346,11 +503,10 @@ def void_item(cid):
     if not id_code:
         return jsonify({"error": True, "message": "id_code wajib"}), 400
 
-    conn = get_conn()
-    try:
+    with connection() as conn:
         row = conn.execute(
             """
-            SELECT id, condition_at_checkout, returned_at, return_condition FROM container_item
+            SELECT id, condition_at_checkout FROM container_item
             WHERE container_id=? AND id_code=? AND voided_at IS NULL
             """,
             (cid, id_code),
@@ -369,11 +525,8 @@ def void_item(cid):
         )
 
         # For universal items, global status was never changed; skip reverting global status
-        uni = conn.execute("SELECT is_universal FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
-        is_univ = int(uni["is_universal"] or 0) if uni else 0
         if not is_univ:
             prev = (row["condition_at_checkout"] or "good").strip()
-            already_returned = bool(row["returned_at"])
             if prev == "good":
                 conn.execute(
                     "UPDATE item_unit SET status='Good', defect_level='none' WHERE id_code=?",
@@ -398,124 +551,179 @@ def void_item(cid):
 
         conn.commit()
         return jsonify({"ok": True})
-    finally:
-        conn.close()
 
 # ---------- Check-in item ----------
-@bp.post("/<cid>/checkin")
-@auth_required
-def checkin_item(cid):
-    b = request.get_json(silent=True) or {}
-    id_code = (b.get("id_code") or "").strip()
-    condition = (b.get("condition") or "good").strip().lower()
-    note = (b.get("damage_note") or "").strip()
+CHECKIN_CONDITIONS = ("good", "rusak_ringan", "rusak_berat", "lost", "hilang")
+CHECKIN_BATCH_MAX = 5000
+_CHECKIN_LINE_SQL = {
+    # lost: returned_at tidak diisi (tetap Out tapi ditandai hilang)
+    "lost": "UPDATE container_item SET return_condition=?, damage_note=? WHERE id=?",
+    "return": "UPDATE container_item SET returned_at=?, return_condition=?, damage_note=? WHERE id=?",
+}
 
-    if not id_code:
-        return jsonify({"error": True, "message": "id_code wajib"}), 400
-    if condition not in ("good", "rusak_ringan", "rusak_berat", "lost", "hilang"):
-        return jsonify({"error": True, "message": "condition tidak valid"}), 400
+def _checkin_blocked(line, item_status, role, condition, note):
+    """Aturan check-in satu baris container_item (aktif) per role.
+    None = boleh, else (pesan, http code)."""
+    prev = (line["condition_at_checkout"] or "good").strip()
+    already_returned = bool(line["returned_at"])
+    # Allowed transitions
+    if not already_returned:
+        # Item belum kembali: PIC/Operator hanya boleh validasi ke kondisi awal (prev),
+        # admin boleh ke kondisi apapun (Lost ditangani khusus di bawah)
+        if role in ("pic", "operator"):
+            allowed = {prev}
+        else:
+            allowed = {"good", "rusak_ringan", "rusak_berat"}
+    else:
+        current = (line["return_condition"] or "good").strip().lower()
+        allowed = {"good", "rusak_ringan", "rusak_berat"}
+        if role in ("pic", "operator"):
+            if current == 'rusak_berat':
+                allowed = {"rusak_berat"}
+            elif current == 'rusak_ringan':
+                allowed = {"rusak_ringan", "rusak_berat"}
+            else:  # good
+                allowed = {"good", "rusak_ringan", "rusak_berat"}
 
-    conn = get_conn()
-    try:
-        row = conn.execute(
-            """
-            SELECT id, condition_at_checkout, returned_at, return_condition FROM container_item
-            WHERE container_id=? AND id_code=? AND voided_at IS NULL
-            """,
-            (cid, id_code),
-        ).fetchone()
-        if not row:
-            return jsonify({"error": True, "message": "Item tidak aktif di kontainer"}), 404
+    # Allow 'lost/hilang' regardless of allowed set
+    if condition not in ("lost", "hilang") and condition not in allowed:
+        return f"Perubahan kondisi tidak diizinkan (dari {prev} ke {condition})", 400
 
-        # Determine if this item is universal (doesn't change global status)
-        uni = conn.execute("SELECT is_universal FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
-        is_univ = int(uni["is_universal"] or 0) if uni else 0
+    # Role-based guard: PIC/Operator tidak boleh mengubah status item yang sudah 'Hilang' dari Inventory
+    if role in ("pic", "operator") and (item_status or "") == "Hilang":
+        return "Status Hilang hanya bisa diubah oleh admin", 403
 
-        prev = (row["condition_at_checkout"] or "good").strip()
-        already_returned = bool(row["returned_at"])
-        role = str((getattr(request, 'user', {}) or {}).get('role') or '').lower()
-        # Allowed transitions
-        if not already_returned:
-            # Item belum kembali: PIC/Operator hanya boleh validasi ke kondisi awal (prev),
-            # admin boleh ke kondisi apapun (Lost ditangani khusus di bawah)
-            if role in ("pic", "operator"):
-                allowed = {prev}
-            else:
-                allowed = {"good", "rusak_ringan", "rusak_berat"}
-        else:
-            current = (row["return_condition"] or "good").strip().lower()
-            allowed = {"good", "rusak_ringan", "rusak_berat"}
-            if role in ("pic", "operator"):
-                if current == 'rusak_berat':
-                    allowed = {"rusak_berat"}
-                elif current == 'rusak_ringan':
-                    allowed = {"rusak_ringan", "rusak_berat"}
-                else:  # good
-                    allowed = {"good", "rusak_ringan", "rusak_berat"}
+    # Require reason for rusak/lost unless equal to previous checkout condition (rusak->same rusak)
+    if condition in ("rusak_ringan", "rusak_berat", "lost", "hilang") and not note:
+        if not (condition in ("rusak_ringan", "rusak_berat") and condition == prev):
+            return "Alasan wajib untuk kondisi rusak/hilang", 400
+    return None
 
+def _checkin_many(conn, cid, entries, role):
+    """Terapkan check-in [(id_code, condition, note)] berurutan (tanpa commit).
+    Baris & item dibaca per chunk; entri berikutnya melihat hasil entri sebelumnya.
+    Return list hasil per entri: {id_code, ok} atau {id_code, ok: False, message, code}."""
+    codes = list(dict.fromkeys(e[0] for e in entries))
+    lines, items = {}, {}
+    for chunk in chunked(codes):
+        ph = marks(len(chunk))
+        for r in conn.execute(f"""
+            SELECT id, id_code, condition_at_checkout, returned_at, return_condition FROM container_item
+            WHERE container_id=? AND voided_at IS NULL AND id_code IN ({ph})
+        """, [cid] + chunk):
+            lines[r["id_code"]] = dict(r)
+        for r in conn.execute(f"SELECT id_code, status, is_universal FROM item_unit WHERE id_code IN ({ph})", chunk):
+            items[r["id_code"]] = dict(r)
 
-        # Allow 'lost/hilang' regardless of allowed set
-        if condition in ("lost", "hilang"):
-            pass
-        elif condition not in allowed:
-            return jsonify({
-                "error": True,
-                "message": f"Perubahan kondisi tidak diizinkan (dari {prev} ke {condition})"
-            }), 400
+    ts = now_iso()
+    results, line_writes, item_writes = [], [], []
+    for id_code, condition, note in entries:
+        line = lines.get(id_code)
+        if not line:
+            results.append({"id_code": id_code, "ok": False, "message": "Item tidak aktif di kontainer", "code": 404})
+            continue
+        item = items.get(id_code) or {}
+        blocked = _checkin_blocked(line, item.get("status"), role, condition, note)
+        if blocked:
+            results.append({"id_code": id_code, "ok": False, "message": blocked[0], "code": blocked[1]})
+            continue
 
         # Update container_item: for 'lost/hilang' do not set returned_at (keep as Out but marked lost)
         if condition in ("lost", "hilang"):
-            conn.execute(
-                "UPDATE container_item SET return_condition=?, damage_note=? WHERE id=?",
-                ("hilang", note or None, row["id"]),
-            )
+            line_writes.append(("lost", ("hilang", note or None, line["id"])))
+            line["return_condition"] = "hilang"
         else:
-            conn.execute(
-                "UPDATE container_item SET returned_at=?, return_condition=?, damage_note=? WHERE id=?",
-                (now_iso(), condition, note or None, row["id"]),
-            )
-
-        # Role-based guard: PIC/Operator tidak boleh mengubah status item yang sudah 'Hilang' dari Inventory
-        cur_item = conn.execute("SELECT status FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
-        if role in ("pic", "operator") and cur_item and (cur_item["status"] or "") == "Hilang":
-            return jsonify({"error": True, "message": "Status Hilang hanya bisa diubah oleh admin"}), 403
-
-        # Require reason for rusak/lost unless equal to previous checkout condition (rusak->same rusak)
-        if condition in ("rusak_ringan", "rusak_berat", "lost", "hilang") and not note:
-            if not (condition in ("rusak_ringan", "rusak_berat") and condition == prev):
-                return jsonify({"error": True, "message": "Alasan wajib untuk kondisi rusak/hilang"}), 400
+            line_writes.append(("return", (ts, condition, note or None, line["id"])))
+            line["returned_at"], line["return_condition"] = ts, condition
 
-        if not is_univ:
+        # universal item tidak mengubah status global
+        if item and not int(item.get("is_universal") or 0):
             if condition == "good":
-                conn.execute(
-                    "UPDATE item_unit SET status='Good', defect_level='none' WHERE id_code=?",
-                    (id_code,),
-                )
+                status, level = "Good", "none"
             elif condition in ("rusak_ringan", "rusak_berat"):
-                level = "ringan" if condition == "rusak_ringan" else "berat"
-                conn.execute(
-                    "UPDATE item_unit SET status='Rusak', defect_level=? WHERE id_code=?",
-                    (level, id_code),
-                )
+                status, level = "Rusak", ("ringan" if condition == "rusak_ringan" else "berat")
             else:  # lost/hilang
-                conn.execute(
-                    "UPDATE item_unit SET status='Hilang', defect_level='none' WHERE id_code=?",
-                    (id_code,),
-                )
+                status, level = "Hilang", "none"
+            item_writes.append((status, level, id_code))
+            item["status"] = status
+        results.append({"id_code": id_code, "ok": True})
 
-        # Jangan auto-close ketika semua sudah returned; penutupan dilakukan manual via tombol di UI
+    # urutan antar entri dijaga: executemany per deret jenis update yang sama
+    for kind, group in groupby(line_writes, key=lambda w: w[0]):
+        conn.executemany(_CHECKIN_LINE_SQL[kind], [params for _, params in group])
+    conn.executemany("UPDATE item_unit SET status=?, defect_level=? WHERE id_code=?", item_writes)
+    # Jangan auto-close ketika semua sudah returned; penutupan dilakukan manual via tombol di UI
+    return results
 
+@bp.post("/<cid>/checkin")
+@auth_required
+def checkin_item(cid):
+    b = request.get_json(silent=True) or {}
+    id_code = (b.get("id_code") or "").strip()
+    condition = (b.get("condition") or "good").strip().lower()
+    note = (b.get("damage_note") or "").strip()
+
+    if not id_code:
+        return jsonify({"error": True, "message": "id_code wajib"}), 400
+    if condition not in CHECKIN_CONDITIONS:
+        return jsonify({"error": True, "message": "condition tidak valid"}), 400
+
+    role = str((getattr(request, 'user', {}) or {}).get('role') or '').lower()
+    with connection() as conn:
+        res = _checkin_many(conn, cid, [(id_code, condition, note)], role)[0]
+        if not res["ok"]:
+            return jsonify({"error": True, "message": res["message"]}), res["code"]
         conn.commit()
         return jsonify({"ok": True})
-    finally:
-        conn.close()
+
+@bp.post("/<cid>/checkin_batch")
+@auth_required
+def checkin_batch(cid):
+    """
+    Check-in banyak item dalam satu transaksi, aturan sama dengan /checkin.
+    Payload: { items: [{ id_code, condition?: 'good'|..., damage_note? }, ...] }
+    Response: { ok, results: [{id_code, ok, message?, code?}], counts: {ok, failed} }
+    Entri yang gagal dilewati; sisanya tetap di-commit.
+    """
+    b = request.get_json(silent=True) or {}
+    raw = b.get("items") or []
+    if not raw or not isinstance(raw, list):
+        return jsonify({"error": True, "message": "items (list) wajib"}), 400
+    if len(raw) > CHECKIN_BATCH_MAX:
+        return jsonify({"error": True, "message": f"Maksimal {CHECKIN_BATCH_MAX} item per batch"}), 400
+
+    role = str((getattr(request, 'user', {}) or {}).get('role') or '').lower()
+    entries, invalid = [], []
+    for pos, e in enumerate(raw):
+        e = e if isinstance(e, dict) else {"id_code": e}
+        id_code = str(e.get("id_code") or "").strip()
+        condition = str(e.get("condition") or "good").strip().lower()
+        note = str(e.get("damage_note") or e.get("note") or "").strip()
+        if not id_code:
+            invalid.append((pos, {"id_code": id_code, "ok": False, "message": "id_code wajib", "code": 400}))
+        elif condition not in CHECKIN_CONDITIONS:
+            invalid.append((pos, {"id_code": id_code, "ok": False, "message": "condition tidak valid", "code": 400}))
+        else:
+            entries.append((id_code, condition, note))
+
+    with connection() as conn:
+        c = conn.execute("SELECT 1 FROM containers WHERE id=?", (cid,)).fetchone()
+        if not c:
+            return jsonify({"error": True, "message": "Kontainer tidak ditemukan"}), 404
+        results = _checkin_many(conn, cid, entries, role) if entries else []
+        conn.commit()
+
+    # kembalikan urutan sesuai payload
+    for pos, res in invalid:
+        results.insert(pos, res)
+    ok = sum(1 for r in results if r["ok"])
+    return jsonify({"ok": True, "results": results, "counts": {"ok": ok, "failed": len(results) - ok}})
 
 # ---------- Submit DN (create immutable snapshot version) ----------
 @bp.post("/<cid>/submit_dn")
 @auth_required
 def submit_dn(cid):
-    conn = get_conn()
-    try:
+    with connection() as conn:
         c, batches, totals = _build_detail(conn, cid)
         if not c:
             return jsonify({"error": True, "message": "Kontainer tidak ditemukan"}), 404
@@ -534,32 +742,26 @@ def submit_dn(cid):
             "totals": totals,
             "note": "Snapshot DN versi %d" % nextv
         }
-        conn.execute("""
-          INSERT INTO dn_snapshots (container_id, version, payload, created_at, created_by)
-          VALUES (?, ?, ?, ?, ?)
-        """, (cid, nextv, json.dumps(payload), now_iso(), None))
+        dn_store.save(conn, cid, nextv, payload, now_iso(), None)
         conn.commit()
         return jsonify({"ok": True, "version": nextv})
-    finally:
-        conn.close()
+
+_DN_COLS = "version, created_at, format, payload, header, lines"
 
 # ---------- Get latest DN snapshot (for printing) ----------
 @bp.get("/<cid>/dn_latest")
 @auth_required
 def dn_latest(cid):
-    conn = get_conn()
-    try:
-        row = conn.execute("""
-          SELECT version, payload, created_at FROM dn_snapshots
+    with connection() as conn:
+        row = conn.execute(f"""
+          SELECT {_DN_COLS} FROM dn_snapshots
           WHERE container_id=? ORDER BY version DESC LIMIT 1
         """, (cid,)).fetchone()
         if not row:
             return jsonify({"error": True, "message": "Belum ada DN"}), 404
-        data = json.loads(row["payload"])
+        data = dn_store.load(conn, row)
         data["_meta"] = {"version": row["version"], "created_at": row["created_at"]}
         return jsonify(data)
-    finally:
-        conn.close()
 
 # ---------- Get DN snapshot by version ----------
 @bp.get("/<cid>/dn/<ver>")
@@ -569,41 +771,67 @@ def dn_by_version(cid, ver):
         ver = int(ver)
     except Exception:
         return jsonify({"error": True, "message": "Version tidak valid"}), 400
-    conn = get_conn()
-    try:
+    with connection() as conn:
         row = conn.execute(
-            "SELECT version, payload, created_at FROM dn_snapshots WHERE container_id=? AND version=?",
+            f"SELECT {_DN_COLS} FROM dn_snapshots WHERE container_id=? AND version=?",
             (cid, ver),
         ).fetchone()
         if not row:
             return jsonify({"error": True, "message": "DN versi tidak ditemukan"}), 404
-        data = json.loads(row["payload"])
+        data = dn_store.load(conn, row)
         data["_meta"] = {"version": row["version"], "created_at": row["created_at"]}
         return jsonify(data)
-    finally:
-        conn.close()
+
+# ---------- DN snapshot sebagai PDF (render server, cache per versi) ----------
+@bp.get("/<cid>/dn/<int:ver>.pdf")
+@auth_required
+def dn_pdf_by_version(cid, ver):
+    with connection() as conn:
+        row = conn.execute(
+            "SELECT id, created_at FROM dn_snapshots WHERE container_id=? AND version=?",
+            (cid, ver),
+        ).fetchone()
+    if not row:
+        return jsonify({"error": True, "message": "DN versi tidak ditemukan"}), 404
+    # snapshot immutable -> ETag kuat dari identitas snapshot, render hanya saat cache kosong
+    etag = dn_pdf.DnPdfCache.key(cid, ver, row["id"], row["created_at"])
+    if etag in request.if_none_match:
+        resp = Response(status=304)
+    else:
+        def load_payload():
+            with connection() as conn:
+                snap = conn.execute(f"SELECT {_DN_COLS} FROM dn_snapshots WHERE id=?", (row["id"],)).fetchone()
+                return dn_store.load(conn, snap)
+        data = dn_pdf.dn_pdf_cache.get(cid, ver, etag, load_payload, row["created_at"])
+        resp = Response(data, mimetype="application/pdf")
+        resp.headers["Content-Disposition"] = f'inline; filename="SJ-{cid}-V{ver}.pdf"'
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return resp
 
 # ---------- List DN snapshots (for audit) ----------
 @bp.get("/<cid>/dn_list")
 @auth_required
 def dn_list(cid):
-    conn = get_conn()
-    try:
+    """Metadata + ringkasan perubahan (jumlah) per versi; payload lengkap lewat /dn/<ver>."""
+    with connection() as conn:
         rows = conn.execute(
-            "SELECT version, created_at, payload FROM dn_snapshots WHERE container_id=? ORDER BY version ASC",
+            "SELECT version, created_at, created_by, line_count, totals, format, payload, lines "
+            "FROM dn_snapshots WHERE container_id=? ORDER BY version ASC",
             (cid,),
         ).fetchall()
+        diffs = dn_store.version_diffs(conn, rows)
         out = []
-        for r in rows:
-            p = json.loads(r["payload"]) if r["payload"] else {}
+        for r, diff in zip(rows, diffs):
             out.append({
                 "version": r["version"],
                 "created_at": r["created_at"],
-                "payload": p,
+                "created_by": r["created_by"],
+                "line_count": r["line_count"],
+                "totals": json.loads(r["totals"]) if r["totals"] else None,
+                "diff": diff,
             })
         return jsonify({"versions": out})
-    finally:
-        conn.close()
 
 # ---------- Set container status ----------
 @bp.post("/<cid>/set_status")
@@ -615,27 +843,17 @@ def set_status(cid):
     if status not in allowed:
         return jsonify({"error": True, "message": "Status tidak valid"}), 400
 
-    conn = get_conn()
-    try:
-        c = conn.execute("SELECT status FROM containers WHERE id=?", (cid,)).fetchone()
+    with connection() as conn:
+        c = conn.execute("SELECT status, tot_outstanding FROM containers WHERE id=?", (cid,)).fetchone()
         if not c:
             return jsonify({"error": True, "message": "Kontainer tidak ditemukan"}), 404
         cur = c["status"]
         if cur == "Closed" and status != "Closed":
             return jsonify({"error": True, "message": "Kontainer sudah Closed"}), 400
 
-        # If closing, ensure all returned
+        # If closing, ensure all returned (item non-universal, belum kembali & tidak hilang)
         if status == "Closed":
-            left = conn.execute(
-                """SELECT COUNT(*) c FROM container_item ci
-                        JOIN item_unit iu ON iu.id_code = ci.id_code
-                    WHERE ci.container_id=? AND ci.voided_at IS NULL AND ci.returned_at IS NULL
-                      AND (ci.return_condition IS NULL OR LOWER(ci.return_condition) <> 'hilang')
-                      AND (iu.is_universal IS NULL OR iu.is_universal=0)
-                """,
-                (cid,),
-            ).fetchone()["c"]
-            if left > 0:
+            if int(c["tot_outstanding"] or 0) > 0:
                 return jsonify({"error": True, "message": "Masih ada item belum kembali"}), 400
 
         # Require DN snapshot before moving to "Sedang Berjalan"
@@ -650,8 +868,6 @@ def set_status(cid):
         conn.execute("UPDATE containers SET status=? WHERE id=?", (status, cid))
         conn.commit()
         return jsonify({"ok": True, "status": status})
-    finally:
-        conn.close()
 
 # ---------- Delete container (admin only, safe) ----------
 @bp.delete("/<cid>")
@@ -661,17 +877,371 @@ def delete_container(cid):
     cid = (cid or '').strip()
     if not cid:
         return jsonify({"error": True, "message": "cid wajib"}), 400
-    conn = get_conn()
-    try:
+    with connection() as conn:
         c = conn.execute("SELECT status FROM containers WHERE id=?", (cid,)).fetchone()
         if not c:
             return jsonify({"error": True, "message": "Kontainer tidak ditemukan"}), 404
         # Delete children then parent; unlink emoney tx
         conn.execute("DELETE FROM container_item WHERE container_id=?", (cid,))
-        conn.execute("DELETE FROM dn_snapshots   WHERE container_id=?", (cid,))
+        dn_store.delete_snapshots(conn, "container_id=?", (cid,))
         conn.execute("UPDATE emoney_tx SET ref_container_id=NULL WHERE ref_container_id=?", (cid,))
         conn.execute("DELETE FROM containers WHERE id=?", (cid,))
         conn.commit()
+        dn_pdf.dn_pdf_cache.forget(cid)
         return jsonify({"ok": True})
-    finally:
-        conn.close()
+
+# ---------- Scan session (checkout / check-in dari dock) ----------
+# Sesi & tiket SSE disimpan di DB (migrasi 14) supaya berlaku di semua worker.
+# Working set per kontainer (baris aktif + totals + status) hanya cache per proses:
+# sebelum dipakai selalu dicocokkan dengan table_version (containers, container_item,
+# item_unit), jadi perubahan dari endpoint lain (routes_items, admin cleanup/restore,
+# worker lain) terlihat tanpa harus memanggil apa pun dari sana.
+# Selama ada subscriber SSE, satu thread poller per working set mencocokkan cache tiap
+# SCAN_POLL_S; query-nya berjalan di luar ws.lock sehingga scan tidak ikut menunggu pool.
+SCAN_SESSION_IDLE_S = 30 * 60
+SCAN_TICKET_TTL_S = 30
+SCAN_POLL_S = 1
+SCAN_KEEPALIVE_S = 15
+SCAN_STREAM_MAX_S = 10 * 60      # stream ditutup lalu klien reconnect dengan tiket baru
+SCAN_MAX_SUBSCRIBERS = 4         # per kontainer per proses (tiap stream memegang satu thread)
+SCAN_TABLES = ("containers", "container_item", "item_unit")
+
+class _WorkingSet:
+    def __init__(self, cid):
+        self.cid = cid
+        self.lock = threading.Lock()
+        self.version = None      # table_versions(SCAN_TABLES) saat cache terakhir dibaca
+        self.status = None
+        self.lines = {}          # id_code -> baris aktif (dict dari _DETAIL_LINES_SQL)
+        self.totals = {k: 0 for k in CONTAINER_TOTALS}
+        self.subscribers = {}    # queue -> sid
+        self.poller = None
+        self.used = time.monotonic()
+
+    def read(self, conn, base=None):
+        """Baca state kontainer dari DB (tanpa mengubah cache; boleh di luar self.lock).
+        Return None kalau table_version masih `base`."""
+        if not conn.in_transaction:
+            conn.execute("BEGIN")    # versi & baris dari snapshot baca yang sama
+        version = table_versions(conn, SCAN_TABLES)
+        if base is not None and version == base:
+            return None
+        status, totals = _read_totals(conn, self.cid)
+        lines = {r["id_code"]: dict(r)
+                 for r in conn.execute(_DETAIL_LINES_SQL + " AND ci.voided_at IS NULL", (self.cid,))}
+        return version, status, totals or {k: 0 for k in CONTAINER_TOTALS}, lines
+
+    def apply(self, state):
+        """Pasang hasil read() ke cache (di bawah self.lock). Return events selisihnya."""
+        version, status, totals, lines = state
+        old_status, old_lines, old_totals = self.status, self.lines, self.totals
+        self.version, self.status, self.totals, self.lines = version, status, totals, lines
+        if status is None:
+            return [("closed", {"container_id": self.cid})]
+        events = []
+        for code in dict.fromkeys(list(old_lines) + list(lines)):
+            old, new = old_lines.get(code), lines.get(code)
+            if old != new:
+                events.append(("line", {
+                    "id_code": code,
+                    "batch": (new or old)["batch_label"],
+                    "line": _line_view(new) if new else None,   # None = baris di-void
+                }))
+        if totals != old_totals:
+            events.append(("totals", dict(totals)))
+        if status != old_status:
+            events.append(("status", {"status": status}))
+        return events
+
+    def sync(self, conn):
+        """read() + apply() untuk pemanggil yang sudah memegang self.lock."""
+        state = self.read(conn, self.version)
+        return self.apply(state) if state else []
+
+    def sync_outside_lock(self):
+        """Baca DB tanpa self.lock, lalu pasang & publish di bawah lock. Hasil dibuang kalau
+        cache sudah diperbarui pihak lain (scan) selama membaca; poll berikutnya menyusul."""
+        base = self.version
+        with connection() as conn:
+            state = self.read(conn, base)
+        if state is None:
+            return
+        with self.lock:
+            if self.version == base:
+                self.publish(self.apply(state))
+
+    def refresh(self, conn, codes):
+        """Baca ulang baris aktif `codes` dan totals kontainer. Return events."""
+        fresh = {}
+        for chunk in chunked(list(dict.fromkeys(codes))):
+            for r in conn.execute(
+                _DETAIL_LINES_SQL + f" AND ci.voided_at IS NULL AND ci.id_code IN ({marks(len(chunk))})",
+                [self.cid] + chunk,
+            ):
+                fresh[r["id_code"]] = dict(r)
+        events = []
+        for code in dict.fromkeys(codes):
+            old, new = self.lines.pop(code, None), fresh.get(code)
+            if new:
+                self.lines[code] = new
+            if old or new:
+                events.append(("line", {
+                    "id_code": code,
+                    "batch": (new or old)["batch_label"],
+                    "line": _line_view(new) if new else None,
+                }))
+        _, totals = _read_totals(conn, self.cid)
+        if totals is not None:
+            self.totals = totals
+        events.append(("totals", dict(self.totals)))
+        return events
+
+    def snapshot(self):
+        batches = {}
+        for d in sorted(self.lines.values(), key=lambda d: (d["added_at"], d["id"])):
+            batches.setdefault(d["batch_label"], []).append(_line_view(d))
+        return {"status": self.status, "batches": batches, "totals": dict(self.totals)}
+
+    def publish(self, events):
+        for q in list(self.subscribers):
+            for ev in events:
+                q.put(ev)
+
+    def subscribe(self, q, sid):
+        """Daftarkan subscriber (di bawah self.lock); jalankan poller kalau belum ada."""
+        self.subscribers[q] = sid
+        if self.poller is None:
+            self.poller = threading.Thread(target=self._poll, name=f"scan-poll-{self.cid}", daemon=True)
+            self.poller.start()
+
+    def _poll(self):
+        while True:
+            time.sleep(SCAN_POLL_S)
+            with self.lock:
+                if not self.subscribers:
+                    self.poller = None
+                    return
+                subs = dict(self.subscribers)
+            try:
+                self.sync_outside_lock()
+                with connection() as conn:
+                    live = {r[0] for r in conn.execute(
+                        f"SELECT sid FROM scan_session WHERE sid IN ({marks(len(subs))}) AND touched_at>=?",
+                        [*subs.values(), time.time() - SCAN_SESSION_IDLE_S],
+                    )}
+            except Exception:
+                continue   # pool penuh / DB sibuk: coba lagi di poll berikutnya
+            for q, sid in subs.items():
+                if sid not in live:
+                    q.put(("end", None))   # sesi ditutup / kadaluarsa
+
+_scan_lock = threading.Lock()
+_scan_sets = {}        # cid -> _WorkingSet (cache per proses)
+
+def _working_set(cid):
+    now = time.monotonic()
+    with _scan_lock:
+        for k, w in list(_scan_sets.items()):
+            if not w.subscribers and now - w.used > SCAN_SESSION_IDLE_S:
+                del _scan_sets[k]
+        ws = _scan_sets.get(cid)
+        if ws is None:
+            ws = _scan_sets[cid] = _WorkingSet(cid)
+        ws.used = now
+    return ws
+
+def _touch_scan_session(conn, cid, sid, user_id):
+    """Perpanjang sesi yang masih hidup milik `user_id` (tanpa commit). Return True kalau ada."""
+    now = time.time()
+    cur = conn.execute(
+        "UPDATE scan_session SET touched_at=? WHERE sid=? AND container_id=? AND user_id IS ? AND touched_at>=?",
+        (now, sid, cid, user_id, now - SCAN_SESSION_IDLE_S),
+    )
+    return cur.rowcount == 1
+
+@bp.post("/<cid>/scan_session")
+@auth_required
+def open_scan_session(cid):
+    """Buka sesi scan. Response: { sid, container: {id, status}, batches, totals }.
+    Scan via POST .../scan_session/<sid>/scan; update live via SSE .../events?ticket=
+    (tiket dari POST .../scan_session/<sid>/ticket)."""
+    user_id = (getattr(request, 'user', {}) or {}).get('id')
+    ws = _working_set(cid)
+    with connection() as conn, ws.lock:
+        conn.execute("BEGIN IMMEDIATE")
+        now = time.time()
+        conn.execute("DELETE FROM scan_session WHERE touched_at<?", (now - SCAN_SESSION_IDLE_S,))
+        conn.execute("DELETE FROM scan_ticket WHERE expires_at<?", (now,))
+        events = ws.sync(conn)
+        if ws.status is None:
+            conn.commit()
+            ws.publish(events)
+            return jsonify({"error": True, "message": "Kontainer tidak ditemukan"}), 404
+        sid = uuid.uuid4().hex
+        conn.execute("INSERT INTO scan_session (sid, container_id, user_id, touched_at) VALUES (?, ?, ?, ?)",
+                     (sid, cid, user_id, now))
+        conn.commit()
+        snap = ws.snapshot()
+        ws.publish(events)
+    return jsonify({"ok": True, "sid": sid, "container": {"id": cid, "status": snap["status"]},
+                    "batches": snap["batches"], "totals": snap["totals"]})
+
+def _scan_apply(conn, ws, cid, id_code, action, b, role):
+    """Validasi & tulis satu scan (tanpa commit; working set sudah di-sync). Return (result, code)."""
+    if ws.status is None:
+        return {"message": "Kontainer tidak ditemukan"}, 404
+    if action == "checkout":
+        # tolak cepat dari working set (baru saja dicocokkan dengan DB), tanpa query
+        if ws.status not in ("Open", "Sedang Berjalan"):
+            return {"message": "Kontainer tidak dalam status yang bisa ditambah (Open/Sedang Berjalan)"}, 400
+        if id_code in ws.lines:
+            return {"skipped": {"id_code": id_code, "reason": "Sudah ada di kontainer"}}, 409
+        is_amend = bool(b.get("amend") or False)
+        batch_label = ("AMEND-" + datetime.now().strftime("%Y%m%d-%H%M")) if is_amend else "MAIN"
+        added, skipped = _add_many(
+            conn, cid, [id_code], batch_label, is_amend=is_amend,
+            amend_reason=(b.get("amend_reason") or "").strip(),
+            override_heavy=bool(b.get("override_heavy") or False),
+            override_reason=(b.get("override_reason") or "").strip(),
+        )
+        if skipped:
+            return {"skipped": skipped[0]}, 409
+        return {"added": added[0], "batch": batch_label}, 200
+
+    condition = (b.get("condition") or "good").strip().lower()
+    if condition not in CHECKIN_CONDITIONS:
+        return {"message": "condition tidak valid"}, 400
+    if id_code not in ws.lines:
+        return {"message": "Item tidak aktif di kontainer"}, 404
+    res = _checkin_many(conn, cid, [(id_code, condition, (b.get("damage_note") or "").strip())], role)[0]
+    if not res["ok"]:
+        return {"message": res["message"]}, res["code"]
+    return {"checked_in": True, "condition": condition}, 200
+
+@bp.post("/<cid>/scan_session/<sid>/scan")
+@auth_required
+def scan_in_session(cid, sid):
+    """
+    Satu scan dalam sesi. Payload:
+      { id_code, action: 'checkout'|'checkin',
+        checkout: amend?, amend_reason?, override_heavy?, override_reason?
+        checkin : condition?, damage_note? }
+    Response: { ok, id_code, result, line, totals, ms }; result mengikuti add_items/checkin.
+    Validasi & tulis berjalan dalam satu BEGIN IMMEDIATE setelah working set di-sync,
+    jadi cache tidak pernah dipercaya melewati tulisan dari endpoint/worker lain.
+    """
+    t0 = time.perf_counter()
+    user = getattr(request, 'user', {}) or {}
+    b = request.get_json(silent=True) or {}
+    id_code = (b.get("id_code") or "").strip()
+    action = (b.get("action") or "checkout").strip().lower()
+    if not id_code:
+        return jsonify({"error": True, "message": "id_code wajib"}), 400
+    if action not in ("checkout", "checkin"):
+        return jsonify({"error": True, "message": "action harus checkout atau checkin"}), 400
+    role = str(user.get('role') or '').lower()
+
+    ws = _working_set(cid)
+    # koneksi dulu, baru lock: scan tidak menunggu pool sambil memegang ws.lock
+    with connection() as conn, ws.lock:
+        conn.execute("BEGIN IMMEDIATE")
+        if not _touch_scan_session(conn, cid, sid, user.get('id')):
+            conn.rollback()
+            return jsonify({"error": True, "message": "Sesi scan tidak ditemukan / kadaluarsa"}), 404
+        events = ws.sync(conn)
+        result, code = _scan_apply(conn, ws, cid, id_code, action, b, role)
+        if code == 200:
+            events += ws.refresh(conn, [id_code])
+            ws.version = table_versions(conn, SCAN_TABLES)   # masih di transaksi: hanya tulisan kita
+        else:
+            conn.rollback()   # batalkan juga tulisan parsial; touch sesi ikut batal, tidak masalah
+        conn.commit()
+        ws.publish(events)
+        line = ws.lines.get(id_code)
+        return jsonify({
+            "ok": code == 200,
+            "id_code": id_code,
+            "result": result,
+            "line": _line_view(line) if line else None,
+            "totals": dict(ws.totals),
+            "ms": round((time.perf_counter() - t0) * 1000, 2),
+        }), code
+
+@bp.post("/<cid>/scan_session/<sid>/ticket")
+@auth_required
+def scan_events_ticket(cid, sid):
+    """Tiket sekali pakai untuk SSE .../events?ticket= (berlaku SCAN_TICKET_TTL_S detik).
+    EventSource tidak bisa kirim header, dan token login tidak boleh masuk URL/log."""
+    user_id = (getattr(request, 'user', {}) or {}).get('id')
+    with connection() as conn:
+        if not _touch_scan_session(conn, cid, sid, user_id):
+            return jsonify({"error": True, "message": "Sesi scan tidak ditemukan / kadaluarsa"}), 404
+        ticket = uuid.uuid4().hex
+        conn.execute("INSERT INTO scan_ticket (ticket, sid, user_id, expires_at) VALUES (?, ?, ?, ?)",
+                     (ticket, sid, user_id, time.time() + SCAN_TICKET_TTL_S))
+        conn.commit()
+    return jsonify({"ok": True, "ticket": ticket, "expires_in": SCAN_TICKET_TTL_S})
+
+@bp.get("/<cid>/scan_session/<sid>/events")
+def scan_events(cid, sid):
+    """SSE (text/event-stream), dibuka dengan ?ticket= dari .../ticket (dipakai sekali).
+    Event: snapshot (awal), line, totals, status, closed. Perubahan dari endpoint/worker
+    lain dideteksi poller working set lewat table_version tiap SCAN_POLL_S detik.
+    Maks SCAN_MAX_SUBSCRIBERS stream per kontainer; stream berakhir setelah SCAN_STREAM_MAX_S."""
+    ticket = (request.args.get("ticket") or "").strip()
+    with connection() as conn:
+        row = conn.execute(
+            "DELETE FROM scan_ticket WHERE ticket=? AND sid=? AND expires_at>=? RETURNING user_id",
+            (ticket, sid, time.time()),
+        ).fetchone()
+        alive = row is not None and _touch_scan_session(conn, cid, sid, row["user_id"])
+        conn.commit()
+    if row is None:
+        return jsonify({"error": True, "message": "Tiket tidak valid / kadaluarsa"}), 401
+    if not alive:
+        return jsonify({"error": True, "message": "Sesi scan tidak ditemukan / kadaluarsa"}), 404
+
+    ws = _working_set(cid)
+    ws.sync_outside_lock()
+    q = queue.Queue()
+    with ws.lock:
+        if len(ws.subscribers) >= SCAN_MAX_SUBSCRIBERS:
+            return jsonify({"error": True, "message": "Terlalu banyak layar live untuk kontainer ini"}), 429
+        first = ("snapshot", ws.snapshot())
+        ws.subscribe(q, sid)
+
+    def fmt(ev):
+        name, data = ev
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    def gen():
+        try:
+            yield fmt(first)
+            deadline = time.monotonic() + SCAN_STREAM_MAX_S
+            while time.monotonic() < deadline:
+                try:
+                    ev = q.get(timeout=SCAN_KEEPALIVE_S)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if ev[0] == "end":
+                    return
+                yield fmt(ev)
+                if ev[0] == "closed":
+                    return
+        finally:
+            with ws.lock:
+                ws.subscribers.pop(q, None)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(gen(), mimetype="text/event-stream", headers=headers)
+
+@bp.delete("/<cid>/scan_session/<sid>")
+@auth_required
+def close_scan_session(cid, sid):
+    with connection() as conn:
+        cur = conn.execute("DELETE FROM scan_session WHERE sid=? AND container_id=?", (sid, cid))
+        if cur.rowcount:
+            conn.execute("DELETE FROM scan_ticket WHERE sid=?", (sid,))
+        conn.commit()
+    return jsonify({"ok": True})
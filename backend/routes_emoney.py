@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from routes_auth import auth_required, require_roles
-from db import get_conn, now_iso, new_emoney_id
+from db import connection, now_iso, new_emoney_id, encode_cursor, decode_cursor
+from http_cache import versioned
 
 bp = Blueprint("emoney", __name__, url_prefix="/emoney")
 
@@ -53,21 +54,20 @@ def create_emoney():
     if not label:
         return jsonify({"error": True, "message": "label wajib"}), 400
     eid = new_emoney_id()
-    conn = get_conn()
     try:
-        conn.execute(
-            "INSERT INTO emoney (id, label, status, created_at) VALUES (?, ?, 'Open', ?)",
-            (eid, label, now_iso()),
-        )
-        conn.commit()
-        return jsonify({"ok": True, "id": eid})
+        with connection() as conn:
+            conn.execute(
+                "INSERT INTO emoney (id, label, status, created_at) VALUES (?, ?, 'Open', ?)",
+                (eid, label, now_iso()),
+            )
+            conn.commit()
+            return jsonify({"ok": True, "id": eid})
     except Exception as e:
         return jsonify({"error": True, "message": "Gagal membuat emoney (duplikat label?)"}), 400
-    finally:
-        conn.close()
 
 @bp.get("")
 @auth_required
+@versioned('emoney', 'emoney_tx', 'containers')
 def list_emoney():
     q = (request.args.get("q") or "").strip().upper()
     page = int(request.args.get("page") or 1)
@@ -75,21 +75,34 @@ def list_emoney():
     if page < 1: page = 1
     if per_page < 1: per_page = 1
     if per_page > 100: per_page = 100
+    # keyset paging: ?cursor= (kosong = halaman pertama); total hanya jika with_total=1
+    cursor_mode = "cursor" in request.args
+    after = decode_cursor(request.args.get("cursor"))
+    if request.args.get("cursor") and after is None:
+        return jsonify({"error": True, "message": "cursor tidak valid"}), 400
+    with_total = (not cursor_mode) or (request.args.get("with_total") or "").strip().lower() in ("1", "true", "yes", "y")
 
-    conn = get_conn()
-    try:
+    with connection() as conn:
         where_sql = "WHERE 1=1"
         args = []
         if q:
             where_sql += " AND (UPPER(id) LIKE ? OR UPPER(label) LIKE ? OR UPPER(status) LIKE ?)"
             like = f"%{q}%"; args += [like, like, like]
 
-        total = conn.execute(f"SELECT COUNT(*) c FROM emoney {where_sql}", args).fetchone()["c"]
-        offset = (page - 1) * per_page
+        total = None
+        if with_total:
+            total = conn.execute(f"SELECT COUNT(*) c FROM emoney {where_sql}", args).fetchone()["c"]
+        page_sql, page_args = where_sql, list(args)
+        if after:
+            page_sql += " AND (created_at, id) < (?, ?)"
+            page_args += after
+        offset = 0 if cursor_mode else (page - 1) * per_page
         rows = conn.execute(
-            f"SELECT id, label, status, created_at FROM emoney {where_sql} ORDER BY created_at DESC LIMIT ? OFFSET ?",
-            args + [per_page, offset],
+            f"SELECT id, label, status, created_at FROM emoney {page_sql} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+            page_args + [per_page + 1, offset],
         ).fetchall()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
 
         out = []
         for r in rows:
@@ -126,15 +139,22 @@ def list_emoney():
                 "linked_closed": closed, "fully_closed": fully_closed,
             })
 
-        return jsonify({"data": out, "total": int(total), "page": page, "per_page": per_page})
-    finally:
-        conn.close()
+        resp = {
+            "data": out,
+            "per_page": per_page,
+            "next_cursor": encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if has_more else None,
+        }
+        if total is not None:
+            resp["total"] = int(total)
+        if not cursor_mode:
+            resp["page"] = page
+        return jsonify(resp)
 
 @bp.get("/<eid>")
 @auth_required
+@versioned('emoney', 'emoney_tx', 'containers')
 def get_emoney(eid):
-    conn = get_conn()
-    try:
+    with connection() as conn:
         e = conn.execute("SELECT * FROM emoney WHERE id=?", (eid,)).fetchone()
         if not e:
             return jsonify({"error": True, "message": "Emoney tidak ditemukan"}), 404
@@ -177,8 +197,6 @@ def get_emoney(eid):
             "tot_topup": topup, "tot_expense": expense, "balance": balance,
             "linked_containers": ids, "linked_closed": closed, "fully_closed": fully_closed,
         })
-    finally:
-        conn.close()
 
 @bp.post("/<eid>/tx")
 @auth_required
@@ -192,8 +210,7 @@ def add_tx(eid):
         return jsonify({"error": True, "message": "type harus topup/expense"}), 400
     if amount is None:
         return jsonify({"error": True, "message": "amount harus angka > 0"}), 400
-    conn = get_conn()
-    try:
+    with connection() as conn:
         e = conn.execute("SELECT id FROM emoney WHERE id=?", (eid,)).fetchone()
         if not e:
             return jsonify({"error": True, "message": "Emoney tidak ditemukan"}), 404
@@ -216,8 +233,6 @@ def add_tx(eid):
         )
         conn.commit()
         return jsonify({"ok": True})
-    finally:
-        conn.close()
 
 @bp.post("/<eid>/set_status")
 @auth_required
@@ -226,8 +241,7 @@ def set_status(eid):
     status = (b.get("status") or "").strip()
     if status not in ("Open", "Closed"):
         return jsonify({"error": True, "message": "Status tidak valid"}), 400
-    conn = get_conn()
-    try:
+    with connection() as conn:
         e = conn.execute("SELECT status FROM emoney WHERE id=?", (eid,)).fetchone()
         if not e:
             return jsonify({"error": True, "message": "Emoney tidak ditemukan"}), 404
@@ -255,8 +269,6 @@ def set_status(eid):
         conn.execute("UPDATE emoney SET status=? WHERE id=?", (status, eid))
         conn.commit()
         return jsonify({"ok": True, "status": status})
-    finally:
-        conn.close()
 
 @bp.get("/tx_by_container/<cid>")
 @auth_required
@@ -264,8 +276,7 @@ def tx_by_container(cid):
     cid = (cid or "").strip()
     if not cid:
         return jsonify({"error": True, "message": "cid wajib"}), 400
-    conn = get_conn()
-    try:
+    with connection() as conn:
         rows = conn.execute(
             """
             SELECT t.id, t.type, t.amount_cents, t.note, t.created_at, t.emoney_id, e.label AS emoney_label,
@@ -287,8 +298,6 @@ def tx_by_container(cid):
             "sum_topup": int(sums["topup"] or 0),
             "sum_expense": int(sums["expense"] or 0),
         })
-    finally:
-        conn.close()
 
 @bp.get("/tx")
 @auth_required
@@ -310,8 +319,7 @@ def tx_by_range():
     if ttype and ttype not in ("topup", "expense"):
         return jsonify({"error": True, "message": "type harus topup/expense"}), 400
 
-    conn = get_conn()
-    try:
+    with connection() as conn:
         where = ["t.created_at >= ?", "t.created_at <= ?"]
         args = [start_iso, end_iso]
         if eid:
@@ -355,8 +363,6 @@ def tx_by_range():
             "start": start_iso,
             "end": end_iso,
         })
-    finally:
-        conn.close()
 
 @bp.delete("/<eid>")
 @auth_required
@@ -365,8 +371,7 @@ def delete_emoney(eid):
     eid = (eid or "").strip()
     if not eid:
         return jsonify({"error": True, "message": "id wajib"}), 400
-    conn = get_conn()
-    try:
+    with connection() as conn:
         row = conn.execute("SELECT id FROM emoney WHERE id=?", (eid,)).fetchone()
         if not row:
             return jsonify({"error": True, "message": "Emoney tidak ditemukan"}), 404
@@ -375,5 +380,3 @@ def delete_emoney(eid):
         conn.execute("DELETE FROM emoney WHERE id=?", (eid,))
         conn.commit()
         return jsonify({"ok": True})
-    finally:
-        conn.close()
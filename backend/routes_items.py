@@ -1,7 +1,9 @@
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from routes_auth import auth_required, require_roles
-from db import get_conn, now_iso
-import qrcode, io, re
+from db import connection, now_iso, fts_enabled, encode_cursor, decode_cursor, chunked, marks, unique_ids
+from http_cache import versioned
+import qr_render, sheet_reader
+import io, re, sqlite3, csv, json, shutil, tempfile
 
 bp = Blueprint("items", __name__, url_prefix="/items")
 
@@ -11,22 +13,98 @@ def _sanitize_code(text: str) -> str:
     t = re.sub(r"[^A-Z0-9\-]", "", t)
     return t
 
-def _next_number_for(prefix: str, model: str, conn) -> int:
-    base = f"{_sanitize_code(prefix)}-{_sanitize_code(model)}-"
-    cur = conn.cursor()
-    cur.execute("SELECT id_code FROM item_unit WHERE id_code LIKE ? || '%'", (base,))
+def _fts_phrase(cols, tok: str) -> str:
+    return "{" + " ".join(cols) + "}: \"" + tok.replace('"', '""') + "\""
+
+def _search_filter(conn, tokens, cols, alias, also_like=()):
+    """
+    SQL ' AND (...)' per token (semua token di-AND), token cocok substring di salah satu kolom.
+    Pakai index FTS5 item_search jika ada & token >= 3 huruf (batas trigram),
+    selain itu fallback ke UPPER(col) LIKE. `also_like` = kolom tambahan di luar
+    item_unit yang selalu dicek dengan LIKE.
+    """
+    use_fts = fts_enabled(conn)
+    sql, args = "", []
+    for tok in tokens:
+        # % dan _ dicari apa adanya, sama seperti FTS
+        like = "%" + re.sub(r"([\\%_])", r"\\\1", tok) + "%"
+        if use_fts and len(tok) >= 3:
+            conds = [f"{alias}.rowid IN (SELECT rowid FROM item_search WHERE item_search MATCH ?)"]
+            args.append(_fts_phrase(cols, tok))
+        else:
+            conds = [f"UPPER({alias}.{c}) LIKE ? ESCAPE '\\'" for c in cols]
+            args += [like] * len(cols)
+        conds += [f"UPPER({c}) LIKE ? ESCAPE '\\'" for c in also_like]
+        args += [like] * len(also_like)
+        sql += " AND (" + " OR ".join(conds) + ")"
+    return sql, args
+
+def _code_base(prefix: str, model: str) -> str:
+    return f"{_sanitize_code(prefix)}-{_sanitize_code(model)}-"
+
+def _last_number(conn, base: str) -> int:
+    """Nomor terbesar kode existing BASE-n (scan LIKE base%). Hanya untuk seed item_code_seq."""
     max_n = 0
-    for row in cur.fetchall():
+    for row in conn.execute("SELECT id_code FROM item_unit WHERE id_code LIKE ? || '%'", (base,)):
         code = row["id_code"]
         if "-" in code:
             tail = code.rsplit("-", 1)[-1]
             if tail.isdigit():
                 max_n = max(max_n, int(tail))
-    return max_n + 1
+    return max_n
+
+def _next_number_for(prefix: str, model: str, conn) -> int:
+    """Nomor berikutnya menurut kode existing (scan). Hanya dipakai untuk seed item_code_seq."""
+    return _last_number(conn, _code_base(prefix, model)) + 1
+
+def _allocate_numbers(prefix: str, model: str, qty: int, conn) -> int:
+    """Alokasikan `qty` nomor berurutan untuk (prefix, model); return nomor pertama.
+    UPDATE pada item_code_seq memegang write lock sampai commit, jadi dua batch
+    bersamaan tidak akan mendapat nomor yang sama."""
+    base = _code_base(prefix, model)
+    cur = conn.cursor()
+    if not cur.execute("SELECT 1 FROM item_code_seq WHERE base=?", (base,)).fetchone():
+        cur.execute(
+            "INSERT OR IGNORE INTO item_code_seq (base, last_n) VALUES (?, ?)",
+            (base, _next_number_for(prefix, model, conn) - 1),
+        )
+    cur.execute("UPDATE item_code_seq SET last_n = last_n + ? WHERE base=?", (qty, base))
+    last_n = cur.execute("SELECT last_n FROM item_code_seq WHERE base=?", (base,)).fetchone()["last_n"]
+    return int(last_n) - qty + 1
+
+def _code_tails(codes):
+    """{base: nomor terbesar} dari kode berbentuk BASE-n (kode lain diabaikan)."""
+    top = {}
+    for code in codes:
+        head, _, tail = code.rpartition("-")
+        if head and tail.isdigit():
+            base = head + "-"
+            top[base] = max(top.get(base, 0), int(tail))
+    return top
+
+def _bump_code_seq(conn, codes):
+    """Kode eksplisit BASE-n (mis. dari import) -> item_code_seq.last_n minimal n, dalam
+    transaksi pemanggil, supaya batch_create berikutnya tidak mengalokasikan nomor yang sama."""
+    for base, n in _code_tails(codes).items():
+        if conn.execute("UPDATE item_code_seq SET last_n = MAX(last_n, ?) WHERE base=?", (n, base)).rowcount:
+            continue
+        # belum ada counter: seed dari kode yang sudah ada
+        conn.execute(
+            "INSERT OR IGNORE INTO item_code_seq (base, last_n) VALUES (?, ?)",
+            (base, max(n, _last_number(conn, base))),
+        )
+
+BATCH_CREATE_MAX = 20000     # batas qty per request batch_create
+BATCH_CREATE_LIST_MAX = 500  # di atas ini response hanya berisi range kode
 
 @bp.post("/batch_create")
 @auth_required
 def batch_create():
+    """
+    Buat `qty` unit identik (1..BATCH_CREATE_MAX) dalam satu transaksi.
+    Response: { ok, count, first, last, created? }
+      - created (list id_code) hanya dikirim jika qty <= 500 dan compact tidak diminta.
+    """
     body = request.get_json(silent=True) or {}
     prefix = body.get("prefix") or ""
     name = body.get("name") or ""
@@ -35,33 +113,211 @@ def batch_create():
     rack = body.get("rack") or ""
     qty = int(body.get("qty") or 0)
     is_universal = 1 if (body.get("is_universal") in (True, 1, "1", "true", "TRUE", "True")) else 0
-    if not all([prefix, name, category, model, rack]) or qty < 1 or qty > 500:
-        return jsonify({"error": True, "message": "Data tidak lengkap atau qty tidak valid (1-500)"}), 400
+    compact = body.get("compact") in (True, 1, "1", "true", "TRUE", "True")
+    if not all([prefix, name, category, model, rack]) or qty < 1 or qty > BATCH_CREATE_MAX:
+        return jsonify({"error": True, "message": f"Data tidak lengkap atau qty tidak valid (1-{BATCH_CREATE_MAX})"}), 400
 
-    conn = get_conn()
-    try:
-        cur = conn.cursor()
-        start_n = _next_number_for(prefix, model, conn)
-        codes = []
-        for i in range(qty):
-            n = start_n + i
-            id_code = f"{_sanitize_code(prefix)}-{_sanitize_code(model)}-{n:03d}"
-            cur.execute("SELECT 1 FROM item_unit WHERE id_code=?", (id_code,))
-            if cur.fetchone():
-                return jsonify({"error": True, "message": f"Duplikat ID {id_code}, batalkan."}), 409
-            cur.execute("""
-              INSERT INTO item_unit (id_code, name, category, model, rack, status, defect_level, serial, created_at, is_universal)
-              VALUES (?, ?, ?, ?, ?, 'Good', 'none', NULL, ?, ?)
-            """, (id_code, name, category, _sanitize_code(model), rack, now_iso(), is_universal))
-            codes.append(id_code)
+    base = _code_base(prefix, model)
+    model_code = _sanitize_code(model)
+    ts = now_iso()
+    with connection() as conn:
+        # counter bisa tertinggal dari kode yang ditulis di luar batch_create (DB restore,
+        # data lama): saat bentrok, seed ulang dari kode existing lalu coba sekali lagi
+        for attempt in range(2):
+            if attempt:
+                conn.execute("UPDATE item_code_seq SET last_n = MAX(last_n, ?) WHERE base=?",
+                             (_last_number(conn, base), base))
+            start_n = _allocate_numbers(prefix, model, qty, conn)
+            codes = [f"{base}{n:03d}" for n in range(start_n, start_n + qty)]
+            try:
+                conn.executemany("""
+                  INSERT INTO item_unit (id_code, name, category, model, rack, status, defect_level, serial, created_at, is_universal)
+                  VALUES (?, ?, ?, ?, ?, 'Good', 'none', NULL, ?, ?)
+                """, ((code, name, category, model_code, rack, ts, is_universal) for code in codes))
+                break
+            except sqlite3.IntegrityError:
+                conn.rollback()
+        else:
+            return jsonify({"error": True, "message": f"Duplikat ID dalam rentang {codes[0]}..{codes[-1]}, batalkan."}), 409
         conn.commit()
-        return jsonify({"ok": True, "created": codes}), 201
-    finally:
-        conn.close()
+        out = {"ok": True, "count": qty, "first": codes[0], "last": codes[-1]}
+        if qty <= BATCH_CREATE_LIST_MAX and not compact:
+            out["created"] = codes
+        return jsonify(out), 201
+
+# ---------- Import CSV/XLSX ----------
+IMPORT_CHUNK = 1000         # baris per transaksi
+IMPORT_MAX_ROWS = 100000    # batas baris data per file
+IMPORT_MAX_ERRORS = 500     # detail error yang dikirim; sisanya hanya dihitung
+IMPORT_STATUS = {"good": "Good", "rusak": "Rusak", "afkir": "Afkir", "hilang": "Hilang"}
+IMPORT_DEFECT = ("none", "ringan", "berat")
+_TRUTHY = ("1", "true", "yes", "y", "ya")
+
+def _import_row(rec):
+    """Validasi satu baris import -> (item dict, None) atau (None, pesan error)."""
+    item = {k: (rec.get(k) or "").strip() for k in ("name", "category", "model", "rack", "serial", "prefix")}
+    missing = [k for k in ("name", "category", "model", "rack") if not item[k]]
+    if missing:
+        return None, "Kolom wajib kosong: " + ", ".join(missing)
+    raw_code = (rec.get("id_code") or rec.get("id") or "").strip()
+    item["id_code"] = _sanitize_code(raw_code) if raw_code else ""
+    if raw_code and not item["id_code"]:
+        return None, "id_code tidak valid"
+    if not item["id_code"] and not _sanitize_code(item["prefix"]):
+        return None, "id_code atau prefix wajib diisi"
+
+    status_raw = (rec.get("status") or "good").strip().lower()
+    if status_raw not in IMPORT_STATUS:
+        return None, f"status tidak valid: {rec.get('status')}"
+    defect = (rec.get("defect_level") or "none").strip().lower()
+    if defect not in IMPORT_DEFECT:
+        return None, f"defect_level tidak valid: {rec.get('defect_level')}"
+    item["status"] = IMPORT_STATUS[status_raw]
+    if item["status"] == "Rusak" and defect == "none":
+        defect = "ringan"
+    item["defect_level"] = defect
+    item["model"] = _sanitize_code(item["model"])
+    item["is_universal"] = 1 if (rec.get("is_universal") or "").strip().lower() in _TRUTHY else 0
+    return item, None
+
+def _import_chunk(conn, chunk, dry_run, seen, next_n, report):
+    """Alokasikan kode, cek duplikat (file & DB), lalu insert satu chunk."""
+    # kode eksplisit menaikkan counter dulu, jadi kode otomatis (chunk ini & batch_create
+    # berikutnya) tidak bentrok; dry-run hanya memprediksi tanpa menulis item_code_seq
+    explicit = [item["id_code"] for _, item in chunk if item["id_code"]]
+    if dry_run:
+        for base, n in _code_tails(explicit).items():
+            if base in next_n:
+                next_n[base] = max(next_n[base], n + 1)
+            else:
+                seq = conn.execute("SELECT last_n FROM item_code_seq WHERE base=?", (base,)).fetchone()
+                next_n[base] = max(int(seq["last_n"]) if seq else _last_number(conn, base), n) + 1
+    elif explicit:
+        _bump_code_seq(conn, explicit)
+
+    # kode otomatis per (prefix, model)
+    groups = {}
+    for line, item in chunk:
+        if not item["id_code"]:
+            groups.setdefault((item["prefix"], item["model"]), []).append(item)
+    for (prefix, model), items in groups.items():
+        base = _code_base(prefix, model)
+        if dry_run:
+            if base not in next_n:
+                seq = conn.execute("SELECT last_n FROM item_code_seq WHERE base=?", (base,)).fetchone()
+                next_n[base] = int(seq["last_n"]) + 1 if seq else _next_number_for(prefix, model, conn)
+            start = next_n[base]
+            next_n[base] += len(items)
+        else:
+            start = _allocate_numbers(prefix, model, len(items), conn)
+        for i, item in enumerate(items):
+            item["id_code"] = f"{base}{start + i:03d}"
+
+    codes = [item["id_code"] for _, item in chunk]
+    existing = set()
+    for part in chunked(codes):
+        existing.update(r[0] for r in conn.execute(
+            f"SELECT id_code FROM item_unit WHERE id_code IN ({marks(len(part))})", part
+        ))
+    rows, ts = [], now_iso()
+    for line, item in chunk:
+        code = item["id_code"]
+        if code in existing or code in seen:
+            report(line, code, "ID sudah ada" if code in existing else "ID duplikat di file")
+            continue
+        seen.add(code)
+        rows.append((code, item["name"], item["category"], item["model"], item["rack"],
+                     item["status"], item["defect_level"], item["serial"] or None, ts, item["is_universal"]))
+    if not dry_run and rows:
+        conn.executemany("""
+          INSERT INTO item_unit (id_code, name, category, model, rack, status, defect_level, serial, created_at, is_universal)
+          VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.commit()
+    return [r[0] for r in rows]
+
+@bp.post("/import")
+@auth_required
+def import_items():
+    """
+    Import item dari CSV/XLSX (multipart field `file`, atau body mentah + ?format=csv|xlsx).
+    Header (tidak peka huruf besar): id_code, prefix, name, category, model, rack,
+      status (Good|Rusak|Afkir|Hilang), defect_level (none|ringan|berat), serial, is_universal.
+      id_code kosong -> nomor otomatis dari prefix+model (sama dengan batch_create).
+    File dibaca per baris dan di-commit per IMPORT_CHUNK baris; ?dry_run=1 hanya validasi.
+    Response: { ok, dry_run, rows, created, first, last, error_count, errors: [{row, id_code, message}] }
+      - dry_run: created/first/last = yang akan dibuat, tidak ada yang ditulis.
+    """
+    dry_run = (request.values.get("dry_run") or "").strip().lower() in _TRUTHY
+    upload = request.files.get("file")
+    if upload is not None:
+        stream = upload.stream
+        fmt = request.values.get("format") or sheet_reader.detect_format(upload.filename, upload.mimetype)
+    else:
+        # body mentah: salin ke file sementara (zip XLSX butuh seek)
+        stream = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+        shutil.copyfileobj(request.stream, stream)
+        stream.seek(0)
+        fmt = request.args.get("format") or sheet_reader.detect_format("", request.mimetype)
+    fmt = fmt.lower()
+    if fmt not in ("csv", "xlsx"):
+        return jsonify({"error": True, "message": "format harus csv atau xlsx"}), 400
+
+    errors, error_count = [], 0
+    def report(line, code, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"row": line, "id_code": code or None, "message": message})
+
+    total, created, first, last = 0, 0, None, None
+    seen, next_n, chunk = set(), {}, []
+    try:
+        with connection() as conn:
+            def flush():
+                nonlocal created, first, last
+                codes = _import_chunk(conn, chunk, dry_run, seen, next_n, report)
+                chunk.clear()
+                if codes:
+                    first = first or codes[0]
+                    last = codes[-1]
+                    created += len(codes)
+
+            for line, rec in sheet_reader.iter_records(stream, fmt):
+                total += 1
+                if total > IMPORT_MAX_ROWS:
+                    total -= 1
+                    report(line, None, f"Melebihi batas {IMPORT_MAX_ROWS} baris, sisa file diabaikan")
+                    break
+                item, err = _import_row(rec)
+                if err:
+                    report(line, rec.get("id_code"), err)
+                    continue
+                chunk.append((line, item))
+                if len(chunk) >= IMPORT_CHUNK:
+                    flush()
+            if chunk:
+                flush()
+    except (sheet_reader.SheetError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": True, "message": f"File tidak bisa dibaca: {e}",
+                        "rows": total, "created": 0 if dry_run else created}), 400
+
+    errors.sort(key=lambda e: e["row"])  # duplikat baru terdeteksi saat chunk di-flush
+    return jsonify({
+        "ok": True,
+        "dry_run": dry_run,
+        "rows": total,
+        "created": created,
+        "first": first,
+        "last": last,
+        "error_count": error_count,
+        "errors": errors,
+    }), (200 if dry_run else 201)
 
 # contoh list items (ringkas)
 @bp.get("")
 @auth_required
+@versioned('item_unit')
 def list_items():
     """
     List items dengan paging & pencarian lintas kolom.
@@ -69,12 +325,15 @@ def list_items():
       - q: string (opsional), dipisah spasi jadi multi-term (AND)
       - page: int mulai 1 (default 1)
       - per_page: int (maks 100; default 100)
+      - cursor: token dari next_cursor (keyset paging; kosong = halaman pertama).
+        Jika dipakai, page diabaikan dan total hanya dihitung bila with_total=1.
     Response:
     {
       "data": [ ... <= per_page ... ],
-      "total": <int>,
-      "page": <int>,
-      "per_page": <int>
+      "total": <int>,            (mode cursor: hanya jika with_total=1)
+      "page": <int>,             (mode page saja)
+      "per_page": <int>,
+      "next_cursor": <str|null>
     }
     """
     q_raw = (request.args.get("q") or "").strip()
@@ -83,60 +342,123 @@ def list_items():
     if page < 1: page = 1
     if per_page < 1: per_page = 1
     if per_page > 100: per_page = 100
+    cursor_mode = "cursor" in request.args
+    after = decode_cursor(request.args.get("cursor"))
+    if request.args.get("cursor") and after is None:
+        return jsonify({"error": True, "message": "cursor tidak valid"}), 400
+    with_total = (not cursor_mode) or (request.args.get("with_total") or "").strip().lower() in ("1", "true", "yes", "y")
 
     tokens = [t.strip().upper() for t in q_raw.split() if t.strip()]
 
-    conn = get_conn()
-    try:
-        where_sql = "WHERE 1=1"
-        args = []
-
+    with connection() as conn:
         # Untuk tiap token, buat grup OR across kolom; seluruh token digabung AND
-        for tok in tokens:
-            like = f"%{tok}%"
-            where_sql += " AND (" + " OR ".join([
-                "UPPER(id_code)  LIKE ?",
-                "UPPER(name)     LIKE ?",
-                "UPPER(category) LIKE ?",
-                "UPPER(model)    LIKE ?",
-                "UPPER(rack)     LIKE ?",
-                "UPPER(status)   LIKE ?",
-            ]) + ")"
-            args += [like, like, like, like, like, like]
-
-        # hitung total
-        total = conn.execute(f"SELECT COUNT(*) FROM item_unit {where_sql}", args).fetchone()[0]
-
-        # ambil page
-        offset = (page - 1) * per_page
+        search_sql, args = _search_filter(
+            conn, tokens, ("id_code", "name", "category", "model", "rack", "status"), "item_unit"
+        )
+        where_sql = "WHERE 1=1" + search_sql
+
+        # hitung total (opsional di mode cursor)
+        total = None
+        if with_total:
+            total = conn.execute(f"SELECT COUNT(*) FROM item_unit {where_sql}", args).fetchone()[0]
+
+        # ambil page: keyset (created_at, id_code) atau offset
+        page_sql, page_args = where_sql, list(args)
+        if after:
+            page_sql += " AND (created_at, id_code) < (?, ?)"
+            page_args += after
+        offset = 0 if cursor_mode else (page - 1) * per_page
         rows = conn.execute(f"""
             SELECT id_code, name, category, model, rack, status, defect_level, created_at, is_universal
             FROM item_unit
-            {where_sql}
-            ORDER BY created_at DESC
+            {page_sql}
+            ORDER BY created_at DESC, id_code DESC
             LIMIT ? OFFSET ?
-        """, args + [per_page, offset]).fetchall()
+        """, page_args + [per_page + 1, offset]).fetchall()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id_code"]) if has_more else None
 
-        return jsonify({
-            "data": [dict(r) for r in rows],
-            "total": int(total),
-            "page": page,
-            "per_page": per_page
-        })
-    finally:
-        conn.close()
+        out = {"data": [dict(r) for r in rows], "per_page": per_page, "next_cursor": next_cursor}
+        if total is not None:
+            out["total"] = int(total)
+        if not cursor_mode:
+            out["page"] = page
+        return jsonify(out)
+
+EXPORT_COLUMNS = ("id_code", "name", "category", "model", "rack", "status", "defect_level", "serial", "created_at", "is_universal")
+EXPORT_CHUNK = 1000
+
+@bp.get("/export")
+@auth_required
+def export_items():
+    """
+    Stream seluruh item (filter q sama seperti list_items) dalam satu response.
+    Query param:
+      - q: string (opsional)
+      - format: ndjson (default) | csv
+    Baris dibaca per EXPORT_CHUNK dengan keyset (created_at, id_code), jadi memori tetap
+    datar berapapun jumlah item dan koneksi pool hanya dipegang selama satu chunk.
+    """
+    fmt = (request.args.get("format") or "ndjson").strip().lower()
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": True, "message": "format harus ndjson/csv"}), 400
+    q_raw = (request.args.get("q") or "").strip()
+    tokens = [t.strip().upper() for t in q_raw.split() if t.strip()]
+
+    def generate():
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(EXPORT_COLUMNS)
+        after = None
+        while True:
+            # koneksi pool dipinjam per chunk saja: klien yang lambat/macet tidak menahan
+            # koneksi maupun transaksi baca (yang menghalangi checkpoint WAL)
+            with connection() as conn:
+                search_sql, args = _search_filter(
+                    conn, tokens, ("id_code", "name", "category", "model", "rack", "status"), "item_unit"
+                )
+                page_sql = ""
+                if after:
+                    page_sql = " AND (created_at, id_code) < (?, ?)"
+                    args = list(args) + list(after)
+                rows = conn.execute(f"""
+                    SELECT {", ".join(EXPORT_COLUMNS)}
+                    FROM item_unit
+                    WHERE 1=1 {search_sql}{page_sql}
+                    ORDER BY created_at DESC, id_code DESC
+                    LIMIT ?
+                """, list(args) + [EXPORT_CHUNK]).fetchall()
+            if not rows:
+                break
+            after = (rows[-1]["created_at"], rows[-1]["id_code"])
+            if fmt == "csv":
+                writer.writerows(tuple(r) for r in rows)
+                chunk = buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            else:
+                chunk = "".join(json.dumps(dict(r), ensure_ascii=False) + "\n" for r in rows)
+            yield chunk
+            if len(rows) < EXPORT_CHUNK:
+                break
+        if fmt == "csv" and buf.tell():
+            yield buf.getvalue()
+
+    if fmt == "csv":
+        headers = {"Content-Disposition": "attachment; filename=items.csv"}
+        return Response(stream_with_context(generate()), mimetype="text/csv", headers=headers)
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
 @bp.get("/<id_code>")
 @auth_required
 def get_item(id_code):
-    conn = get_conn()
-    try:
+    with connection() as conn:
         row = conn.execute("SELECT * FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
         if not row:
             return jsonify({"error": True, "message": "Item tidak ditemukan"}), 404
         return jsonify(dict(row))
-    finally:
-        conn.close()
 
 @bp.put("/<id_code>")   # ✅ benar → /items/<id_code>
 @auth_required
@@ -144,8 +466,7 @@ def update_item(id_code):
     id_code = (id_code or "").strip()
     b = request.get_json(silent=True) or {}
 
-    conn = get_conn()
-    try:
+    with connection() as conn:
         row = conn.execute("SELECT status FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
         if not row:
             return jsonify({"error": True, "message": "Item tidak ditemukan"}), 404
@@ -166,38 +487,37 @@ def update_item(id_code):
         """, (name, category, model, rack, serial, id_code))
         conn.commit()
         return jsonify({"ok": True})
-    finally:
-        conn.close()
 
 @bp.get("/summary_by_category")
 @auth_required
+@versioned('item_unit')
 def summary_by_category():
     """
     Ringkasan jumlah per kategori (semua status).
     Sekaligus kirim breakdown status untuk kebutuhan ke depan.
     """
-    conn = get_conn()
-    try:
+    with connection() as conn:
+        # item_summary dijaga trigger di item_unit -> O(jumlah grup), bukan O(jumlah item)
         rows = conn.execute("""
             SELECT
               category,
-              COUNT(*) AS total,
-              SUM(CASE WHEN status='Good'   THEN 1 ELSE 0 END) AS good,
-              SUM(CASE WHEN status='Keluar' THEN 1 ELSE 0 END) AS keluar,
-              SUM(CASE WHEN status='Rusak'  THEN 1 ELSE 0 END) AS rusak,
-              SUM(CASE WHEN status='Hilang' THEN 1 ELSE 0 END) AS hilang,
-              SUM(CASE WHEN status='Afkir'  THEN 1 ELSE 0 END) AS afkir
-            FROM item_unit
+              SUM(qty) AS total,
+              SUM(CASE WHEN status='Good'   THEN qty ELSE 0 END) AS good,
+              SUM(CASE WHEN status='Keluar' THEN qty ELSE 0 END) AS keluar,
+              SUM(CASE WHEN status='Rusak'  THEN qty ELSE 0 END) AS rusak,
+              SUM(CASE WHEN status='Hilang' THEN qty ELSE 0 END) AS hilang,
+              SUM(CASE WHEN status='Afkir'  THEN qty ELSE 0 END) AS afkir
+            FROM item_summary
             GROUP BY category
+            HAVING SUM(qty) > 0
             ORDER BY category ASC
         """).fetchall()
         data = [dict(r) for r in rows]
         return jsonify({"data": data})
-    finally:
-        conn.close()
 
 @bp.get("/maintenance_list")
 @auth_required
+@versioned('item_unit', 'container_item')
 def maintenance_list():
     """
     Daftar item yang berstatus Rusak (ringan/berat), opsional filter q.
@@ -211,66 +531,52 @@ def maintenance_list():
     if per_page > 200: per_page = 200
     tokens = [t.strip().upper() for t in q_raw.split() if t.strip()]
 
-    conn = get_conn()
-    try:
-        where_sql = "WHERE iu.status='Rusak'"
-        args = []
-        for tok in tokens:
-            like = f"%{tok}%"
-            where_sql += " AND (" + " OR ".join([
-                "UPPER(iu.id_code)  LIKE ?",
-                "UPPER(iu.name)     LIKE ?",
-                "UPPER(iu.category) LIKE ?",
-                "UPPER(iu.model)    LIKE ?",
-                "UPPER(iu.rack)     LIKE ?",
-                "UPPER(iu.defect_level) LIKE ?",
-            ]) + ")"
-            args += [like, like, like, like, like, like]
-
-        base = f"""
+    with connection() as conn:
+        search_sql, args = _search_filter(
+            conn, tokens, ("id_code", "name", "category", "model", "rack", "defect_level"), "iu"
+        )
+        where_sql = "WHERE iu.status='Rusak'" + search_sql
+
+        # last_damage_note/last_returned_at dijaga trigger container_item (migrasi 6);
+        # total & counts ikut dihitung lewat window function dalam query yang sama
+        offset = (page - 1) * per_page
+        rows = conn.execute(f"""
             SELECT
               iu.id_code, iu.name, iu.category, iu.model, iu.rack,
               iu.status, iu.defect_level,
-              (
-                SELECT ci.damage_note FROM container_item ci
-                WHERE ci.id_code = iu.id_code AND ci.damage_note IS NOT NULL
-                ORDER BY ci.returned_at DESC, ci.id DESC
-                LIMIT 1
-              ) AS last_damage_note,
-              (
-                SELECT ci.returned_at FROM container_item ci
-                WHERE ci.id_code = iu.id_code AND ci.returned_at IS NOT NULL
-                ORDER BY ci.returned_at DESC, ci.id DESC
-                LIMIT 1
-              ) AS last_returned_at
+              iu.last_damage_note, iu.last_returned_at,
+              COUNT(*) OVER () AS _total,
+              SUM(CASE WHEN LOWER(TRIM(iu.defect_level))='ringan' THEN 1 ELSE 0 END) OVER () AS _ringan,
+              SUM(CASE WHEN LOWER(TRIM(iu.defect_level))='berat'  THEN 1 ELSE 0 END) OVER () AS _berat
             FROM item_unit iu
             {where_sql}
-        """
-        total = conn.execute(f"SELECT COUNT(*) c FROM ({base}) t", args).fetchone()["c"]
-        offset = (page - 1) * per_page
-        rows = conn.execute(
-            f"{base} ORDER BY iu.category ASC, iu.name ASC, iu.model ASC LIMIT ? OFFSET ?",
-            args + [per_page, offset]
-        ).fetchall()
-        # counts per defect level (global for current filter)
-        cnt_rows = conn.execute(
-            f"SELECT iu.defect_level d, COUNT(*) c FROM item_unit iu {where_sql} GROUP BY iu.defect_level",
-            args,
-        ).fetchall()
-        counts = {"ringan": 0, "berat": 0}
-        for r in cnt_rows:
-            d = (r["d"] or "").strip().lower()
-            if d in counts:
-                counts[d] = int(r["c"] or 0)
+            ORDER BY iu.category ASC, iu.name ASC, iu.model ASC, iu.id_code ASC
+            LIMIT ? OFFSET ?
+        """, args + [per_page, offset]).fetchall()
+        if rows:
+            total, ringan, berat = rows[0]["_total"], rows[0]["_ringan"], rows[0]["_berat"]
+        else:
+            # halaman di luar jangkauan: window kosong, hitung terpisah
+            agg = conn.execute(f"""
+                SELECT COUNT(*) AS _total,
+                  SUM(CASE WHEN LOWER(TRIM(iu.defect_level))='ringan' THEN 1 ELSE 0 END) AS _ringan,
+                  SUM(CASE WHEN LOWER(TRIM(iu.defect_level))='berat'  THEN 1 ELSE 0 END) AS _berat
+                FROM item_unit iu {where_sql}
+            """, args).fetchone()
+            total, ringan, berat = agg["_total"], agg["_ringan"], agg["_berat"]
+        data = []
+        for r in rows:
+            d = dict(r)
+            for k in ("_total", "_ringan", "_berat"):
+                d.pop(k)
+            data.append(d)
         return jsonify({
-            "data": [dict(r) for r in rows],
-            "total": int(total),
+            "data": data,
+            "total": int(total or 0),
             "page": page,
             "per_page": per_page,
-            "counts": counts,
+            "counts": {"ringan": int(ringan or 0), "berat": int(berat or 0)},
         })
-    finally:
-        conn.close()
 
 @bp.post("/repair")
 @auth_required
@@ -288,24 +594,14 @@ def repair_item():
     if not note:
         return jsonify({"error": True, "message": "Catatan penanganan (note) wajib diisi"}), 400
 
-    conn = get_conn()
-    try:
-        row = conn.execute("SELECT status, defect_level FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
+    with connection() as conn:
+        row = conn.execute("SELECT status, defect_level, last_damage_note FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
         if not row:
             return jsonify({"error": True, "message": "Item tidak ditemukan"}), 404
         if row["status"] not in ("Rusak", "Afkir"):
             return jsonify({"error": True, "message": "Item tidak dalam status Rusak/Afkir"}), 400
 
-        last = conn.execute(
-            """
-            SELECT damage_note FROM container_item
-            WHERE id_code=? AND damage_note IS NOT NULL
-            ORDER BY returned_at DESC, id DESC
-            LIMIT 1
-            """,
-            (id_code,),
-        ).fetchone()
-        last_note = (last["damage_note"] if last else None) or None
+        last_note = row["last_damage_note"] or None
 
         # Tentukan hasil
         if target == "good":
@@ -337,8 +633,6 @@ def repair_item():
             conn.execute("UPDATE item_unit SET status='Afkir' WHERE id_code=?", (id_code,))
         conn.commit()
         return jsonify({"ok": True})
-    finally:
-        conn.close()
 
 @bp.get("/repair_history")
 @auth_required
@@ -356,22 +650,15 @@ def repair_history():
     q_raw = (request.args.get("q") or "").strip()
     tokens = [t.strip().upper() for t in q_raw.split() if t.strip()]
 
-    conn = get_conn()
-    try:
+    with connection() as conn:
         base = (
             "FROM item_repair_log r LEFT JOIN item_unit iu ON iu.id_code=r.id_code"
         )
-        where_sql = "WHERE 1=1"
-        args = []
-        for tok in tokens:
-            like = f"%{tok}%"
-            where_sql += " AND (" + " OR ".join([
-                "UPPER(r.id_code) LIKE ?",
-                "UPPER(iu.name) LIKE ?",
-                "UPPER(iu.category) LIKE ?",
-                "UPPER(iu.model) LIKE ?",
-            ]) + ")"
-            args += [like, like, like, like]
+        # r.id_code tetap dicek via LIKE: log bisa merujuk item yang sudah dihapus
+        search_sql, args = _search_filter(
+            conn, tokens, ("id_code", "name", "category", "model"), "iu", also_like=("r.id_code",)
+        )
+        where_sql = "WHERE 1=1" + search_sql
 
         rows = conn.execute(
             f"""
@@ -385,11 +672,10 @@ def repair_history():
             args + [limit],
         ).fetchall()
         return jsonify({"data": [dict(r) for r in rows]})
-    finally:
-        conn.close()
 
 @bp.get("/summary_by_category_model")
 @auth_required
+@versioned('item_unit')
 def summary_by_category_model():
     """
     Ringkasan stok per kategori dengan breakdown per (name, model).
@@ -405,13 +691,13 @@ def summary_by_category_model():
       "grand_total": 50
     }
     """
-    conn = get_conn()
-    try:
+    with connection() as conn:
         rows = conn.execute(
             """
-            SELECT category, name, model, COUNT(*) AS qty
-            FROM item_unit
+            SELECT category, name, model, SUM(qty) AS qty
+            FROM item_summary
             GROUP BY category, name, model
+            HAVING SUM(qty) > 0
             ORDER BY category ASC, name ASC, model ASC
             """
         ).fetchall()
@@ -428,21 +714,83 @@ def summary_by_category_model():
         categories = sorted(cats.values(), key=lambda x: x["category"])
         grand_total = sum(c["total"] for c in categories)
         return jsonify({"categories": categories, "grand_total": int(grand_total)})
-    finally:
-        conn.close()
+
+QR_SHEET_MAX_LABELS = 50000
+
+@bp.post("/qr_sheet")
+@auth_required
+def qr_sheet():
+    """
+    Lembar label QR siap cetak (PDF multi-halaman, A4, label 2x1cm), di-stream per halaman.
+    Body:
+      - ids: [id_code, ...]  (urutan dipertahankan; id tak dikenal dilewati)
+      - atau q: string / all: true untuk memakai filter seperti list_items
+      - copies: int label per item (default 1, maks 50)
+    """
+    b = request.get_json(silent=True) or {}
+    ids = b.get("ids")
+    q_raw = (b.get("q") or "").strip()
+    use_filter = bool(q_raw) or b.get("all") in (True, 1, "1", "true")
+    try:
+        copies = max(1, min(50, int(b.get("copies") or 1)))
+    except Exception:
+        return jsonify({"error": True, "message": "copies harus angka"}), 400
+    if ids is not None and not isinstance(ids, list):
+        return jsonify({"error": True, "message": "ids harus list"}), 400
+    if not ids and not use_filter:
+        return jsonify({"error": True, "message": "ids (list) atau q/all wajib"}), 400
+
+    with connection() as conn:
+        if ids:
+            # id non-string (mis. angka dari JSON) dipaksa ke str, sama seperti unique_ids
+            wanted = [c for c in (str(x or "").strip() for x in ids) if c]
+            known = set()
+            for chunk in chunked(unique_ids(wanted)):
+                known.update(r[0] for r in conn.execute(
+                    f"SELECT id_code FROM item_unit WHERE id_code IN ({marks(len(chunk))})", chunk
+                ))
+            codes = [c for c in wanted if c in known]
+        else:
+            tokens = [t.strip().upper() for t in q_raw.split() if t.strip()]
+            search_sql, args = _search_filter(
+                conn, tokens, ("id_code", "name", "category", "model", "rack", "status"), "item_unit"
+            )
+            codes = [r[0] for r in conn.execute(
+                f"SELECT id_code FROM item_unit WHERE 1=1 {search_sql} ORDER BY id_code ASC", args
+            )]
+
+    labels = [c for c in codes for _ in range(copies)]
+    if not labels:
+        return jsonify({"error": True, "message": "Tidak ada item untuk dicetak"}), 404
+    if len(labels) > QR_SHEET_MAX_LABELS:
+        return jsonify({"error": True, "message": f"Maksimal {QR_SHEET_MAX_LABELS} label per cetak"}), 400
+
+    headers = {
+        "Content-Disposition": "inline; filename=qr_labels.pdf",
+        "X-Label-Count": str(len(labels)),
+    }
+    return Response(qr_render.stream_pdf(labels), mimetype="application/pdf", headers=headers)
 
 @bp.get("/<id_code>/qr")
 @auth_required
 def qr_image(id_code):
-    img = qrcode.make(id_code)  # payload cukup id_code
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
-    return Response(buf.getvalue(), mimetype="image/png")
+    # payload cukup id_code (immutable) -> PNG di-cache & ETag kuat berbasis hash
+    etag = qr_render.QrCache.key(id_code)
+    if etag in request.if_none_match:
+        qr_render.qr_cache.note_not_modified()
+        resp = Response(status=304)
+    else:
+        data, _key = qr_render.qr_cache.get_png(id_code)
+        resp = Response(data, mimetype="image/png")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return resp
 
-from flask import request, jsonify
-from routes_auth import auth_required, require_roles
-from db import get_conn
+@bp.get("/qr_cache_stats")
+@auth_required
+@require_roles('admin')
+def qr_cache_stats():
+    return jsonify(qr_render.qr_cache.stats())
 
 @bp.delete("/<id_code>")   # ✅ benar → akan menjadi /items/<id_code>
 @auth_required
@@ -452,42 +800,108 @@ def delete_item(id_code):
     if not id_code:
         return jsonify({"error": True, "message": "id_code kosong"}), 400
 
-    conn = get_conn()
-    try:
-        row = conn.execute("SELECT status FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
+    role = str((getattr(request, 'user', {}) or {}).get('role') or '').lower()
+    with connection() as conn:
+        row = conn.execute("SELECT status, current_line_id FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
         if not row:
             return jsonify({"error": True, "message": "Item tidak ditemukan"}), 404
 
-        # TOLAK jika sedang Keluar (kecuali admin)
-        role = str((getattr(request, 'user', {}) or {}).get('role') or '').lower()
-        if (row["status"] or "").lower() == "keluar" and role != 'admin':
-            return jsonify({"error": True, "message": "Item sedang dibawa event (status Keluar) — tidak bisa dihapus."}), 400
-
-        # TOLAK jika status Hilang (Lost) kecuali admin
-        if (row["status"] or "").lower() == "hilang" and role != 'admin':
-            return jsonify({"error": True, "message": "Item status Hilang hanya bisa dihapus oleh admin"}), 403
-
-        # TOLAK jika masih tercatat aktif di kontainer (belum void dan belum returned)
-        active = conn.execute(
-            """
-            SELECT 1 FROM container_item
-            WHERE id_code=? AND voided_at IS NULL AND returned_at IS NULL
-            LIMIT 1
-            """,
-            (id_code,),
-        ).fetchone()
-        if active:
-            # Admin boleh menghapus jika status item adalah Hilang
-            if (row["status"] or "").lower() == "hilang" and role == 'admin':
-                pass
-            else:
-                return jsonify({"error": True, "message": "Item tercatat aktif di kontainer — tidak bisa dihapus."}), 400
+        blocked = _delete_blocked(row["status"], row["current_line_id"], role)
+        if blocked:
+            message, code = blocked
+            return jsonify({"error": True, "message": message}), code
 
         conn.execute("DELETE FROM item_unit WHERE id_code=?", (id_code,))
         conn.commit()
         return jsonify({"ok": True})
-    finally:
-        conn.close()
+
+def _delete_blocked(status, current_line_id, role):
+    """Aturan hapus item (dipakai delete_item & bulk_delete). None = boleh, else (pesan, http code)."""
+    status = (status or "").lower()
+    # TOLAK jika sedang Keluar (kecuali admin)
+    if status == "keluar" and role != 'admin':
+        return "Item sedang dibawa event (status Keluar) — tidak bisa dihapus.", 400
+
+    # TOLAK jika status Hilang (Lost) kecuali admin
+    if status == "hilang" and role != 'admin':
+        return "Item status Hilang hanya bisa dihapus oleh admin", 403
+
+    # TOLAK jika masih tercatat aktif di kontainer (belum void dan belum returned);
+    # admin boleh menghapus jika status item adalah Hilang
+    if current_line_id is not None and not (status == "hilang" and role == 'admin'):
+        return "Item tercatat aktif di kontainer — tidak bisa dihapus.", 400
+    return None
+
+@bp.post("/bulk_delete")
+@auth_required
+@require_roles('admin','pic')
+def bulk_delete():
+    """
+    Hapus banyak item sekaligus dengan aturan yang sama seperti DELETE /items/<id_code>.
+    Payload: { ids: [id_code, ...] }
+    Response: { ok, deleted: [...], skipped: [{id_code, reason}], counts: {deleted, skipped} }
+    """
+    b = request.get_json(silent=True) or {}
+    ids = b.get('ids') or []
+    if not ids or not isinstance(ids, list):
+        return jsonify({"error": True, "message": "ids (list) wajib"}), 400
+
+    role = str((getattr(request, 'user', {}) or {}).get('role') or '').lower()
+    ids = unique_ids(ids)
+    with connection() as conn:
+        found = {}
+        for chunk in chunked(ids):
+            for r in conn.execute(
+                f"SELECT id_code, status, current_line_id FROM item_unit WHERE id_code IN ({marks(len(chunk))})", chunk
+            ):
+                found[r["id_code"]] = r
+
+        deleted, skipped = [], []
+        for id_code in ids:
+            row = found.get(id_code)
+            if row is None:
+                skipped.append({"id_code": id_code, "reason": "Item tidak ditemukan"})
+                continue
+            blocked = _delete_blocked(row["status"], row["current_line_id"], role)
+            if blocked:
+                skipped.append({"id_code": id_code, "reason": blocked[0]})
+                continue
+            deleted.append(id_code)
+
+        for chunk in chunked(deleted):
+            conn.execute(f"DELETE FROM item_unit WHERE id_code IN ({marks(len(chunk))})", chunk)
+        conn.commit()
+        return jsonify({
+            "ok": True,
+            "deleted": deleted,
+            "skipped": skipped,
+            "counts": {"deleted": len(deleted), "skipped": len(skipped)},
+        })
+
+def _actor():
+    u = getattr(request, 'user', {}) or {}
+    return u.get('email') or u.get('name')
+
+def _log_status_events(conn, ids, prev_status, status, defect, note=None):
+    """Catat perubahan status manual ke item_event (timeline)."""
+    ts, actor = now_iso(), _actor()
+    conn.executemany(
+        """
+        INSERT INTO item_event (id_code, ts, kind, prev_status, status, defect_level, note, actor)
+        VALUES (?, ?, 'status', ?, ?, ?, ?, ?)
+        """,
+        [(i, ts, prev_status.get(i), status, defect, note, actor) for i in ids],
+    )
+
+def _statuses(conn, ids):
+    """{id_code: status} untuk id yang ada, dibaca per chunk IN (...)."""
+    out = {}
+    for chunk in chunked(ids):
+        for r in conn.execute(
+            f"SELECT id_code, status FROM item_unit WHERE id_code IN ({marks(len(chunk))})", chunk
+        ):
+            out[r["id_code"]] = r["status"]
+    return out
 
 @bp.post("/bulk_update_condition")
 @auth_required
@@ -523,46 +937,45 @@ def bulk_update_condition():
     else:  # hilang
         target_status, target_defect = "Hilang", "none"
 
-    conn = get_conn()
-    try:
-        updated, skipped = [], []
-
-        for raw_id in ids:
-            id_code = (raw_id or "").strip()
-            if not id_code:
-                continue
+    role = str((getattr(request, 'user', {}) or {}).get('role') or '').lower()
+    ids = unique_ids(ids)
 
-            row = conn.execute("""
-              SELECT id_code, status FROM item_unit WHERE id_code=?
-            """, (id_code,)).fetchone()
+    with connection() as conn:
+        status_of = _statuses(conn, ids)
+        updated, skipped = [], []
 
-            if not row:
+        for id_code in ids:
+            if id_code not in status_of:
                 skipped.append({"id_code": id_code, "reason": "Item tidak ditemukan"})
                 continue
+            status = status_of[id_code] or ""
 
             # tidak boleh ubah dari Inventory kalau sedang Keluar (ada di kontainer)
-            if row["status"] == "Keluar":
+            if status == "Keluar":
                 skipped.append({"id_code": id_code, "reason": "Sedang Keluar (ada di kontainer)"})
                 continue
 
             # PIC/Operator tidak boleh ubah status dari Hilang (admin boleh)
-            role = str((getattr(request, 'user', {}) or {}).get('role') or '').lower()
-            if role in ("pic", "operator") and (row["status"] or "") == "Hilang":
+            if role in ("pic", "operator") and status == "Hilang":
                 skipped.append({"id_code": id_code, "reason": "Status Hilang hanya bisa diubah oleh admin"})
                 continue
 
             # PIC/Operator boleh set Hilang hanya dari status Keluar (admin bebas)
-            role = str((getattr(request, 'user', {}) or {}).get('role') or '').lower()
-            if target_status == 'Hilang' and role in ("pic", "operator") and (row["status"] or '') != 'Keluar':
+            if target_status == 'Hilang' and role in ("pic", "operator") and status != 'Keluar':
                 skipped.append({"id_code": id_code, "reason": "Hilang hanya dari status Keluar (non-admin)"})
                 continue
 
-            # lakukan update
-            conn.execute("""
-              UPDATE item_unit SET status=?, defect_level=? WHERE id_code=?
-            """, (target_status, target_defect, id_code))
             updated.append(id_code)
 
+        # lakukan update (per chunk)
+        for chunk in chunked(updated):
+            conn.execute(
+                f"UPDATE item_unit SET status=?, defect_level=? WHERE id_code IN ({marks(len(chunk))})",
+                [target_status, target_defect] + chunk,
+            )
+        _log_status_events(conn, updated, status_of, target_status, target_defect,
+                           (b.get("note") or "").strip() or None)
+
         conn.commit()
         return jsonify({
             "ok": True,
@@ -571,8 +984,6 @@ def bulk_update_condition():
             "counts": {"updated": len(updated), "skipped": len(skipped)},
             "applied_condition": condition
         })
-    finally:
-        conn.close()
 
 
 @bp.post("/mark_lost")
@@ -593,23 +1004,25 @@ def mark_lost():
     if not ids or not isinstance(ids, list):
         return jsonify({"error": True, "message": "ids (list) wajib"}), 400
 
-    conn = get_conn()
-    try:
+    ids = unique_ids(ids)
+    with connection() as conn:
+        status_of = _statuses(conn, ids)
         updated, skipped = [], []
-        for raw_id in ids:
-            id_code = (raw_id or '').strip()
-            if not id_code:
-                continue
-            row = conn.execute("SELECT status FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
-            if not row:
+        for id_code in ids:
+            if id_code not in status_of:
                 skipped.append({"id_code": id_code, "reason": "Item tidak ditemukan"})
                 continue
-            cur = (row["status"] or '').strip()
+            cur = (status_of[id_code] or '').strip()
             if cur != 'Keluar':
                 skipped.append({"id_code": id_code, "reason": f"Status sekarang {cur or '-'} (hanya bisa dari Keluar)"})
                 continue
-            conn.execute("UPDATE item_unit SET status='Hilang', defect_level='none' WHERE id_code=?", (id_code,))
             updated.append(id_code)
+        for chunk in chunked(updated):
+            conn.execute(
+                f"UPDATE item_unit SET status='Hilang', defect_level='none' WHERE id_code IN ({marks(len(chunk))})",
+                chunk,
+            )
+        _log_status_events(conn, updated, status_of, 'Hilang', 'none')
         conn.commit()
         return jsonify({
             "ok": True,
@@ -617,10 +1030,59 @@ def mark_lost():
             "skipped": skipped,
             "counts": {"updated": len(updated), "skipped": len(skipped)}
         })
-    finally:
-        conn.close()
 
 
+TIMELINE_PAGE_MAX = 500
+
+@bp.get("/<id_code>/timeline")
+@auth_required
+def item_timeline(id_code):
+    """
+    Riwayat gabungan item (checkout, return, lost, void, repair, status) dari item_event.
+    Query: limit (default 100, max 500), cursor (dari next_cursor), order=desc|asc.
+    """
+    id_code = (id_code or '').strip()
+    if not id_code:
+        return jsonify({"error": True, "message": "id_code kosong"}), 400
+    try:
+        limit = int(request.args.get("limit") or 100)
+    except Exception:
+        limit = 100
+    limit = max(1, min(limit, TIMELINE_PAGE_MAX))
+    asc = (request.args.get("order") or "desc").lower() == "asc"
+    cursor_raw = (request.args.get("cursor") or "").strip()
+    cursor = decode_cursor(cursor_raw) if cursor_raw else None
+    if cursor_raw and cursor is None:
+        return jsonify({"error": True, "message": "cursor tidak valid"}), 400
+
+    where, args = "e.id_code=?", [id_code]
+    if cursor:
+        where += " AND (e.ts, e.id) > (?, ?)" if asc else " AND (e.ts, e.id) < (?, ?)"
+        args += list(cursor)
+    direction = "ASC" if asc else "DESC"
+
+    with connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT e.id, e.ts, e.kind, e.container_id, c.event_name, c.pic,
+                   e.condition, e.prev_status, e.status, e.defect_level, e.note, e.actor
+            FROM item_event e
+            LEFT JOIN containers c ON c.id = e.container_id
+            WHERE {where}
+            ORDER BY e.ts {direction}, e.id {direction}
+            LIMIT ?
+            """,
+            args + [limit + 1],
+        ).fetchall()
+        if not rows and not cursor:
+            exists = conn.execute("SELECT 1 FROM item_unit WHERE id_code=?", (id_code,)).fetchone()
+            if not exists:
+                return jsonify({"error": True, "message": "Item tidak ditemukan"}), 404
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["ts"], rows[-1]["id"]) if has_more else None
+        return jsonify({"data": [dict(r) for r in rows], "next_cursor": next_cursor})
+
 @bp.get("/<id_code>/lost_context")
 @auth_required
 def lost_context(id_code):
@@ -632,32 +1094,26 @@ def lost_context(id_code):
     id_code = (id_code or '').strip()
     if not id_code:
         return jsonify({"error": True, "message": "id_code kosong"}), 400
-    conn = get_conn()
-    try:
-        rows = conn.execute(
-            """
+    with connection() as conn:
+        # Prioritas: explicit lost -> active (returned_at IS NULL) -> latest.
+        # Dua yang pertama sudah dipilih pointer current_line_id (lihat migrasi 7).
+        cols = """
             SELECT ci.container_id, ci.added_at, ci.returned_at, ci.return_condition, ci.damage_note,
                    c.pic, c.event_name
             FROM container_item ci
             JOIN containers c ON c.id = ci.container_id
-            WHERE ci.id_code=? AND ci.voided_at IS NULL
-            ORDER BY ci.id DESC
-            """,
+        """
+        pick = conn.execute(
+            cols + " JOIN item_unit iu ON iu.current_line_id = ci.id WHERE iu.id_code=?",
             (id_code,),
-        ).fetchall()
-        if not rows:
-            return jsonify({"error": True, "message": "Tidak ada riwayat kontainer untuk item ini"}), 404
-        # Prioritas: explicit lost -> active (returned_at IS NULL) -> latest
-        pick = None
-        for r in rows:
-            if str((r["return_condition"] or '')).lower() == 'hilang':
-                pick = r; break
+        ).fetchone()
         if not pick:
-            for r in rows:
-                if not r["returned_at"]:
-                    pick = r; break
+            pick = conn.execute(
+                cols + " WHERE ci.id_code=? AND ci.voided_at IS NULL ORDER BY ci.id DESC LIMIT 1",
+                (id_code,),
+            ).fetchone()
         if not pick:
-            pick = rows[0]
+            return jsonify({"error": True, "message": "Tidak ada riwayat kontainer untuk item ini"}), 404
         data = {
             "container_id": pick["container_id"],
             "pic": pick["pic"],
@@ -668,5 +1124,3 @@ def lost_context(id_code):
             "damage_note": pick["damage_note"],
         }
         return jsonify(data)
-    finally:
-        conn.close()
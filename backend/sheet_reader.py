@@ -0,0 +1,142 @@
+# backend/sheet_reader.py
+"""Baca CSV/XLSX baris demi baris (streaming) untuk import data.
+
+XLSX dibaca langsung dari zip (sheet pertama) memakai iterparse, jadi tidak
+butuh openpyxl dan memori tidak ikut membesar dengan jumlah baris. Yang tetap
+dimuat utuh hanya sharedStrings (daftar teks unik di workbook).
+"""
+import csv, io, re, zipfile
+import xml.etree.ElementTree as ET
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+class SheetError(ValueError):
+    pass
+
+def normalize_header(h) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", str(h or "").strip().lower()).strip("_")
+
+def detect_format(filename: str, content_type: str = "") -> str:
+    name = (filename or "").lower()
+    if name.endswith(".xlsx") or "spreadsheetml" in (content_type or ""):
+        return "xlsx"
+    return "csv"
+
+# ---------- CSV ----------
+def _iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    first = text.readline()
+    if not first:
+        return
+    # Excel lokal Indonesia menyimpan CSV dengan ';'
+    delim = ";" if first.count(";") > first.count(",") else ","
+    yield 1, next(csv.reader([first], delimiter=delim))
+    reader = csv.reader(text, delimiter=delim)
+    for row in reader:
+        yield reader.line_num + 1, row
+
+# ---------- XLSX ----------
+def _col_index(ref: str) -> int:
+    n = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        n = n * 26 + (ord(ch.upper()) - 64)
+    return n - 1
+
+def _first_sheet_path(zf) -> str:
+    try:
+        wb = ET.fromstring(zf.read("xl/workbook.xml"))
+        sheet = wb.find(f"{_NS}sheets/{_NS}sheet")
+        rid = sheet.get(f"{_REL_NS}id")
+        rels = ET.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+        for rel in rels.iter(f"{_PKG_REL_NS}Relationship"):
+            if rel.get("Id") == rid:
+                target = rel.get("Target").lstrip("/")
+                return target if target.startswith("xl/") else "xl/" + target
+    except (KeyError, AttributeError, ET.ParseError):
+        pass
+    return "xl/worksheets/sheet1.xml"
+
+def _shared_strings(zf):
+    try:
+        f = zf.open("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    out = []
+    with f:
+        for _, el in ET.iterparse(f):
+            if el.tag == f"{_NS}si":
+                out.append("".join(t.text or "" for t in el.iter(f"{_NS}t")))
+                el.clear()
+    return out
+
+def _cell_value(c, shared):
+    t = c.get("t")
+    if t == "inlineStr":
+        return "".join(x.text or "" for x in c.iter(f"{_NS}t"))
+    v = c.find(f"{_NS}v")
+    if v is None or v.text is None:
+        return ""
+    if t == "s":
+        return shared[int(v.text)]
+    if t == "b":
+        return "1" if v.text == "1" else "0"
+    val = v.text
+    # angka bulat tersimpan "5" atau "5.0"
+    if t in (None, "n") and val.endswith(".0"):
+        val = val[:-2]
+    return val
+
+def _iter_xlsx(stream):
+    try:
+        zf = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise SheetError("File XLSX tidak valid")
+    with zf:
+        shared = _shared_strings(zf)
+        try:
+            f = zf.open(_first_sheet_path(zf))
+        except KeyError:
+            raise SheetError("Sheet tidak ditemukan di XLSX")
+        with f:
+            # <row> yang sudah dibaca dibuang dari <sheetData> agar memori tetap datar
+            data, n = None, 0
+            for ev, el in ET.iterparse(f, events=("start", "end")):
+                if ev == "start":
+                    if el.tag == f"{_NS}sheetData":
+                        data = el
+                    continue
+                if el.tag != f"{_NS}row":
+                    continue
+                n += 1
+                line_no = int(el.get("r") or n)
+                row = []
+                for c in el.iter(f"{_NS}c"):
+                    ref = c.get("r")
+                    idx = _col_index(ref) if ref else len(row)
+                    if idx > len(row):
+                        row.extend([""] * (idx - len(row)))
+                    row.append(_cell_value(c, shared))
+                if data is not None:
+                    data.clear()
+                yield line_no, row
+
+def iter_records(stream, fmt: str):
+    """Yield (nomor_baris, dict) per baris data; key = header yang dinormalisasi
+    (huruf kecil, non-alfanumerik jadi '_'). Baris kosong dilewati."""
+    rows = _iter_xlsx(stream) if fmt == "xlsx" else _iter_csv(stream)
+    header = None
+    for line_no, row in rows:
+        if header is None:
+            header = [normalize_header(h) for h in row]
+            if not any(header):
+                raise SheetError("Header kosong")
+            continue
+        if not any((v or "").strip() for v in row):
+            continue
+        yield line_no, {k: (row[i] if i < len(row) else "").strip() for i, k in enumerate(header) if k}
+    if header is None:
+        raise SheetError("File kosong")
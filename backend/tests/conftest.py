@@ -0,0 +1,26 @@
+# backend/tests/conftest.py
+"""Fixture app Flask terhadap DB sementara (bukan wms.sqlite3), pola sama dengan benchmarks.py."""
+import os, sys, tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+
+@pytest.fixture()
+def client():
+    tmp = tempfile.mkdtemp(prefix="wms-test-")
+    db.close_pool()
+    db.DB_PATH = os.path.join(tmp, "test.sqlite3")
+    from app import create_app
+    import routes_admin_cleanup
+    routes_admin_cleanup.DB_PATH = db.DB_PATH   # di-import by value saat modul pertama dimuat
+    app = create_app()
+    yield app.test_client()
+    db.close_pool()
+
+@pytest.fixture()
+def headers(client):
+    r = client.post("/auth/login", json={"email": "admin@wms.ci", "password": "adminci"})
+    return {"Authorization": "Token " + r.get_json()["token"]}
@@ -0,0 +1,33 @@
+# backend/tests/test_admin_cleanup.py
+"""Admin cleanup: snapshot memakai koneksi yang sudah dipegang; restore ke DB hidup + migrasi."""
+import db
+
+def test_cleanup_run_with_single_connection_pool(client, headers, monkeypatch):
+    db.close_pool()
+    monkeypatch.setattr(db, "_pool", db.ConnectionPool(size=1, timeout=0.2))
+    r = client.post("/admin/cleanup/run", json={"start": "2020-01-01", "end": "2030-01-01"}, headers=headers)
+    assert r.status_code == 200, r.get_json()
+    assert r.get_json()["snapshot"]["file"].startswith("snapshot_")
+
+def test_restore_uses_live_db_and_migrates_old_snapshot(client, headers):
+    import sqlite3, migrations, os, routes_admin_cleanup
+    client.post("/items/batch_create", json={"prefix": "RS", "name": "Par", "category": "Lighting",
+                                             "model": "A", "rack": "R-01", "qty": 2}, headers=headers)
+    snap = client.post("/admin/cleanup/snapshots/create", json={"note": "t"}, headers=headers).get_json()
+    path = os.path.join(routes_admin_cleanup._ensure_snapshots_dir(), snap["file"])
+    # snapshot dari sebelum migrasi 14
+    old = sqlite3.connect(path)
+    old.executescript("DROP TABLE scan_session; DROP TABLE scan_ticket; PRAGMA user_version=13;")
+    old.close()
+    client.post("/items/batch_create", json={"prefix": "RS", "name": "Par", "category": "Lighting",
+                                             "model": "B", "rack": "R-01", "qty": 3}, headers=headers)
+
+    with db.connection() as held:   # request lain masih memegang koneksi saat restore
+        r = client.post(f"/admin/cleanup/snapshots/{snap['id']}/restore", headers=headers)
+        assert r.status_code == 200, r.get_json()
+        assert held.execute("SELECT COUNT(*) FROM item_unit WHERE id_code LIKE 'RS-%'").fetchone()[0] == 2
+    with db.connection() as conn:
+        assert migrations.current_version(conn) == migrations.LATEST_VERSION
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    cid = client.post("/containers", json={"event_name": "F", "pic": "p"}, headers=headers).get_json()["id"]
+    assert client.post(f"/containers/{cid}/scan_session", headers=headers).status_code == 200
@@ -0,0 +1,73 @@
+# backend/tests/test_dn_history.py
+"""dn_list: ringkasan perubahan per versi sama dengan diff payload lengkap."""
+
+def _flatten(payload):
+    return {it["id_code"]: (it.get("condition") or "", it.get("return_condition") or "")
+            for lines in payload["batches"].values() for it in lines}
+
+def _expected(prev, curr):
+    a, b = _flatten(prev), _flatten(curr)
+    return {"added": len(b.keys() - a.keys()), "removed": len(a.keys() - b.keys()),
+            "changed": sum(1 for k in a.keys() & b.keys() if a[k] != b[k])}
+
+def test_dn_list_diff_matches_payloads(client, headers):
+    r = client.post("/items/batch_create", json={"prefix": "DN", "name": "Par", "category": "Lighting",
+                                                  "model": "A", "rack": "R-01", "qty": 30}, headers=headers)
+    first = int(r.get_json()["first"].rsplit("-", 1)[1])
+    ids = [f"DN-A-{n:03d}" for n in range(first, first + 30)]
+    cid = client.post("/containers", json={"event_name": "Festival", "pic": "p"}, headers=headers).get_json()["id"]
+    client.post(f"/containers/{cid}/add_items", json={"ids": ids[:20]}, headers=headers)
+    client.post(f"/containers/{cid}/submit_dn", headers=headers)
+    # V2: tambah 5, void 2, check-in 3 (satu rusak)
+    client.post(f"/containers/{cid}/add_items", json={"ids": ids[20:25], "amend": True, "amend_reason": "tambah"}, headers=headers)
+    for code in ids[:2]:
+        client.post(f"/containers/{cid}/void_item", json={"id_code": code, "reason": "batal"}, headers=headers)
+    client.post(f"/containers/{cid}/checkin", json={"id_code": ids[5], "condition": "good"}, headers=headers)
+    client.post(f"/containers/{cid}/checkin", json={"id_code": ids[6], "condition": "good"}, headers=headers)
+    client.post(f"/containers/{cid}/checkin", json={"id_code": ids[7], "condition": "rusak_ringan", "damage_note": "retak"}, headers=headers)
+    client.post(f"/containers/{cid}/submit_dn", headers=headers)
+    # V3: tanpa perubahan
+    client.post(f"/containers/{cid}/submit_dn", headers=headers)
+
+    versions = client.get(f"/containers/{cid}/dn_list", headers=headers).get_json()["versions"]
+    payloads = [client.get(f"/containers/{cid}/dn/{v['version']}", headers=headers).get_json() for v in versions]
+    assert versions[0]["diff"] == {"added": 0, "removed": 0, "changed": 0}
+    for i in range(1, len(versions)):
+        assert versions[i]["diff"] == _expected(payloads[i - 1], payloads[i])
+    assert versions[1]["diff"] == {"added": 5, "removed": 2, "changed": 3}
+    assert versions[2]["diff"] == {"added": 0, "removed": 0, "changed": 0}
+
+def test_m012_converts_legacy_snapshots_like_dn_store(tmp_path):
+    """Migrasi 12 (salinan beku format ringkas) menghasilkan kolom sama dengan dn_store."""
+    import json, sqlite3
+    import dn_store, migrations
+
+    line = lambda code, cond="good": {"id_code": code, "name": "Par", "condition": cond, "returned_at": None}
+    payloads = [
+        {"container": {"id": "C1"}, "totals": {"all": 2},
+         "batches": {"MAIN": [line("A-001"), line("A-002", "rusak_ringan")]}},
+        {"container": {"id": "C1"}, "totals": {"all": 3},
+         "batches": {"MAIN": [line("A-001"), line("A-002", "rusak_ringan")], "AMEND-1": [line("A-003")]}},
+    ]
+    out = []
+    for convert in ("migration", "dn_store"):
+        conn = sqlite3.connect(tmp_path / f"{convert}.sqlite3")
+        conn.row_factory = sqlite3.Row
+        cur = conn.cursor()
+        for version, _, fn in migrations.MIGRATIONS[:11]:
+            fn(cur)
+        for v, p in enumerate(payloads, 1):
+            cur.execute("INSERT INTO dn_snapshots (container_id, version, payload, created_at) VALUES ('C1', ?, ?, 't')",
+                        (v, json.dumps(p)))
+        if convert == "migration":
+            migrations._m012_dn_compact(cur)
+        else:
+            cur.execute("CREATE TABLE dn_line (id INTEGER PRIMARY KEY, hash BLOB NOT NULL UNIQUE, body BLOB NOT NULL, refs INTEGER NOT NULL DEFAULT 0)")
+            for name in ("format INTEGER NOT NULL DEFAULT 0", "header BLOB", "lines BLOB", "line_count INTEGER", "totals TEXT"):
+                cur.execute(f"ALTER TABLE dn_snapshots ADD COLUMN {name}")
+            dn_store.compact_legacy(cur)
+        rows = conn.execute("SELECT * FROM dn_snapshots ORDER BY version").fetchall()
+        assert [dn_store.load(conn, r) for r in rows] == payloads
+        out.append(([tuple(r) for r in rows], [tuple(r) for r in conn.execute("SELECT * FROM dn_line ORDER BY id")]))
+        conn.close()
+    assert out[0] == out[1]
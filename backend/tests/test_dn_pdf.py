@@ -0,0 +1,28 @@
+# backend/tests/test_dn_pdf.py
+"""DnPdfCache: render sekali per key, tanpa sisa lock per key setelah selesai."""
+import threading, time
+
+import dn_pdf
+
+def test_cache_renders_once_and_releases_locks(tmp_path, monkeypatch):
+    calls = []
+    def fake_render(cid, version, created_at, payload):
+        calls.append(cid)
+        time.sleep(0.05)
+        return b"%PDF-" + str(version).encode()
+    monkeypatch.setattr(dn_pdf, "render_pdf", fake_render)
+    cache = dn_pdf.DnPdfCache(str(tmp_path))
+    key = cache.key("C1", 1, 7, "2026-01-01T00:00:00")
+
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(cache.get("C1", 1, key, dict, "t")))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert out == [b"%PDF-1"] * 8 and len(calls) == 1
+    for _ in range(100):
+        assert cache.get("C1", 1, key, dict, "t") == b"%PDF-1"
+    assert cache._locks == {}
+    assert cache.stats() == {"hits": 107, "renders": 1}
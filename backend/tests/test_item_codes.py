@@ -0,0 +1,48 @@
+# backend/tests/test_item_codes.py
+"""Counter item_code_seq tetap sinkron dengan kode yang masuk lewat import."""
+
+ITEM = {"prefix": "CAM", "name": "Kamera", "category": "Camera", "model": "70D", "rack": "R-01"}
+
+def _import_csv(client, headers, text):
+    return client.post("/items/import?format=csv", data=text.encode("utf-8"),
+                       headers={**headers, "Content-Type": "text/csv"})
+
+def test_batch_create_after_import_with_explicit_codes(client, headers):
+    r = client.post("/items/batch_create", json={**ITEM, "qty": 2}, headers=headers)
+    assert r.status_code == 201 and r.get_json()["last"] == "CAM-70D-002"
+
+    csv = "id_code,name,category,model,rack\nCAM-70D-101,Kamera,Camera,70D,R-01\nCAM-70D-102,Kamera,Camera,70D,R-01\n"
+    r = _import_csv(client, headers, csv)
+    assert r.status_code == 201 and r.get_json()["created"] == 2
+
+    r = client.post("/items/batch_create", json={**ITEM, "qty": 3}, headers=headers)
+    assert r.status_code == 201
+    assert r.get_json()["first"] == "CAM-70D-103"
+
+def test_import_explicit_codes_for_new_base(client, headers):
+    csv = "id_code,name,category,model,rack\nLGT-PAR-007,Par,Lighting,PAR,R-02\n"
+    assert _import_csv(client, headers, csv).get_json()["created"] == 1
+    r = client.post("/items/batch_create", json={**ITEM, "prefix": "LGT", "model": "PAR", "qty": 1}, headers=headers)
+    assert r.status_code == 201 and r.get_json()["first"] == "LGT-PAR-008"
+
+def test_import_auto_codes_skip_explicit_codes_in_same_file(client, headers):
+    csv = ("id_code,prefix,name,category,model,rack\n"
+           ",CAM,Kamera,Camera,70D,R-01\n"
+           "CAM-70D-001,,Kamera,Camera,70D,R-01\n")
+    body = _import_csv(client, headers, csv).get_json()
+    assert body["created"] == 2 and body["error_count"] == 0
+
+def test_batch_create_reseeds_stale_counter(client, headers):
+    import db
+    client.post("/items/batch_create", json={**ITEM, "qty": 1}, headers=headers)
+    # kode ditulis di luar batch_create/import (mis. DB restore) tanpa menaikkan counter
+    with db.connection() as conn:
+        conn.executemany(
+            "INSERT INTO item_unit (id_code, name, category, model, rack, status, defect_level, created_at) "
+            "VALUES (?, 'Kamera', 'Camera', '70D', 'R-01', 'Good', 'none', '2025-01-01T00:00:00')",
+            [("CAM-70D-002",), ("CAM-70D-040",)],
+        )
+        conn.commit()
+    r = client.post("/items/batch_create", json={**ITEM, "qty": 2}, headers=headers)
+    assert r.status_code == 201
+    assert (r.get_json()["first"], r.get_json()["last"]) == ("CAM-70D-041", "CAM-70D-042")
@@ -0,0 +1,37 @@
+# backend/tests/test_item_search.py
+"""Pencarian item: FTS & fallback LIKE sama untuk % / _, index FTS diperbaiki saat init_db."""
+import db
+import routes_items
+
+def _codes(client, headers, q):
+    r = client.get("/items", query_string={"q": q, "per_page": 100}, headers=headers)
+    return sorted(it["id_code"] for it in r.get_json()["data"])
+
+def _seed(client, headers):
+    for model, name in (("A", "Par 50%"), ("B", "Kabel_XLR"), ("C", "Par LED")):
+        client.post("/items/batch_create", json={"prefix": "SR", "name": name, "category": "Lighting",
+                                                 "model": model, "rack": "R-01", "qty": 2}, headers=headers)
+
+def test_like_fallback_treats_wildcards_literally(client, headers, monkeypatch):
+    _seed(client, headers)
+    queries = ("%a%", "50%", "L_X", "_X", "%", "par")
+    fts = {q: _codes(client, headers, q) for q in queries}
+    monkeypatch.setattr(routes_items, "fts_enabled", lambda conn: False)
+    like = {q: _codes(client, headers, q) for q in queries}
+    assert fts == like
+    assert like["%a%"] == [] and like["50%"] == ["SR-A-001", "SR-A-002"]
+    assert like["_X"] == ["SR-B-001", "SR-B-002"] and len(like["%"]) == 2
+
+def test_init_db_rebuilds_out_of_sync_fts(client, headers):
+    _seed(client, headers)
+    with db.connection() as conn:
+        if not db.fts_enabled(conn):
+            return
+        # rowid bergeser (seperti VACUUM pada tabel ber-PK TEXT) tanpa trigger FTS
+        conn.execute("UPDATE item_unit SET rowid = rowid + 1000")
+        conn.commit()
+    assert _codes(client, headers, "LED") == []
+    db.init_db()
+    assert _codes(client, headers, "LED") == ["SR-C-001", "SR-C-002"]
+    with db.connection() as conn:
+        assert db.ensure_item_search(conn) is False
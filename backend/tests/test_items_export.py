@@ -0,0 +1,28 @@
+# backend/tests/test_items_export.py
+"""export_items: paging keyset per chunk, koneksi pool tidak dipegang selama download."""
+import csv, io, json
+
+import db
+import routes_items
+
+def test_export_releases_connection_between_chunks(client, headers, monkeypatch):
+    client.post("/items/batch_create", json={"prefix": "EX", "name": "Par", "category": "Lighting",
+                                             "model": "A", "rack": "R-01", "qty": 25}, headers=headers)
+    monkeypatch.setattr(routes_items, "EXPORT_CHUNK", 10)
+    db.close_pool()
+    monkeypatch.setattr(db, "_pool", db.ConnectionPool(size=1, timeout=0.2))
+
+    resp = client.get("/items/export", headers=headers, buffered=False)
+    chunks = iter(resp.response)
+    first = next(chunks)
+    # klien "macet" di tengah download: request lain tetap dapat koneksi
+    assert client.get("/items/EX-A-001", headers=headers).status_code == 200
+    body = (first + b"".join(chunks)).decode()
+    resp.close()
+    rows = [json.loads(l) for l in body.splitlines()]
+    codes = [r["id_code"] for r in rows]
+    assert len(codes) == 25 and len(set(codes)) == 25
+    assert codes == [r["id_code"] for r in sorted(rows, key=lambda r: (r["created_at"], r["id_code"]), reverse=True)]
+
+    text = client.get("/items/export?format=csv&q=EX-A-00", headers=headers).get_data(as_text=True)
+    assert len(list(csv.reader(io.StringIO(text)))) == 1 + 9
@@ -0,0 +1,17 @@
+# backend/tests/test_qr_sheet.py
+"""qr_sheet: id non-string tidak membuat 500; render lewat process pool forkserver; stats khusus admin."""
+import qr_render
+
+def test_qr_sheet_accepts_non_string_ids(client, headers):
+    r = client.post("/items/batch_create", json={"prefix": "QR", "name": "Par", "category": "Lighting",
+                                                  "model": "A", "rack": "R-01", "qty": 2}, headers=headers)
+    first = r.get_json()["first"]
+    r = client.post("/items/qr_sheet", json={"ids": [123, None, first]}, headers=headers)
+    assert r.status_code == 200 and r.data.startswith(b"%PDF-")
+    assert qr_render._executor._mp_context.get_start_method() == qr_render.QR_MP_START != "fork"
+
+def test_qr_cache_stats_admin_only(client, headers):
+    assert client.get("/items/qr_cache_stats", headers=headers).status_code == 200
+    r = client.post("/auth/login", json={"email": "op@wms.ci", "password": "opci!"})
+    op = {"Authorization": "Token " + r.get_json()["token"]}
+    assert client.get("/items/qr_cache_stats", headers=op).status_code == 403
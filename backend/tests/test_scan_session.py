@@ -0,0 +1,90 @@
+# backend/tests/test_scan_session.py
+"""Scan session: working set dicocokkan dengan DB (table_version), tiket SSE sekali pakai."""
+import json
+
+def _setup(client, headers, qty=3):
+    r = client.post("/items/batch_create", json={"prefix": "SC", "name": "Par", "category": "Lighting",
+                                                  "model": "A", "rack": "R-01", "qty": qty}, headers=headers)
+    first = int(r.get_json()["first"].rsplit("-", 1)[1])
+    ids = [f"SC-A-{n:03d}" for n in range(first, first + qty)]
+    cid = client.post("/containers", json={"event_name": "Festival", "pic": "p"}, headers=headers).get_json()["id"]
+    sid = client.post(f"/containers/{cid}/scan_session", headers=headers).get_json()["sid"]
+    return ids, cid, sid
+
+def _events(resp):
+    for chunk in resp.response:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith("event: "):
+            head, data = text.strip().split("\n", 1)
+            yield head[len("event: "):], json.loads(data[len("data: "):])
+
+def test_scan_sees_writes_from_other_endpoints(client, headers):
+    ids, cid, sid = _setup(client, headers)
+    scan = f"/containers/{cid}/scan_session/{sid}/scan"
+    r = client.post(scan, json={"id_code": ids[0], "action": "checkout"}, headers=headers)
+    assert r.status_code == 200 and r.get_json()["totals"]["all"] == 1
+
+    # ditulis lewat endpoint biasa, bukan lewat sesi: cache sesi harus ikut
+    client.post(f"/containers/{cid}/add_items", json={"ids": [ids[1]]}, headers=headers)
+    r = client.post(scan, json={"id_code": ids[1], "action": "checkin", "condition": "good"}, headers=headers)
+    assert r.status_code == 200, r.get_json()
+    assert r.get_json()["totals"]["all"] == 2 and r.get_json()["totals"]["returned"] == 1
+
+    client.post(f"/containers/{cid}/void_item", json={"id_code": ids[0], "reason": "batal"}, headers=headers)
+    r = client.post(scan, json={"id_code": ids[0], "action": "checkin"}, headers=headers)
+    assert r.status_code == 404
+    r = client.post(scan, json={"id_code": ids[0], "action": "checkout"}, headers=headers)
+    assert r.status_code == 200
+
+def test_sse_ticket_single_use_and_live_updates(client, headers):
+    ids, cid, sid = _setup(client, headers)
+    client.post(f"/containers/{cid}/scan_session/{sid}/scan", json={"id_code": ids[0]}, headers=headers)
+    events = f"/containers/{cid}/scan_session/{sid}/events"
+    token = headers["Authorization"].split(" ", 1)[1]
+    assert client.get(events + "?token=" + token).status_code == 401
+
+    ticket = client.post(f"/containers/{cid}/scan_session/{sid}/ticket", headers=headers).get_json()["ticket"]
+    resp = client.get(events + "?ticket=" + ticket, buffered=False)
+    assert resp.status_code == 200
+    assert client.get(events + "?ticket=" + ticket).status_code == 401
+    try:
+        stream = _events(resp)
+        name, snap = next(stream)
+        assert name == "snapshot" and [l["id_code"] for l in snap["batches"]["MAIN"]] == [ids[0]]
+
+        # ditulis di luar sesi (tanpa hook apa pun ke sesi scan), tetap sampai ke SSE
+        client.post(f"/containers/{cid}/add_items", json={"ids": [ids[1]]}, headers=headers)
+        name, data = next(stream)
+        assert name == "line" and data["id_code"] == ids[1] and data["line"]["id_code"] == ids[1]
+        name, data = next(stream)
+        assert name == "totals" and data["all"] == 2
+
+        client.delete(f"/containers/{cid}/scan_session/{sid}", headers=headers)
+        assert next(stream, None) is None
+    finally:
+        resp.close()
+
+def test_sse_one_poller_per_container_and_subscriber_cap(client, headers, monkeypatch):
+    import routes_containers as rc
+    monkeypatch.setattr(rc, "SCAN_MAX_SUBSCRIBERS", 2)
+    ids, cid, sid = _setup(client, headers)
+    events = f"/containers/{cid}/scan_session/{sid}/events?ticket="
+    ticket = lambda: client.post(f"/containers/{cid}/scan_session/{sid}/ticket", headers=headers).get_json()["ticket"]
+    streams = [client.get(events + ticket(), buffered=False) for _ in range(2)]
+    try:
+        assert [s.status_code for s in streams] == [200, 200]
+        assert client.get(events + ticket()).status_code == 429
+        ws = rc._scan_sets[cid]
+        assert len(ws.subscribers) == 2 and ws.poller is not None
+        assert sum(t.name == f"scan-poll-{cid}" for t in __import__("threading").enumerate()) == 1
+
+        # scan tetap jalan & kedua stream menerima event dari satu poller/publish
+        client.post(f"/containers/{cid}/scan_session/{sid}/scan", json={"id_code": ids[0]}, headers=headers)
+        for s in streams:
+            got = _events(s)
+            assert next(got)[0] == "snapshot"
+            assert next(got)[0] == "line"
+    finally:
+        for s in streams:
+            s.close()
+    assert rc._scan_sets[cid].subscribers == {}
@@ -79,6 +79,26 @@ export const api = {
     return request('GET', '/items' + (qs ? `?${qs}` : ''))
   },
 
+  // Semua item (filter q opsional) dalam satu response NDJSON stream
+  async exportItems(params = {}) {
+    const qs = new URLSearchParams({ ...params, format: 'ndjson' }).toString()
+    const headers = {}
+    const tok = getToken()
+    if (tok) headers['Authorization'] = 'Token ' + tok
+    let res
+    try {
+      res = await fetch(`${API_BASE}/items/export?${qs}`, { headers })
+    } catch {
+      throw new Error('Tidak bisa terhubung ke server')
+    }
+    if (!res.ok) {
+      const data = await res.json().catch(() => ({}))
+      throw new Error(data?.message || `Request gagal (${res.status})`)
+    }
+    const text = await res.text()
+    return text.split('\n').filter(Boolean).map(line => JSON.parse(line))
+  },
+
   getItem(id_code) {
     return request('GET', `/items/${encodeURIComponent(id_code)}`)
   },
@@ -95,10 +115,50 @@ export const api = {
   qrUrl(id_code) {
     return `${API_BASE}/items/${encodeURIComponent(id_code)}/qr`
   },
+  // Lembar label QR (PDF dirender server). payload: { ids?: string[], q?: string, all?: boolean, copies?: number }
+  async qrSheetPdf(payload) {
+    const headers = { 'Content-Type': 'application/json' }
+    const tok = getToken()
+    if (tok) headers['Authorization'] = 'Token ' + tok
+    let res
+    try {
+      res = await fetch(API_BASE + '/items/qr_sheet', { method: 'POST', headers, body: JSON.stringify(payload) })
+    } catch {
+      throw new Error('Tidak bisa terhubung ke server')
+    }
+    if (!res.ok) {
+      const data = await res.json().catch(() => ({}))
+      throw new Error(data?.message || `Request gagal (${res.status})`)
+    }
+    return res.blob()
+  },
+  // Import item dari file CSV/XLSX. opts: { dry_run?: boolean }
+  async importItems(file, opts = {}) {
+    const headers = {}
+    const tok = getToken()
+    if (tok) headers['Authorization'] = 'Token ' + tok
+    const form = new FormData()
+    form.append('file', file)
+    if (opts.dry_run) form.append('dry_run', '1')
+    let res
+    try {
+      res = await fetch(API_BASE + '/items/import', { method: 'POST', headers, body: form })
+    } catch {
+      throw new Error('Tidak bisa terhubung ke server')
+    }
+    const data = await res.json().catch(() => ({}))
+    if (!res.ok) throw new Error(data?.message || `Request gagal (${res.status})`)
+    return data
+  },
   // Lost context for item
   lostContext(id_code) {
     return request('GET', `/items/${encodeURIComponent(id_code)}/lost_context`)
   },
+  // Timeline item: params {limit?, cursor?, order?: 'desc'|'asc'}
+  itemTimeline(id_code, params = {}) {
+    const qs = new URLSearchParams(params).toString()
+    return request('GET', `/items/${encodeURIComponent(id_code)}/timeline` + (qs ? `?${qs}` : ''))
+  },
 
   // ---------- CONTAINERS / CHECKOUT (Phase 4) ----------
   // payload: {event_name, pic, crew?, location?, start_date?, end_date?}
@@ -106,16 +166,24 @@ export const api = {
     return request('POST', '/containers', payload)
   },
 
-  outstandingItems() {
-    return request('GET', '/containers/outstanding_items')
+  // Item belum kembali. Tanpa params: semua baris; { limit, cursor } -> satu halaman + next_cursor
+  outstandingItems(params = {}) {
+    const qs = new URLSearchParams(params).toString()
+    return request('GET', `/containers/outstanding_items${qs ? `?${qs}` : ''}`)
+  },
+  // Jumlah item belum kembali per kontainer (widget dashboard): { containers: [...], total }
+  outstandingByContainer() {
+    return request('GET', '/containers/outstanding_items?group=container')
   },
   listContainers(params = {}) {
     const qs = new URLSearchParams(params).toString()
     return request('GET', '/containers' + (qs ? `?${qs}` : ''))
   },
 
-  getContainer(cid) {
-    return request('GET', `/containers/${encodeURIComponent(cid)}`)
+  // params opsional: { lines: 0 } header+totals saja; { limit, cursor, batch, condition, returned } per halaman
+  getContainer(cid, params = {}) {
+    const qs = new URLSearchParams(params).toString()
+    return request('GET', `/containers/${encodeURIComponent(cid)}` + (qs ? `?${qs}` : ''))
   },
 
   // Containers metrics for dashboard KPIs
@@ -147,6 +215,46 @@ export const api = {
   checkinItem(cid, payload) {
     return request('POST', `/containers/${encodeURIComponent(cid)}/checkin`, payload)
   },
+  // Check-in banyak item: items = [{ id_code, condition?, damage_note? }] -> { results, counts }
+  checkinBatch(cid, items) {
+    return request('POST', `/containers/${encodeURIComponent(cid)}/checkin_batch`, { items })
+  },
+
+  // Sesi scan dock: open -> { sid, container, batches, totals }
+  openScanSession(cid) {
+    return request('POST', `/containers/${encodeURIComponent(cid)}/scan_session`)
+  },
+  // Satu scan; payload: { id_code, action: 'checkout'|'checkin', ... }
+  // Tidak throw untuk 4xx: response { ok, result, line, totals, ms } tetap dikembalikan
+  async scanItem(cid, sid, payload) {
+    const headers = { 'Content-Type': 'application/json' }
+    const tok = getToken()
+    if (tok) headers['Authorization'] = 'Token ' + tok
+    let res
+    try {
+      res = await fetch(`${API_BASE}/containers/${encodeURIComponent(cid)}/scan_session/${sid}/scan`, {
+        method: 'POST', headers, body: JSON.stringify(payload),
+      })
+    } catch {
+      throw new Error('Tidak bisa terhubung ke server')
+    }
+    let data = null
+    try { data = await res.json() } catch { data = {} }
+    if (data?.error) throw new Error(data.message || `Request gagal (${res.status})`)
+    return data
+  },
+  // Tiket SSE sekali pakai (berlaku singkat) -> { ticket, expires_in }
+  scanTicket(cid, sid) {
+    return request('POST', `/containers/${encodeURIComponent(cid)}/scan_session/${sid}/ticket`)
+  },
+  // EventSource untuk update live (snapshot, line, totals, status, closed).
+  // Token login tidak masuk URL: tiap koneksi (termasuk reconnect) butuh tiket baru.
+  scanEvents(cid, sid, ticket) {
+    return new EventSource(`${API_BASE}/containers/${encodeURIComponent(cid)}/scan_session/${sid}/events?ticket=${encodeURIComponent(ticket)}`)
+  },
+  closeScanSession(cid, sid) {
+    return request('DELETE', `/containers/${encodeURIComponent(cid)}/scan_session/${sid}`)
+  },
 
   // Submit DN -> buat snapshot versi (V1, V2, ...)
   submitDN(cid) {
@@ -161,13 +269,32 @@ export const api = {
   getDNVersion(cid, version) {
     return request('GET', `/containers/${encodeURIComponent(cid)}/dn/${encodeURIComponent(version)}`)
   },
-  // List semua DN snapshots (audit)
+  // PDF Surat Jalan per versi (dirender & di-cache di server)
+  async dnPdf(cid, version) {
+    const headers = {}
+    const tok = getToken()
+    if (tok) headers['Authorization'] = 'Token ' + tok
+    let res
+    try {
+      res = await fetch(API_BASE + `/containers/${encodeURIComponent(cid)}/dn/${encodeURIComponent(version)}.pdf`, { headers })
+    } catch {
+      throw new Error('Tidak bisa terhubung ke server')
+    }
+    if (!res.ok) {
+      const data = await res.json().catch(() => ({}))
+      throw new Error(data?.message || `Request gagal (${res.status})`)
+    }
+    return res.blob()
+  },
+  // List DN snapshots (audit): metadata per versi { version, created_at, line_count, totals, diff: {added, removed, changed} }; isi via getDNVersion
   getDNList(cid) {
     return request('GET', `/containers/${encodeURIComponent(cid)}/dn_list`)
   },
   // Bulk update kondisi item (Good / Rusak ringan / Rusak berat)
   bulkUpdateCondition: (payload) =>
     request('POST', '/items/bulk_update_condition', payload),
+  // Hapus banyak item sekaligus -> { deleted, skipped: [{id_code, reason}], counts }
+  bulkDelete: (ids) => request('POST', '/items/bulk_delete', { ids }),
   // Tandai item Hilang (Lost) secara manual
   markLost: (ids) => request('POST', '/items/mark_lost', { ids }),
   // Ringkasan jumlah per kategori
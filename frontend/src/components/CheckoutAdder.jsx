@@ -1,7 +1,10 @@
 import React, { useState, useRef } from 'react'
 import { api } from '../api.js'
 
-export default function CheckoutAdder({ cid, onAdded }) {
+const CONDITION_LABEL = { good: 'Good', rusak_ringan: 'Ringan', rusak_berat: 'Berat' }
+
+// scan (opsional, dari useScanSession): satu ID dikirim lewat sesi scan dock
+export default function CheckoutAdder({ cid, onAdded, scan }) {
   const [scanId, setScanId] = useState('')
   const [listIds, setListIds] = useState('')
   const [amend, setAmend] = useState(false)
@@ -36,14 +39,28 @@ export default function CheckoutAdder({ cid, onAdded }) {
     }
     setLoading(true); setMsg('')
     try {
-      const out = await api.addItemsToContainer(cid, {
-        ids, amend, amend_reason: amend ? amendReason : undefined,
+      // satu ID tanpa override ringan -> sesi scan (override_light hanya ada di add_items)
+      const scanned = ids.length === 1 && !overrideLight && scan?.({
+        id_code: ids[0], action: 'checkout',
+        amend, amend_reason: amend ? amendReason : undefined,
         override_heavy: overrideHeavy, override_reason: overrideReason,
-        override_light: overrideLight, override_light_reason: overrideLightReason
       })
-      const c = out.added_counts || {}
-      const s = out.skipped || []
-      setMsg(`Batch ${out.batch}: +${(c.good||0)} Good, +${(c.rusak_ringan||0)} Ringan, +${(c.rusak_berat||0)} Berat. Skipped: ${s.length}`)
+      if (scanned) {
+        const out = await scanned
+        const r = out.result || {}
+        setMsg(out.ok
+          ? `Batch ${r.batch}: +1 ${CONDITION_LABEL[r.added?.condition] || 'Good'} (${ids[0]}) · ${out.ms} ms`
+          : `${ids[0]}: ${r.skipped?.reason || r.message || 'gagal'}`)
+      } else {
+        const out = await api.addItemsToContainer(cid, {
+          ids, amend, amend_reason: amend ? amendReason : undefined,
+          override_heavy: overrideHeavy, override_reason: overrideReason,
+          override_light: overrideLight, override_light_reason: overrideLightReason
+        })
+        const c = out.added_counts || {}
+        const s = out.skipped || []
+        setMsg(`Batch ${out.batch}: +${(c.good||0)} Good, +${(c.rusak_ringan||0)} Ringan, +${(c.rusak_berat||0)} Berat. Skipped: ${s.length}`)
+      }
       setScanId('')
       scanRef.current?.focus()
       setListIds('')
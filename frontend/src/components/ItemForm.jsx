@@ -18,7 +18,7 @@ export default function ItemForm({ onCreated }) {
       const out = await api.batchCreateItems({
         prefix, name, category, model, rack, qty: Number(qty)
       })
-      setMsg(`✅ Berhasil buat ${out.created?.length || 0} unit`)
+      setMsg(`✅ Berhasil buat ${out.count ?? out.created?.length ?? 0} unit`)
       onCreated?.()
       setQty(1)
     } catch (e) {
@@ -39,7 +39,7 @@ export default function ItemForm({ onCreated }) {
       <label>Model <input value={model} onChange={e=>setModel(e.target.value)} style={ipt} required/></label>
       <label>Rak <input value={rack} onChange={e=>setRack(e.target.value)} style={ipt} required/></label>
       <label>Qty
-        <input type="number" min="1" max="500" value={qty}
+        <input type="number" min="1" max="20000" value={qty}
                onChange={e=>setQty(e.target.value)} style={ipt} required/>
       </label>
       <button disabled={loading} style={{padding:'10px 14px', borderRadius:8, backgroundColor: '#F2C14E', color: 'white', border: 'none', fontWeight: 600, cursor: loading ? 'not-allowed' : 'pointer', opacity: loading ? 0.7 : 1}}>
@@ -18,7 +18,7 @@ export default function UniversalItemForm({ onCreated }) {
       const out = await api.batchCreateItems({
         prefix, name, category, model, rack, qty: Number(qty), is_universal: true,
       })
-      setMsg(`✓ Berhasil buat ${out.created?.length || 0} universal unit`)
+      setMsg(`✓ Berhasil buat ${out.count ?? out.created?.length ?? 0} universal unit`)
       onCreated?.()
       setQty(1)
     } catch (e) {
@@ -42,7 +42,7 @@ export default function UniversalItemForm({ onCreated }) {
       <label>Model <input value={model} onChange={e=>setModel(e.target.value)} style={ipt} required/></label>
       <label>Rak <input value={rack} onChange={e=>setRack(e.target.value)} style={ipt} required/></label>
       <label>Qty
-        <input type="number" min="1" max="500" value={qty}
+        <input type="number" min="1" max="20000" value={qty}
                onChange={e=>setQty(e.target.value)} style={ipt} required/>
       </label>
       <button disabled={loading} style={{padding:'10px 14px', borderRadius:8, backgroundColor: '#3b82f6', color: 'white', border: 'none', fontWeight: 600, cursor: loading ? 'not-allowed' : 'pointer', opacity: loading ? 0.7 : 1}}>
@@ -3,11 +3,22 @@ import { useNavigate, useParams } from 'react-router-dom'
 import { api, getToken } from '../api.js'
 import ContainerItemsTable from '../components/ContainerItemsTable.jsx'
 import { formatDateTime } from '../utils/date.js'
+import { useContainerLines } from '../utils/containerLines.js'
+import { useScanSession } from '../utils/scanSession.js'
+
+// filter tampilan tabel -> query GET /containers/<cid>
+const SHOW_FILTERS = {
+  '': {},
+  out: { returned: 0 },
+  returned: { returned: 1 },
+  lost: { condition: 'lost' },
+}
 
 export default function ContainerCheckIn(){
   const { cid } = useParams()
   const navigate = useNavigate()
-  const [data, setData] = useState(null)
+  const [show, setShow] = useState('') // '' | out | returned | lost
+  const { data, lines, batches, hasMore, loadingMore, reload, loadMore } = useContainerLines(cid, SHOW_FILTERS[show])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState('')
   const [scanRet, setScanRet] = useState('')
@@ -28,13 +39,15 @@ export default function ContainerCheckIn(){
   async function refresh(){
     setLoading(true); setError('')
     try{
-      const res = await api.getContainer(cid)
-      setData(res)
+      await reload(lines.length)
     }catch(e){ setError(e.message) }
     finally{ setLoading(false) }
   }
 
-  useEffect(()=>{ refresh() }, [cid])
+  // update live dari sesi scan: muat ulang baris tanpa layar Loading
+  const { scan } = useScanSession(cid, () => { reload(lines.length).catch(()=>{}) })
+
+  useEffect(()=>{ refresh() }, [cid, show])
   useEffect(() => { (async()=>{ try{ if(getToken()){ const me=await api.me(); setUser(me.user) } }catch{} })() }, [])
   useEffect(()=>{ scanRef.current?.focus() }, [])
 
@@ -46,9 +59,13 @@ export default function ContainerCheckIn(){
       .filter(Boolean)
     if (!ids.length) return
     try{
-      for(const id of ids){
-        await api.checkinItem(cid,{ id_code: id, condition: 'good' })
-      }
+      // satu ID (scanner) lewat sesi scan; daftar tetap lewat checkin_batch
+      const scanned = ids.length === 1 && scan({ id_code: ids[0], action: 'checkin', condition: 'good' })
+      const out = scanned
+        ? await scanned.then(r => ({ results: [{ id_code: ids[0], ok: r.ok, message: r.result?.message }] }))
+        : await api.checkinBatch(cid, ids.map(id => ({ id_code: id, condition: 'good' })))
+      const failed = (out.results || []).filter(r => !r.ok)
+      if (failed.length) alert(`Gagal ${failed.length} item:\n` + failed.map(r => `${r.id_code}: ${r.message}`).join('\n'))
       setScanRet(''); setListIds('')
       await refresh()
       scanRef.current?.focus()
@@ -265,15 +282,28 @@ export default function ContainerCheckIn(){
           <h3 style={{margin: 0, color: '#1f2937', fontSize: 18, fontWeight: 600}}>
             📦 Items dalam Kontainer
           </h3>
+          <select className="noprint" value={show} onChange={e=>setShow(e.target.value)} style={{marginTop:8, padding:6, border:'1px solid #d1d5db', borderRadius:6}}>
+            <option value="">Semua</option>
+            <option value="out">Belum kembali</option>
+            <option value="returned">Sudah kembali</option>
+            <option value="lost">Hilang</option>
+          </select>
         </div>
         <div style={{padding: 0}}>
           <ContainerItemsTable
             cid={cid}
-            batches={data.batches}
+            batches={batches}
             onVoid={canVoid && c.status !== 'Closed' ? onVoid : undefined}
             onUpdated={refresh}
             role={user?.role}
           />
+          {hasMore && (
+            <div className="noprint" style={{padding: 12, textAlign: 'center'}}>
+              <button onClick={loadMore} disabled={loadingMore} style={{padding: '8px 16px', border: '1px solid #d1d5db', borderRadius: 8, background: 'white', cursor: 'pointer'}}>
+                {loadingMore ? 'Memuat…' : `Muat lagi (${lines.length} dimuat)`}
+              </button>
+            </div>
+          )}
         </div>
       </div>
 
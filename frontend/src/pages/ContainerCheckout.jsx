@@ -4,6 +4,7 @@ import { api } from '../api.js'
 import CheckoutAdder from '../components/CheckoutAdder.jsx'
 import ContainerItemsTable from '../components/ContainerItemsTable.jsx'
 import { formatDateTime } from '../utils/date.js'
+import { useScanSession } from '../utils/scanSession.js'
 
 export default function ContainerCheckout(){
   const { cid } = useParams()
@@ -24,6 +25,9 @@ export default function ContainerCheckout(){
     finally{ setLoading(false) }
   }
 
+  // update live (scan dari layar lain / perubahan lain): muat ulang tanpa layar Loading
+  const { scan } = useScanSession(cid, () => { api.getContainer(cid).then(setData).catch(()=>{}) })
+
   async function checkHasDN(){
     try { await api.getLatestDN(cid); setHasDN(true) }
     catch { setHasDN(false) }
@@ -163,7 +167,7 @@ export default function ContainerCheckout(){
 
       {/* Checkout Form Section */}
       <div className="noprint" style={{marginBottom: 24}}>
-        <CheckoutAdder cid={cid} onAdded={refresh}/>
+        <CheckoutAdder cid={cid} onAdded={refresh} scan={scan}/>
       </div>
 
       {/* Items Table Section */}
@@ -4,10 +4,11 @@ import { api, getToken } from '../api.js'
 import CheckoutAdder from '../components/CheckoutAdder.jsx'
 import ContainerItemsTable from '../components/ContainerItemsTable.jsx'
 import { formatDateTime } from '../utils/date.js'
+import { useContainerLines } from '../utils/containerLines.js'
 
 export default function ContainerDetail(){
   const { cid } = useParams()
-  const [data, setData] = useState(null)
+  const { data, lines, batches, hasMore, loadingMore, reload, loadMore } = useContainerLines(cid)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState('')
   const [dn, setDn] = useState(null) // latest snapshot payload
@@ -21,8 +22,7 @@ export default function ContainerDetail(){
   async function refresh(){
     setLoading(true); setError('')
     try{
-      const res = await api.getContainer(cid)
-      setData(res)
+      await reload(lines.length)
       // ambil snapshot terbaru (jika ada)
       try { const snap = await api.getLatestDN(cid); setDn(snap) } catch {}
     }catch(e){ setError(e.message) }
@@ -34,10 +34,10 @@ export default function ContainerDetail(){
   // Default kondisi return mengikuti kondisi saat checkout ketika scan ID diisi
   useEffect(() => {
     const id = (scanRet || '').trim()
-    if (!id || !data || !data.batches) return
-    const prev = findPrevCond(data.batches, id)
+    if (!id || !lines.length) return
+    const prev = findPrevCond(batches, id)
     if (prev) setRetCond(prev)
-  }, [scanRet, data])
+  }, [scanRet, lines])
 
   async function submitDN(){
     if (!confirm('Yakin daftar barang saat ini sudah benar untuk DN?')) return
@@ -149,7 +149,14 @@ export default function ContainerDetail(){
       </div>
 
       {/* Tabel item per batch (printable) - live view */}
-      <ContainerItemsTable cid={cid} batches={data.batches} role={user?.role} onVoid={String(user?.role||'').toLowerCase()==='admin' ? onVoid : undefined} onUpdated={refresh}/>
+      <ContainerItemsTable cid={cid} batches={batches} role={user?.role} onVoid={String(user?.role||'').toLowerCase()==='admin' ? onVoid : undefined} onUpdated={refresh}/>
+      {hasMore && (
+        <div className="noprint" style={{marginTop:12, textAlign:'center'}}>
+          <button onClick={loadMore} disabled={loadingMore} style={{padding:'8px 12px', border:'1px solid #111', borderRadius:8}}>
+            {loadingMore ? 'Memuat…' : `Muat lagi (${lines.length} dari ${t.all})`}
+          </button>
+        </div>
+      )}
     </div>
   )
 }
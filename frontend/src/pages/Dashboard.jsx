@@ -207,17 +207,19 @@ function DashboardHome({ user }) {
   const [rusak, setRusak] = useState({ ringan: 0, berat: 0 });
   const [hilang, setHilang] = useState(0);
   const [emoney, setEmoney] = useState([]);
+  const [outstanding, setOutstanding] = useState({ containers: [], total: 0 });
   const gold = "#F2C14E";
   const black = "#000";
 
   useEffect(() => {
     (async () => {
       try {
-        const [m, maint, em, cat] = await Promise.all([
+        const [m, maint, em, cat, out] = await Promise.all([
           api.containerMetrics().catch(() => ({})),
           api.maintenanceList({ per_page: 1 }).catch(() => ({})),
           api.listEmoney({ page: 1, per_page: 100 }).catch(() => ({})),
           api.summaryByCategory().catch(() => ({})),
+          api.outstandingByContainer().catch(() => ({})),
         ]);
         setKpi({
           open: Number(m?.open || 0),
@@ -231,6 +233,10 @@ function DashboardHome({ user }) {
         setEmoney(Array.isArray(em?.data) ? em.data : []);
         const list = Array.isArray(cat?.data) ? cat.data : [];
         setHilang(list.reduce((a, r) => a + Number(r?.hilang || 0), 0));
+        setOutstanding({
+          containers: Array.isArray(out?.containers) ? out.containers : [],
+          total: Number(out?.total || 0),
+        });
       } catch {}
     })();
   }, []);
@@ -354,6 +360,83 @@ function DashboardHome({ user }) {
         <KpiBox title="Rusak Berat" value={rusak.berat} />
         <KpiBox title="Hilang" value={hilang} />
       </div>
+
+      {/* Item belum kembali per kontainer (agregasi di server) */}
+      <div
+        style={{
+          background: "white",
+          borderRadius: 12,
+          overflow: "hidden",
+          marginTop: 24,
+          boxShadow: "0 2px 8px rgba(0, 0, 0, 0.1)",
+          border: "1px solid #e5e5e5",
+        }}
+      >
+        <div
+          style={{
+            background: "#f8f9fa",
+            color: "#333",
+            padding: "16px 20px",
+            display: "grid",
+            gridTemplateColumns: "2fr 1fr 1fr",
+            fontWeight: 600,
+            fontSize: 14,
+            borderBottom: "1px solid #e5e5e5",
+          }}
+        >
+          <div>Belum Kembali ({outstanding.total})</div>
+          <div>Jumlah</div>
+          <div>Aksi</div>
+        </div>
+        {outstanding.containers.slice(0, 10).map((o, index, arr) => (
+          <div
+            key={o.container_id}
+            style={{
+              display: "grid",
+              gridTemplateColumns: "2fr 1fr 1fr",
+              alignItems: "center",
+              gap: 16,
+              borderBottom: index < arr.length - 1 ? "1px solid #f0f0f0" : "none",
+              padding: "14px 20px",
+              fontSize: 14,
+            }}
+          >
+            <div style={{ color: black, fontWeight: 500 }}>
+              {o.event_name || o.container_id}
+              <div style={{ color: "#666", fontSize: 12 }}>{o.container_id} · PIC {o.pic || "-"}</div>
+            </div>
+            <div style={{ fontWeight: 600 }}>{o.count}</div>
+            <div>
+              <Link
+                to={`/containers/${encodeURIComponent(o.container_id)}/checkin`}
+                style={{
+                  color: gold,
+                  textDecoration: "none",
+                  fontWeight: 500,
+                  fontSize: 13,
+                  padding: "6px 12px",
+                  background: "#fff8e1",
+                  borderRadius: 6,
+                  border: "1px solid #f2c14e",
+                  display: "inline-block",
+                }}
+              >
+                Check-in
+              </Link>
+            </div>
+          </div>
+        ))}
+        {outstanding.containers.length === 0 && (
+          <div style={{
+            padding: "24px 20px",
+            textAlign: "center",
+            color: "#666",
+            fontSize: 14,
+          }}>
+            Semua item sudah kembali
+          </div>
+        )}
+      </div>
     </>
   );
 }
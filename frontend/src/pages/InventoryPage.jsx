@@ -164,18 +164,8 @@ export default function InventoryPage() {
     if (!confirm('Cetak semua QR untuk seluruh barang terdaftar?')) return
     setPrintAllLoading(true)
     try {
-      const perPage = 100
-      let pageNum = 1
-      let all = []
-      let totalItems = 0
-      while (true) {
-        const res = await api.listItems({ page: pageNum, per_page: perPage })
-        const batch = res.data || []
-        if (pageNum === 1) totalItems = res.total || batch.length
-        all = all.concat(batch)
-        if (batch.length < perPage || all.length >= totalItems) break
-        pageNum += 1
-      }
+      // satu request stream untuk seluruh katalog
+      const all = await api.exportItems()
       // pastikan mode selected dimatikan
       setPrintSelList([])
       setPrintingSel(false)
@@ -264,11 +254,10 @@ async function deleteSelected() {
   try {
     setDelLoading(true)
     setDelProgress({ done: 0, total: allowed.length })
-    let done = 0
-    for (const id of allowed) {
-      try { await api.deleteItem(id) } catch (_) { /* lanjut item lain */ }
-      done += 1
-      setDelProgress(prev => ({ ...prev, done }))
+    const out = await api.bulkDelete(allowed)
+    setDelProgress({ done: allowed.length, total: allowed.length })
+    if (out.skipped?.length) {
+      alert(`Lewati ${out.skipped.length} item:\n` + out.skipped.map(s => `${s.id_code}: ${s.reason}`).join('\n'))
     }
     setSelected({})
     await refresh({ keepPage: true })
@@ -61,6 +61,15 @@ export default function PrintLabelsPage() {
 
   function clearSelection() { setSelected({}) }
 
+  // PDF dirender di server (cepat untuk ribuan label)
+  async function openServerPdf() {
+    setError('')
+    try {
+      const blob = await api.qrSheetPdf({ ids: labelList.map(it => it.id_code) })
+      window.open(URL.createObjectURL(blob), '_blank')
+    } catch (e) { setError(e.message) }
+  }
+
   // === build labels to render ===
   const labelList = useMemo(() => {
     const out = []
@@ -100,6 +109,9 @@ export default function PrintLabelsPage() {
           >
             Print ({labelList.length})
           </button>
+          <button onClick={openServerPdf} style={btn} disabled={!labelList.length}>
+            PDF Server
+          </button>
           <button onClick={clearSelection} style={btnLight}>Reset Pilihan</button>
         </div>
 
@@ -1,4 +1,4 @@
-import React, { useEffect, useMemo, useState } from 'react'
+import React, { useEffect, useState } from 'react'
 import { useParams, useNavigate } from 'react-router-dom'
 import { api } from '../api.js'
 import { formatDateTime } from '../utils/date.js'
@@ -18,8 +18,6 @@ export default function SuratJalanHistory(){
       .finally(()=> setLoading(false))
   },[cid])
 
-  const diffs = useMemo(()=> computeDiffs(vers), [vers])
-
   if (loading) return (
     <>
       <style>{`
@@ -199,7 +197,7 @@ export default function SuratJalanHistory(){
                 >
                   <td style={tdVersion}>V{v.version}</td>
                   <td style={td}>{formatDateTime(v.created_at, {monthText:true})}</td>
-                  <td style={td}>{renderSummary(diffs[i])}</td>
+                  <td style={td}>{renderSummary(v.diff)}</td>
                   <td style={td}>
                     <a 
                       href={`/containers/${cid}/surat-jalan/v/${v.version}`}
@@ -261,41 +259,12 @@ const tdVersion = {
   color: '#4f46e5'
 }
 
-function computeDiffs(list){
-  const out = []
-  for (let i=0;i<list.length;i++){
-    if (i===0){ out.push({added:[],removed:[],changed:[]}); continue }
-    const prev = flatten(list[i-1].payload)
-    const curr = flatten(list[i].payload)
-    const added=[], removed=[], changed=[]
-    for (const k of curr.keys()) if (!prev.has(k)) added.push(k)
-    for (const k of prev.keys()) if (!curr.has(k)) removed.push(k)
-    for (const k of curr.keys()) if (prev.has(k)){
-      const a = prev.get(k), b = curr.get(k)
-      const dif = []
-      if ((a.condition||'') !== (b.condition||'')) dif.push(`cond: ${a.condition||'-'}→${b.condition||'-'}`)
-      if ((a.return_condition||'') !== (b.return_condition||'')) dif.push(`ret: ${a.return_condition||'-'}→${b.return_condition||'-'}`)
-      if (dif.length) changed.push(`${k} (${dif.join(', ')})`)
-    }
-    out.push({added, removed, changed})
-  }
-  return out
-}
-
-function flatten(payload){
-  const m = new Map()
-  const b = payload?.batches || {}
-  for (const key of Object.keys(b)){
-    for (const it of b[key]||[]){ m.set(it.id_code, { condition: it.condition, return_condition: it.return_condition }) }
-  }
-  return m
-}
-
+// d = { added, removed, changed }: jumlah item dibanding versi sebelumnya (dihitung server)
 function renderSummary(d){
   if (!d) return <span style={{color: '#6b7280', fontStyle: 'italic'}}>-</span>
   
   const parts = []
-  if (d.added.length) {
+  if (d.added) {
     parts.push(
       <span key="added" style={{
         color: '#059669',
@@ -305,11 +274,11 @@ function renderSummary(d){
         borderRadius: 4,
         fontSize: 12
       }}>
-        ➕ {d.added.length} item
+        ➕ {d.added} item
       </span>
     )
   }
-  if (d.removed.length) {
+  if (d.removed) {
     parts.push(
       <span key="removed" style={{
         color: '#dc2626',
@@ -319,11 +288,11 @@ function renderSummary(d){
         borderRadius: 4,
         fontSize: 12
       }}>
-        ➖ {d.removed.length} item
+        ➖ {d.removed} item
       </span>
     )
   }
-  if (d.changed.length) {
+  if (d.changed) {
     parts.push(
       <span key="changed" style={{
         color: '#d97706',
@@ -333,7 +302,7 @@ function renderSummary(d){
         borderRadius: 4,
         fontSize: 12
       }}>
-        🔄 {d.changed.length} item
+        🔄 {d.changed} item
       </span>
     )
   }
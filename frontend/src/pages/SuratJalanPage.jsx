@@ -116,6 +116,14 @@ export default function SuratJalanPage() {
     return { dn, items: rows }
   }, [data])
 
+  // PDF dirender di server (cepat & konsisten untuk DN ratusan baris)
+  async function openPdf() {
+    try {
+      const blob = await api.dnPdf(cid, data._meta?.version)
+      window.open(URL.createObjectURL(blob), '_blank')
+    } catch (e) { alert(e.message) }
+  }
+
   const toolbar = (
     <div className="noprint" style={{ display: 'flex', gap: 8, alignItems: 'center', padding: 12 }}>
       <button onClick={() => navigate(-1)} style={{ padding: '8px 12px' }}>Kembali</button>
@@ -125,6 +133,7 @@ export default function SuratJalanPage() {
       {data && (
         <>
           <button onClick={() => window.print()} style={{ padding: '8px 12px' }}>Cetak</button>
+          <button onClick={openPdf} style={{ padding: '8px 12px' }}>PDF</button>
           <div style={{ marginLeft: 8, color: '#666' }}>
             Versi: <b>V{data._meta?.version}</b> - Dibuat: {formatDateTime(data._meta?.created_at, { monthText: true })}
           </div>
@@ -0,0 +1,42 @@
+// frontend/src/utils/containerLines.js
+import { useCallback, useState } from 'react'
+import { api } from '../api.js'
+
+export const LINES_PAGE = 200
+const LINES_MAX = 1000
+
+// Kelompokkan baris (dari ?limit=&cursor=) per batch, bentuk sama dengan data.batches lama
+export function groupByBatch(lines) {
+  const out = {}
+  for (const it of lines || []) (out[it.batch] ||= []).push(it)
+  return out
+}
+
+// Detail kontainer dengan baris dimuat per halaman.
+// filters: { batch?, condition?, returned? } -> diteruskan ke GET /containers/<cid>
+export function useContainerLines(cid, filters = {}) {
+  const [data, setData] = useState(null)   // { container, totals, batch_counts, latest_dn, dn_count }
+  const [lines, setLines] = useState([])
+  const [cursor, setCursor] = useState(null)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const key = JSON.stringify(filters)
+
+  // keep = jumlah baris yang sudah tampil, supaya refresh tidak memotong daftar
+  const reload = useCallback(async (keep = 0) => {
+    const limit = Math.min(LINES_MAX, Math.max(LINES_PAGE, keep))
+    const { lines: first, next_cursor, ...head } = await api.getContainer(cid, { ...filters, limit })
+    setData(head); setLines(first || []); setCursor(next_cursor || null)
+  }, [cid, key])
+
+  const loadMore = useCallback(async () => {
+    if (!cursor || loadingMore) return
+    setLoadingMore(true)
+    try {
+      const res = await api.getContainer(cid, { ...filters, limit: LINES_PAGE, cursor })
+      setLines(prev => prev.concat(res.lines || []))
+      setCursor(res.next_cursor || null)
+    } finally { setLoadingMore(false) }
+  }, [cid, key, cursor, loadingMore])
+
+  return { data, lines, batches: groupByBatch(lines), hasMore: !!cursor, loadingMore, reload, loadMore }
+}
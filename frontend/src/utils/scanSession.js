@@ -0,0 +1,68 @@
+// frontend/src/utils/scanSession.js
+import { useCallback, useEffect, useRef } from 'react'
+import { api } from '../api.js'
+
+const RECONNECT_MS = 3000
+const CHANGE_DEBOUNCE_MS = 300
+
+// Sesi scan dock untuk kontainer `cid` selama halaman terbuka.
+// scan(payload) -> POST .../scan (satu ID, { ok, result, line, totals, ms }), atau null kalau
+// sesi belum/tidak terbuka (pemanggil pakai endpoint biasa).
+// onChange() dipanggil (debounce) tiap update live dari SSE: scan sendiri, layar lain,
+// atau perubahan lewat endpoint/worker lain.
+export function useScanSession(cid, onChange) {
+  const sidRef = useRef(null)
+  const changeRef = useRef(onChange)
+  changeRef.current = onChange
+
+  useEffect(() => {
+    let closed = false, es = null, retry = null, timer = null
+    const changed = () => {
+      clearTimeout(timer)
+      timer = setTimeout(() => changeRef.current?.(), CHANGE_DEBOUNCE_MS)
+    }
+
+    // tiket hanya berlaku sekali: tiap (re)connect minta tiket baru
+    async function connect() {
+      if (closed || !sidRef.current) return
+      let ticket
+      try {
+        ({ ticket } = await api.scanTicket(cid, sidRef.current))
+      } catch {
+        sidRef.current = null   // sesi kadaluarsa -> scan() jatuh ke endpoint biasa
+        return
+      }
+      if (closed) return
+      es = api.scanEvents(cid, sidRef.current, ticket)
+      for (const name of ['line', 'totals', 'status']) es.addEventListener(name, changed)
+      es.addEventListener('closed', () => { es.close(); sidRef.current = null; changed() })
+      es.onerror = () => {
+        es.close()
+        clearTimeout(retry)
+        retry = setTimeout(connect, RECONNECT_MS)
+      }
+    }
+
+    api.openScanSession(cid)
+      .then(s => {
+        if (closed) { api.closeScanSession(cid, s.sid).catch(() => {}); return }
+        sidRef.current = s.sid
+        connect()
+      })
+      .catch(() => {})
+
+    return () => {
+      closed = true
+      clearTimeout(retry); clearTimeout(timer)
+      es?.close()
+      if (sidRef.current) api.closeScanSession(cid, sidRef.current).catch(() => {})
+      sidRef.current = null
+    }
+  }, [cid])
+
+  const scan = useCallback(
+    payload => (sidRef.current ? api.scanItem(cid, sidRef.current, payload) : null),
+    [cid]
+  )
+  return { scan }
+}